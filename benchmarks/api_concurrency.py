@@ -0,0 +1,135 @@
+"""
+Concurrency benchmark: p50 / p99 latency under mixed read/write load.
+
+用法:
+    uvicorn server.main:app --port 8000 &
+    python -m benchmarks.api_concurrency --base-url http://127.0.0.1:8000 --concurrency 32 --duration 30
+
+对正在运行的服务发起混合负载：读（/health、消息列表、消息检索、实体列表、子图）
+与写（POST 消息、ingest）按 --write-ratio 混合，按路由输出请求数、错误数与延迟分位数。
+/health 不访问任何存储，它的 p99 直接反映事件循环是否被同步 I/O 阻塞。
+在改动前后的代码上分别启动服务并运行本脚本即可对比。
+"""
+import argparse
+import asyncio
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+from uuid import uuid4
+
+import httpx
+import numpy as np
+
+NAMES = ["艾琳", "狗头人", "老板娘", "铁匠", "村长", "古神", "骑士团", "盗贼公会"]
+
+
+def _ingest_payload(rng: random.Random) -> dict:
+    a, b = rng.sample(NAMES, 2)
+    return {
+        "entities": [
+            {"type": "Character", "name": a, "properties": {"description": f"{a} 的描述 {rng.random():.4f}"}},
+            {"type": "Character", "name": b, "properties": {}},
+        ],
+        "relationships": [{"from_entity_name": a, "to_entity_name": b, "type": "KNOWS"}],
+    }
+
+
+def _pick_request(rng: random.Random, campaign_id: str, write_ratio: float) -> Tuple[str, str, str, dict]:
+    """返回 (路由名, 方法, 路径, 参数)"""
+    base = f"/api/campaigns/{campaign_id}"
+    if rng.random() < write_ratio:
+        if rng.random() < 0.7:
+            return "POST messages", "POST", f"{base}/messages", {
+                "json": {"role": "user", "content": f"{rng.choice(NAMES)} 出现在酒馆 {uuid4()}"},
+            }
+        return "POST ingest", "POST", f"{base}/ingest", {"json": _ingest_payload(rng)}
+    choice = rng.random()
+    if choice < 0.2:
+        return "GET health", "GET", "/health", {}
+    if choice < 0.4:
+        return "GET messages", "GET", f"{base}/messages", {"params": {"limit": 20}}
+    if choice < 0.6:
+        return "GET messages/search", "GET", f"{base}/messages/search", {"params": {"q": rng.choice(NAMES)}}
+    if choice < 0.8:
+        return "GET entities", "GET", f"{base}/entities", {}
+    return "GET subgraph", "GET", f"{base}/subgraph", {"params": {"name": rng.choice(NAMES), "depth": 2}}
+
+
+async def _worker(
+    client: httpx.AsyncClient,
+    campaign_id: str,
+    deadline: float,
+    write_ratio: float,
+    seed: int,
+    timings: Dict[str, List[float]],
+    errors: Dict[str, int],
+) -> None:
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        route, method, path, kwargs = _pick_request(rng, campaign_id, write_ratio)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            if response.status_code >= 500:
+                errors[route] += 1
+        except httpx.HTTPError:
+            errors[route] += 1
+        timings[route].append(time.perf_counter() - started)
+
+
+async def _run(args: argparse.Namespace) -> None:
+    campaign_id = args.campaign or f"bench-{uuid4().hex[:8]}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        # 预热：建战役、写入初始实体与消息
+        rng = random.Random(0)
+        for _ in range(10):
+            await client.post(f"/api/campaigns/{campaign_id}/ingest", json=_ingest_payload(rng))
+            await client.post(
+                f"/api/campaigns/{campaign_id}/messages",
+                json={"role": "user", "content": f"{rng.choice(NAMES)} 的初始消息"},
+            )
+
+        timings: Dict[str, List[float]] = defaultdict(list)
+        errors: Dict[str, int] = defaultdict(int)
+        deadline = time.perf_counter() + args.duration
+        await asyncio.gather(*(
+            _worker(client, campaign_id, deadline, args.write_ratio, seed, timings, errors)
+            for seed in range(args.concurrency)
+        ))
+
+    total = sum(len(values) for values in timings.values())
+    print(
+        f"campaign={campaign_id} concurrency={args.concurrency} duration={args.duration}s "
+        f"requests={total} throughput={total / args.duration:.1f}/s"
+    )
+    print(f"{'route':<22} {'count':>7} {'errors':>7} {'p50':>9} {'p99':>9}")
+    everything: List[float] = []
+    for route in sorted(timings):
+        values = np.array(timings[route]) * 1000
+        everything.extend(values.tolist())
+        print(
+            f"{route:<22} {values.shape[0]:>7} {errors[route]:>7} "
+            f"{np.percentile(values, 50):8.1f}ms {np.percentile(values, 99):8.1f}ms"
+        )
+    if everything:
+        print(
+            f"{'ALL':<22} {len(everything):>7} {sum(errors.values()):>7} "
+            f"{np.percentile(everything, 50):8.1f}ms {np.percentile(everything, 99):8.1f}ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--campaign", default=None, help="默认每次新建一个 bench-* 战役")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    args = parser.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
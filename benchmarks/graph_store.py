@@ -0,0 +1,264 @@
+"""
+Graph store conformance + latency comparison: neo4j vs embedded sqlite backend.
+
+用法:
+    python -m benchmarks.graph_store --backends sqlite
+    docker compose up -d neo4j
+    python -m benchmarks.graph_store --backends sqlite,neo4j --sizes 500,2000,5000
+
+对每个后端先跑同一组仓储层场景（增删改查、ingest、遍历、路径），结果中的 ID 替换为
+实体名后逐项比较，任一后端与第一个后端不一致时以非零状态退出；
+再按 --sizes 写入不同规模的战役，输出常用读路径的延迟分位数。
+结束时删除本次创建的战役。
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from uuid import uuid4
+
+BATCH = 250
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+
+
+async def _scenario(prefix: str) -> List[Tuple[str, Any]]:
+    """仓储层一致性场景，返回 (步骤, 去掉 ID 与时间后的结果)"""
+    from server.repositories import campaigns, entities, queries, relationships
+    from server.repositories.graph_store import get_graph_store
+    from server.schemas.ingest import IngestRequest
+    from server.services.ingest import IngestError, ingest
+    from server.services.paths import find_paths
+
+    campaign_id = f"{prefix}-conformance"
+    names: Dict[str, str] = {}
+    transcript: List[Tuple[str, Any]] = []
+
+    def record(step: str, value: Any) -> None:
+        transcript.append((step, value))
+
+    def entity_view(entity):
+        return entity and (entity["name"], entity.get("type"))
+
+    def rel_view(rel):
+        return rel and (names.get(rel["from_entity_id"]), names.get(rel["to_entity_id"]), rel["type"], rel["properties"])
+
+    await campaigns.create_campaign("Conformance", "coc", "desc", {"k": 1}, campaign_id)
+    campaign = await campaigns.ensure_campaign_exists(campaign_id)
+    record("campaign", (campaign["name"], campaign["system"], campaign["status"], campaign["metadata"]))
+    updated = await campaigns.update_campaign(campaign_id, {"status": "paused", "metadata": {"k": 2}})
+    record("update_campaign", (updated["status"], updated["metadata"]))
+    record("update_missing_campaign", await campaigns.update_campaign(f"{campaign_id}-missing", {"status": "x"}))
+
+    for entity_type, name in [("Character", "Alice"), ("Unknown", "Bob"), ("Location", "Arkham")]:
+        created = await entities.create_entity(campaign_id, entity_type, name, {}, {})
+        names[created["entity_id"]] = name
+    again = await entities.create_entity(campaign_id, "Character", "Bob", {}, {})
+    record("unknown_type_upgraded", entity_view(again))
+    kept = await entities.create_entity(campaign_id, "Item", "Alice", {}, {})
+    record("type_kept", entity_view(kept))
+    ids = {name: entity_id for entity_id, name in names.items()}
+    record("get_by_name", entity_view(await entities.get_entity_by_name(campaign_id, "Arkham")))
+    record("get_by_name_type_mismatch", await entities.get_entity_by_name(campaign_id, "Arkham", "Character"))
+    record("list_by_type", sorted(e["name"] for e in await entities.list_entities(campaign_id, entity_type="Character")))
+    record("list_by_name", [e["name"] for e in await entities.list_entities(campaign_id, name="Alice")])
+
+    first = await relationships.create_relationship(campaign_id, ids["Alice"], ids["Bob"], "knows", {"since": 1920})
+    second = await relationships.create_relationship(campaign_id, ids["Alice"], ids["Bob"], "KNOWS", {"since": 1921})
+    record("relationship_merged", (rel_view(second), first["relationship_id"] == second["relationship_id"]))
+    await relationships.create_relationship(campaign_id, ids["Bob"], ids["Arkham"], "lives_in", {})
+    await relationships.create_relationship(campaign_id, ids["Alice"], ids["Arkham"], "visits", {"weight": 3})
+    record("relationship_missing_endpoint", await relationships.create_relationship(
+        campaign_id, ids["Alice"], str(uuid4()), "knows", {},
+    ))
+    record("list_from", sorted(map(rel_view, await relationships.list_relationships(campaign_id, from_entity_id=ids["Alice"]))))
+    record("list_to", sorted(map(rel_view, await relationships.list_relationships(campaign_id, to_entity_id=ids["Arkham"]))))
+    record("list_type", sorted(map(rel_view, await relationships.list_relationships(campaign_id, relationship_type="lives_in"))))
+
+    result = await ingest(campaign_id, IngestRequest(
+        entities=[{"type": "Character", "name": "Carol"}, {"type": "Item", "name": "Tome"}],
+        relationships=[
+            {"from_entity_name": "Carol", "to_entity_name": "Tome", "type": "owns"},
+            {"from_entity_name": "Carol", "to_entity_name": "Dave", "type": "ally", "bidirectional": True},
+        ],
+    ))
+    record("ingest", result)
+    for name, row in (await entities.resolve_entity_names(campaign_id, ["Carol", "Tome", "Dave", "Nobody"])).items():
+        names[row["entity_id"]] = name
+        ids[name] = row["entity_id"]
+    record("resolved", sorted((names[row["entity_id"]], row["type"]) for row in (
+        await entities.resolve_entity_names(campaign_id, ["Carol", "Tome", "Dave", "Nobody"])
+    ).values()))
+
+    adjacency = await queries.get_adjacency(campaign_id, [ids["Alice"], ids["Carol"]])
+    record("adjacency", sorted((names[row["entity_id"]], row["other_name"], row["type"]) for row in adjacency))
+    sampled = await queries.get_sampled_adjacency(campaign_id, [ids["Alice"]], 1, "weight")
+    record("sampled", [(degree, [edge["other_name"] for edge in edges]) for degree, edges in sampled.values()])
+    neighbours = await queries.get_neighbours(campaign_id, [ids["Alice"], ids["Carol"]], 10)
+    record("neighbours", [(n["name"], n["links"], sorted(n["via"])) for n in neighbours])
+    subgraph = await queries.get_subgraph(campaign_id, name="Alice", depth=2)
+    record("subgraph", (
+        sorted(node["label"] for node in subgraph["nodes"]),
+        sorted((names[edge["from_id"]], names[edge["to_id"]], edge["type"]) for edge in subgraph["edges"]),
+    ))
+    paths = await find_paths(campaign_id, "Alice", "Arkham", 3, k=3)
+    record("paths", sorted(path["nodes"] for path in paths["paths"]))
+    try:
+        await ingest(campaign_id, IngestRequest(entities=[], relationships=[]))
+        record("empty_ingest", "ok")
+    except IngestError:
+        record("empty_ingest", "error")
+
+    rel_id = (await relationships.list_relationships(campaign_id, from_entity_id=ids["Bob"]))[0]["relationship_id"]
+    record("delete_relationship", (
+        await relationships.delete_relationship(campaign_id, rel_id),
+        await relationships.delete_relationship(campaign_id, rel_id),
+    ))
+    record("delete_entity", await entities.delete_entity(campaign_id, ids["Alice"]))
+    record("entity_relationships_removed", await relationships.list_relationships(campaign_id, to_entity_id=ids["Bob"]))
+    store = get_graph_store()
+    record("batched_delete", (
+        await store.delete_campaign_relationships(campaign_id, 1, 1),
+        await store.delete_campaign_entities(campaign_id, 2, 1),
+        len(await entities.list_entities(campaign_id)),
+    ))
+    record("delete_campaign", await campaigns.delete_campaign(campaign_id))
+    record("campaign_gone", (
+        await campaigns.get_campaign(campaign_id),
+        await entities.list_entities(campaign_id),
+    ))
+    return transcript
+
+
+async def _seed(campaign_id: str, entities: int, degree: int) -> None:
+    from server.repositories.campaigns import ensure_campaign_exists
+    from server.schemas.ingest import IngestRequest
+    from server.services.ingest import ingest
+
+    await ensure_campaign_exists(campaign_id)
+    for start in range(0, entities, BATCH):
+        stop = min(start + BATCH, entities)
+        await ingest(campaign_id, IngestRequest(
+            entities=[{"type": "Character", "name": f"E{i}"} for i in range(start, stop)],
+            relationships=[
+                {"from_entity_name": f"E{i}", "to_entity_name": f"E{(i * 7 + k + 1) % entities}", "type": f"R{k}"}
+                for i in range(start, stop)
+                for k in range(degree)
+            ],
+        ))
+
+
+def _operations(campaign_id: str, entities: int) -> List[Tuple[str, Callable[[int], Awaitable[Any]]]]:
+    from server.repositories import entities as entity_repo, queries, relationships
+    from server.services.paths import find_paths
+
+    async def by_name(i: int):
+        return await entity_repo.get_entity_by_name(campaign_id, f"E{i % entities}")
+
+    async def outgoing(i: int):
+        entity = await by_name(i)
+        return await relationships.list_relationships(campaign_id, from_entity_id=entity["entity_id"])
+
+    async def neighbours(i: int):
+        entity = await by_name(i)
+        return await queries.get_neighbours(campaign_id, [entity["entity_id"]], 20)
+
+    async def subgraph(i: int):
+        return await queries.get_subgraph(campaign_id, name=f"E{i % entities}", depth=2)
+
+    async def paths(i: int):
+        return await find_paths(campaign_id, f"E{i % entities}", f"E{(i * 31 + 17) % entities}", 4, k=3)
+
+    return [
+        ("get_entity_by_name", by_name),
+        ("list_relationships(from)", outgoing),
+        ("get_neighbours", neighbours),
+        ("get_subgraph(depth=2)", subgraph),
+        ("find_paths(k=3)", paths),
+    ]
+
+
+async def _run_backend(backend: str, args: argparse.Namespace, prefix: str) -> Tuple[List[Tuple[str, Any]], List[str]]:
+    from server.core.config import settings
+    from server.repositories.campaigns import delete_campaign
+    from server.repositories.graph_store import close_graph_store, get_graph_store
+
+    settings.graph_backend = backend
+    store = get_graph_store()
+    await store.apply_schema()
+    lines = []
+    created: List[str] = []
+    try:
+        transcript = await _scenario(f"{prefix}-{backend}")
+        for size in args.sizes:
+            campaign_id = f"{prefix}-{backend}-{size}"
+            created.append(campaign_id)
+            started = time.perf_counter()
+            await _seed(campaign_id, size, args.degree)
+            lines.append(f"{backend:<7} {size:>6} {'ingest':<26} {'total':>9} {(time.perf_counter() - started) * 1000:>9.0f}")
+            for label, operation in _operations(campaign_id, size):
+                timings = []
+                for i in range(args.queries):
+                    started = time.perf_counter()
+                    await operation(i)
+                    timings.append(time.perf_counter() - started)
+                lines.append(
+                    f"{backend:<7} {size:>6} {label:<26} "
+                    f"{statistics.median(timings) * 1000:>9.2f} {_percentile(timings, 0.95):>9.2f}"
+                )
+    finally:
+        for campaign_id in created:
+            await delete_campaign(campaign_id)
+        await close_graph_store()
+    return transcript, lines
+
+
+async def _run(args: argparse.Namespace) -> int:
+    from server.db.sqlite_schema import apply_sqlite_schema
+
+    apply_sqlite_schema()
+    prefix = f"bench-{uuid4().hex[:8]}"
+    transcripts: Dict[str, List[Tuple[str, Any]]] = {}
+    lines: List[str] = []
+    for backend in args.backends:
+        transcripts[backend], backend_lines = await _run_backend(backend, args, prefix)
+        lines.extend(backend_lines)
+
+    failures = 0
+    reference_backend = args.backends[0]
+    reference = dict(transcripts[reference_backend])
+    for backend in args.backends[1:]:
+        for step, value in transcripts[backend]:
+            if reference.get(step) != value:
+                failures += 1
+                print(f"MISMATCH {step}: {reference_backend}={reference.get(step)!r} {backend}={value!r}")
+    print(f"conformance: {len(reference)} steps, {failures} mismatches across {', '.join(args.backends)}")
+
+    print(f"{'backend':<7} {'size':>6} {'operation':<26} {'p50 ms':>9} {'p95 ms':>9}")
+    for line in lines:
+        print(line)
+    return 1 if failures else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", type=lambda value: value.split(","), default=["sqlite"])
+    parser.add_argument("--sizes", type=lambda value: [int(v) for v in value.split(",")], default=[500, 2000, 5000])
+    parser.add_argument("--degree", type=int, default=3, help="每个实体的出边数")
+    parser.add_argument("--queries", type=int, default=200, help="每项操作的执行次数")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="tarven-graph-store-")
+    os.environ["SQLITE_DB_PATH"] = os.path.join(workdir, "graph_store.db")
+    sys.exit(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main()
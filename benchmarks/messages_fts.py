@@ -0,0 +1,127 @@
+"""
+Latency benchmark: FTS5 (trigram / bigram) vs LIKE scan for message search.
+
+用法:
+    python -m benchmarks.messages_fts --messages 100000 --campaigns 4
+
+在临时数据库中为目标战役写入合成的中文对话（另有若干干扰战役）。
+词表为随机汉字组成的 2~4 字词，按 Zipf 分布抽样，查询词取中低频词，
+分为 3 字及以上（trigram 索引）、2 字和单字（二元组索引）三组。
+对同一组查询词分别用 LIKE '%词%' 全表扫描和 search_messages（FTS5 + BM25）检索，
+输出两者的延迟分位数与命中条数。
+"""
+import argparse
+import os
+import tempfile
+import time
+from uuid import uuid4
+
+import numpy as np
+
+VOCABULARY = 5000
+
+
+def _build_vocabulary(rng: np.random.Generator):
+    chars = [chr(code) for code in rng.integers(0x4E00, 0x9FA5, VOCABULARY * 4)]
+    lengths = rng.integers(2, 5, VOCABULARY)
+    words, position = [], 0
+    for length in lengths.tolist():
+        words.append("".join(chars[position:position + length]))
+        position += length
+    weights = 1.0 / np.arange(1, VOCABULARY + 1)
+    return words, weights / weights.sum()
+
+
+def _percentile(values, q):
+    return float(np.percentile(np.array(values) * 1000, q))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000, help="目标战役的消息数")
+    parser.add_argument("--campaigns", type=int, default=4, help="战役总数（其余为干扰数据）")
+    parser.add_argument("--length", type=int, default=40, help="每条消息的词数")
+    parser.add_argument("--queries", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="tarven-fts-")
+    os.environ["SQLITE_DB_PATH"] = os.path.join(workdir, "bench.db")
+
+    from server.db.sqlite import get_cursor
+    from server.db.sqlite_schema import apply_sqlite_schema
+    from server.repositories.sqlite_messages import search_messages
+    from server.repositories.utils import bigram_text
+
+    apply_sqlite_schema()
+    rng = np.random.default_rng(42)
+    words, weights = _build_vocabulary(rng)
+
+    started = time.perf_counter()
+    with get_cursor() as cursor:
+        for campaign in range(args.campaigns):
+            picks = rng.choice(VOCABULARY, size=(args.messages, args.length), p=weights)
+            cursor.executemany(
+                """INSERT INTO messages (message_id, campaign_id, role, content)
+                   VALUES (?, ?, 'user', ?)""",
+                (
+                    (str(uuid4()), f"bench{campaign}", "".join(words[i] for i in row))
+                    for row in picks
+                ),
+            )
+        # 二元组索引由 store_message 维护，批量写入时直接补上
+        cursor.execute("SELECT id, content FROM messages")
+        cursor.executemany(
+            "INSERT INTO messages_bigram (rowid, content) VALUES (?, ?)",
+            ((row["id"], bigram_text(row["content"])) for row in cursor.fetchall()),
+        )
+    print(
+        f"inserted {args.messages * args.campaigns} messages "
+        f"({args.campaigns} campaigns) in {time.perf_counter() - started:.1f}s"
+    )
+
+    # 中低频词，按长度分组；每组一半查询为双词组合
+    groups = [
+        [w for w in words[100:2000] if len(w) >= 3],
+        [w for w in words[100:2000] if len(w) == 2],
+        [w[-1] for w in words[100:2000]],
+    ]
+    queries = []
+    for candidates in groups:
+        picks = rng.choice(len(candidates), size=(args.queries, 2), replace=False)
+        queries.extend(
+            candidates[a] if n % 2 == 0 else f"{candidates[a]} {candidates[b]}"
+            for n, (a, b) in enumerate(picks.tolist())
+        )
+
+    print(f"{'query':<12} {'like p50':>9} {'like p99':>9} {'fts p50':>9} {'fts p99':>9} {'hits':>6}")
+    for query in queries:
+        terms = query.split()
+        like_filters = " AND ".join(["content LIKE ?"] * len(terms))
+        like_times, fts_times = [], []
+        hits = 0
+        for _ in range(args.repeat):
+            begin = time.perf_counter()
+            with get_cursor() as cursor:
+                cursor.execute(
+                    f"""SELECT message_id, content FROM messages
+                        WHERE campaign_id = ? AND {like_filters}
+                        ORDER BY created_at DESC LIMIT ?""",
+                    ["bench0"] + [f"%{t}%" for t in terms] + [args.limit],
+                )
+                cursor.fetchall()
+            like_times.append(time.perf_counter() - begin)
+
+            begin = time.perf_counter()
+            hits = len(search_messages("bench0", terms, limit=args.limit))
+            fts_times.append(time.perf_counter() - begin)
+
+        print(
+            f"{query:<12} {_percentile(like_times, 50):8.2f}ms {_percentile(like_times, 99):8.2f}ms "
+            f"{_percentile(fts_times, 50):8.2f}ms {_percentile(fts_times, 99):8.2f}ms {hits:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
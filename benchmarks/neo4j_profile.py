@@ -0,0 +1,215 @@
+"""
+PROFILE regression check: db hits of every repository query must not depend on other campaigns.
+
+用法:
+    docker compose up -d neo4j
+    python -m benchmarks.neo4j_profile --entities 2000 --noise-campaigns 4
+
+先写入目标战役，用 PROFILE 执行每个仓储函数并记录 db hits；再写入若干同名实体的
+干扰战役（规模为目标战役的 --noise-campaigns 倍）后重新测量。
+以战役为入口的查询两次结果应基本一致；单点查找另有固定上限 POINT_BUDGET。
+任一查询超出（增长超过 --tolerance 或超过上限）时以非零状态退出。
+结束时删除本次创建的战役（--keep 保留）。
+
+同样的检查以较小规模作为 tests/test_neo4j_profile.py 运行；这里用于在更大数据量上复测。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+# 单点查找（唯一约束命中）的 db hits 上限
+POINT_BUDGET = 64
+# 允许的 db hits 相对增长
+TOLERANCE = 0.1
+BATCH = 250
+
+
+def _db_hits(plan: Optional[Dict[str, Any]]) -> int:
+    if not plan:
+        return 0
+    return plan.get("dbHits", 0) + sum(_db_hits(child) for child in plan.get("children", []))
+
+
+class _ProfiledResult:
+    """透传结果；结果读完时取出 PROFILE 统计"""
+
+    def __init__(self, result, sink: List[int]) -> None:
+        self._result = result
+        self._sink = sink
+
+    async def _collect(self):
+        summary = await self._result.consume()
+        self._sink.append(_db_hits(summary.profile))
+        return summary
+
+    async def single(self):
+        record = await self._result.single()
+        await self._collect()
+        return record
+
+    async def consume(self):
+        return await self._collect()
+
+    async def __aiter__(self):
+        async for record in self._result:
+            yield record
+        await self._collect()
+
+
+class _ProfiledTx:
+    def __init__(self, tx, sink: List[int]) -> None:
+        self._tx = tx
+        self._sink = sink
+
+    async def run(self, query: str, parameters: Optional[Dict[str, Any]] = None, **kwargs: Any):
+        result = await self._tx.run("PROFILE " + query, parameters, **kwargs)
+        return _ProfiledResult(result, self._sink)
+
+
+@contextmanager
+def _profiling(sink: List[int]):
+    """让 execute_read / execute_write 中的每条语句以 PROFILE 执行"""
+    from server.db import neo4j as neo4j_db
+
+    original = neo4j_db._bounded
+
+    def profiled(work):
+        async def run(tx, *args, **kwargs):
+            return await work(_ProfiledTx(tx, sink), *args, **kwargs)
+        return original(run)
+
+    neo4j_db._bounded = profiled
+    try:
+        yield
+    finally:
+        neo4j_db._bounded = original
+
+
+async def seed(campaign_id: str, entities: int, degree: int) -> None:
+    from server.repositories.campaigns import ensure_campaign_exists
+    from server.schemas.ingest import IngestRequest
+    from server.services.ingest import ingest
+
+    await ensure_campaign_exists(campaign_id)
+    for start in range(0, entities, BATCH):
+        stop = min(start + BATCH, entities)
+        payload = IngestRequest(
+            entities=[{"type": "Character", "name": f"E{i}"} for i in range(start, stop)],
+            relationships=[
+                {"from_entity_name": f"E{i}", "to_entity_name": f"E{(i * 7 + k + 1) % entities}", "type": f"R{k}"}
+                for i in range(start, stop)
+                for k in range(degree)
+            ],
+        )
+        await ingest(campaign_id, payload)
+
+
+def profile_calls(campaign_id: str, ids: Dict[str, str], entities: int) -> List[Tuple[str, bool, Callable[[], Awaitable[Any]]]]:
+    """(名称, 是否单点查找, 调用)"""
+    from server.repositories import campaigns, entities as entity_repo, queries, relationships
+
+    names = [f"E{i}" for i in range(0, entities, max(1, entities // 50))]
+    a, b = ids["E1"], ids["E2"]
+    return [
+        ("get_campaign", True, lambda: campaigns.get_campaign(campaign_id)),
+        ("get_entity", True, lambda: entity_repo.get_entity(campaign_id, a)),
+        ("get_entity_by_name", True, lambda: entity_repo.get_entity_by_name(campaign_id, "E1")),
+        ("list_entities(name)", True, lambda: entity_repo.list_entities(campaign_id, name="E1")),
+        ("list_entities", False, lambda: entity_repo.list_entities(campaign_id)),
+        ("create_entity(existing)", True, lambda: entity_repo.create_entity(campaign_id, "Character", "E1", {}, {})),
+        ("update_entity", True, lambda: entity_repo.update_entity(campaign_id, a, {})),
+        ("resolve_entity_names(50)", False, lambda: entity_repo.resolve_entity_names(campaign_id, names)),
+        ("create_relationship", True, lambda: relationships.create_relationship(campaign_id, a, b, "PROFILE", {})),
+        ("list_relationships(from)", False, lambda: relationships.list_relationships(campaign_id, from_entity_id=a)),
+        ("list_relationships(to)", False, lambda: relationships.list_relationships(campaign_id, to_entity_id=b)),
+        ("list_relationships", False, lambda: relationships.list_relationships(campaign_id)),
+        ("delete_relationship", False, lambda: relationships.delete_relationship(campaign_id, str(uuid4()))),
+        ("get_adjacency", False, lambda: queries.get_adjacency(campaign_id, [a, b])),
+        ("get_sampled_adjacency", False, lambda: queries.get_sampled_adjacency(campaign_id, [a, b], 50)),
+        ("get_subgraph(depth=2)", False, lambda: queries.get_subgraph(campaign_id, name="E1", depth=2)),
+        ("get_neighbours", False, lambda: queries.get_neighbours(campaign_id, [a, b], 20)),
+    ]
+
+
+async def measure(calls) -> Dict[str, int]:
+    hits: Dict[str, int] = {}
+    for label, _, call in calls:
+        sink: List[int] = []
+        with _profiling(sink):
+            await call()
+        hits[label] = sum(sink)
+    return hits
+
+
+def compare(calls, before: Dict[str, int], after: Dict[str, int], tolerance: float = TOLERANCE) -> Dict[str, str]:
+    """逐个查询比较加入干扰战役前后的 db hits：ok / GROWS（随其他战役增长）/ BUDGET（单点查找超出上限）"""
+    statuses: Dict[str, str] = {}
+    for label, point, _ in calls:
+        status = "ok"
+        if after[label] > before[label] * (1 + tolerance) + 4:
+            status = "GROWS"
+        elif point and after[label] > POINT_BUDGET:
+            status = "BUDGET"
+        statuses[label] = status
+    return statuses
+
+
+async def _run(args: argparse.Namespace) -> int:
+    from server.db.sqlite_schema import apply_sqlite_schema
+    from server.repositories.campaigns import delete_campaign
+    from server.repositories.entities import resolve_entity_names
+    from server.repositories.graph_store import close_graph_store, get_graph_store
+
+    await get_graph_store().apply_schema()
+    apply_sqlite_schema()
+    target = f"profile-{uuid4().hex[:8]}"
+    noise = [f"{target}-noise{n}" for n in range(args.noise_campaigns)]
+    try:
+        await seed(target, args.entities, args.degree)
+        resolved = await resolve_entity_names(target, ["E1", "E2"])
+        ids = {name: row["entity_id"] for name, row in resolved.items()}
+        calls = profile_calls(target, ids, args.entities)
+
+        before = await measure(calls)
+        for campaign_id in noise:
+            await seed(campaign_id, args.entities, args.degree)
+        after = await measure(calls)
+    finally:
+        if not args.keep:
+            for campaign_id in [target] + noise:
+                await delete_campaign(campaign_id)
+        await close_graph_store()
+
+    print(
+        f"target={target} entities={args.entities} degree={args.degree} "
+        f"noise_campaigns={args.noise_campaigns}"
+    )
+    print(f"{'query':<26} {'hits':>9} {'w/ noise':>9} {'status':>8}")
+    statuses = compare(calls, before, after, args.tolerance)
+    for label, status in statuses.items():
+        print(f"{label:<26} {before[label]:>9} {after[label]:>9} {status:>8}")
+    return 1 if any(status != "ok" for status in statuses.values()) else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entities", type=int, default=2000, help="每个战役的实体数")
+    parser.add_argument("--degree", type=int, default=3, help="每个实体的出边数")
+    parser.add_argument("--noise-campaigns", type=int, default=4)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="允许的 db hits 相对增长")
+    parser.add_argument("--keep", action="store_true", help="保留测试战役")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="tarven-profile-")
+    os.environ["SQLITE_DB_PATH"] = os.path.join(workdir, "profile.db")
+    os.environ["GRAPH_BACKEND"] = "neo4j"
+    sys.exit(asyncio.run(_run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Recall@k / latency benchmark: exact vs approximate (IVF) vector search.
+
+用法:
+    python -m benchmarks.vector_ann --rows 50000 --dim 384 --nprobe 16
+
+在临时目录中构造带簇结构的合成语料，分别用精确与近似模式查询，
+输出 recall@k 与延迟分位数。
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+def _percentile(values, q):
+    return float(np.percentile(np.array(values) * 1000, q))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--nlist", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="tarven-ann-")
+    os.environ["SQLITE_DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["VECTOR_SEARCH_MODE"] = "approximate"
+    os.environ["VECTOR_ANN_NPROBE"] = str(args.nprobe)
+    os.environ["VECTOR_ANN_NLIST"] = str(args.nlist)
+
+    from server.db import vector
+    from server.db.sqlite import get_cursor
+    from server.db.sqlite_schema import apply_sqlite_schema
+
+    apply_sqlite_schema()
+    rng = np.random.default_rng(42)
+    centers = rng.normal(size=(args.clusters, args.dim)).astype(np.float32)
+    labels = rng.integers(0, args.clusters, args.rows)
+    corpus = centers[labels] + rng.normal(scale=0.6, size=(args.rows, args.dim)).astype(np.float32)
+
+    started = time.perf_counter()
+    with get_cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO embeddings (campaign_id, ref_type, ref_id, embedding) VALUES (?, ?, ?, ?)",
+            (("bench", "message", f"m{i}", corpus[i].tobytes()) for i in range(args.rows)),
+        )
+    print(f"inserted {args.rows} x {args.dim} rows in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    vector.train_ann_index("bench", "message")
+    print(f"loaded + trained IVF in {time.perf_counter() - started:.2f}s")
+
+    queries = centers[rng.integers(0, args.clusters, args.queries)]
+    queries = queries + rng.normal(scale=0.6, size=queries.shape).astype(np.float32)
+
+    timings = {"exact": [], "approximate": []}
+    results = {"exact": [], "approximate": []}
+    for query in queries:
+        payload = query.tolist()
+        for mode in ("exact", "approximate"):
+            started = time.perf_counter()
+            found = vector.search_similar(payload, "message", args.k, mode=mode, campaign_id="bench")
+            timings[mode].append(time.perf_counter() - started)
+            results[mode].append({ref_id for _, ref_id, _ in found})
+
+    hits = sum(len(e & a) for e, a in zip(results["exact"], results["approximate"]))
+    recall = hits / sum(len(e) for e in results["exact"])
+
+    status = vector.get_vector_index_status()["partitions"][0]
+    print(f"nlist={status['ann']['nlist']} nprobe={args.nprobe}")
+    for mode in ("exact", "approximate"):
+        print(
+            f"{mode:>11}: p50={_percentile(timings[mode], 50):.2f}ms "
+            f"p99={_percentile(timings[mode], 99):.2f}ms"
+        )
+    print(f"recall@{args.k}: {recall:.4f}")
+
+
+if __name__ == "__main__":
+    main()
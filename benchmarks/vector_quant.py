@@ -0,0 +1,85 @@
+"""
+Memory / recall benchmark for quantized embedding storage.
+
+用法:
+    python -m benchmarks.vector_quant --rows 50000 --dim 768 --rescore 4
+
+对同一份合成语料分别以 float32 / float16 / int8 精度加载分区，
+输出常驻内存、相对 float32 节省的比例、recall@k 与查询延迟。
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore", type=int, default=4)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="tarven-quant-")
+    os.environ["SQLITE_DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["VECTOR_RESCORE_FACTOR"] = str(args.rescore)
+
+    from server.core.config import settings
+    from server.db import vector
+    from server.db.sqlite_schema import apply_sqlite_schema
+    from server.db.vector_quant import PRECISIONS
+
+    apply_sqlite_schema()
+    rng = np.random.default_rng(42)
+    centers = rng.normal(size=(args.clusters, args.dim)).astype(np.float32)
+    labels = rng.integers(0, args.clusters, args.rows)
+    corpus = centers[labels] + rng.normal(scale=0.8, size=(args.rows, args.dim)).astype(np.float32)
+
+    # 通过 legacy BLOB 路径批量写入，首次加载分区时一次性迁入段文件
+    from server.db.sqlite import get_cursor
+    with get_cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO embeddings (campaign_id, ref_type, ref_id, embedding) VALUES (?, ?, ?, ?)",
+            (("bench", "message", f"m{i}", corpus[i].tobytes()) for i in range(args.rows)),
+        )
+
+    queries = centers[rng.integers(0, args.clusters, args.queries)]
+    queries = queries + rng.normal(scale=0.8, size=queries.shape).astype(np.float32)
+    payloads = [query.tolist() for query in queries]
+
+    baseline = None
+    baseline_bytes = None
+    print(f"rows={args.rows} dim={args.dim} k={args.k} rescore_factor={args.rescore}")
+    for precision in PRECISIONS:
+        settings.vector_storage_precision = precision
+        vector.reset_index()
+        vector.search_similar(payloads[0], "message", args.k, campaign_id="bench")
+
+        timings = []
+        found = []
+        for payload in payloads:
+            started = time.perf_counter()
+            hits = vector.search_similar(payload, "message", args.k, campaign_id="bench")
+            timings.append(time.perf_counter() - started)
+            found.append({ref_id for _, ref_id, _ in hits})
+
+        resident = vector.get_vector_index_status()["partitions"][0]["resident_bytes"]
+        if baseline is None:
+            baseline, baseline_bytes = found, resident
+        recall = sum(len(a & b) for a, b in zip(baseline, found)) / sum(len(a) for a in baseline)
+        print(
+            f"{precision:>8}: resident={resident / 2**20:8.1f}MiB "
+            f"saved={1 - resident / baseline_bytes:6.1%} "
+            f"recall@{args.k}={recall:.4f} "
+            f"p50={np.percentile(timings, 50) * 1000:.2f}ms "
+            f"p99={np.percentile(timings, 99) * 1000:.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
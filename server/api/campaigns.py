@@ -1,20 +1,28 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 
+from server.db.sqlite import run_sqlite
 from server.repositories.campaigns import (
     create_campaign,
-    delete_campaign,
     get_campaign,
     list_campaigns,
     update_campaign,
 )
-from server.schemas.campaigns import CampaignCreate, CampaignResponse, CampaignUpdate
+from server.repositories.sqlite_changes import get_changes
+from server.schemas.campaigns import (
+    CampaignChanges,
+    CampaignCreate,
+    CampaignDeletionStatus,
+    CampaignResponse,
+    CampaignUpdate,
+)
+from server.services.campaign_deletion import get_deletion_status, start_campaign_deletion
 
 router = APIRouter(prefix="/api/campaigns", tags=["campaigns"])
 
 
 @router.post("", response_model=CampaignResponse)
 async def create_campaign_handler(payload: CampaignCreate):
-    campaign = create_campaign(
+    campaign = await create_campaign(
         payload.name,
         payload.system,
         payload.description,
@@ -26,12 +34,12 @@ async def create_campaign_handler(payload: CampaignCreate):
 
 @router.get("", response_model=list[CampaignResponse])
 async def list_campaigns_handler():
-    return list_campaigns()
+    return await list_campaigns()
 
 
 @router.get("/{campaign_id}", response_model=CampaignResponse)
 async def get_campaign_handler(campaign_id: str):
-    campaign = get_campaign(campaign_id)
+    campaign = await get_campaign(campaign_id)
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
     return campaign
@@ -40,15 +48,34 @@ async def get_campaign_handler(campaign_id: str):
 @router.put("/{campaign_id}", response_model=CampaignResponse)
 async def update_campaign_handler(campaign_id: str, payload: CampaignUpdate):
     updates = payload.model_dump(exclude_unset=True)
-    campaign = update_campaign(campaign_id, updates)
+    campaign = await update_campaign(campaign_id, updates)
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
     return campaign
 
 
-@router.delete("/{campaign_id}")
+@router.delete("/{campaign_id}", status_code=202, response_model=CampaignDeletionStatus)
 async def delete_campaign_handler(campaign_id: str):
-    deleted = delete_campaign(campaign_id)
-    if not deleted:
+    # 后台分批删除，进度见 GET /{campaign_id}/deletion
+    job = await start_campaign_deletion(campaign_id)
+    if not job:
         raise HTTPException(status_code=404, detail="Campaign not found")
-    return {"status": "deleted"}
+    return job
+
+
+@router.get("/{campaign_id}/deletion", response_model=CampaignDeletionStatus)
+async def get_campaign_deletion_handler(campaign_id: str):
+    job = get_deletion_status(campaign_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="No deletion job for this campaign")
+    return job
+
+
+@router.get("/{campaign_id}/changes", response_model=CampaignChanges)
+async def get_campaign_changes_handler(
+    campaign_id: str,
+    since: int = Query(default=0, ge=0, description="上次同步到的 version，0 表示从头开始"),
+    limit: int = Query(default=1000, ge=1, le=5000),
+):
+    """since 之后实体、关系、消息的变更，同一对象只返回最后一条"""
+    return await run_sqlite(get_changes, campaign_id, since, limit)
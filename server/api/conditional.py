@@ -0,0 +1,54 @@
+"""
+Conditional GET middleware for tarven-note.
+子图、实体、关系、路径接口的 ETag / If-None-Match 处理和响应缓存，见 server/db/response_cache.py。
+处理函数可以设置 Cache-Control: no-store（例如路径搜索预算耗尽），这样的响应不缓存也不带 ETag。
+"""
+import re
+
+from fastapi import Request, Response
+
+from server.db import response_cache
+
+CONDITIONAL_ROUTES = re.compile(
+    r"^/api/campaigns/(?P<campaign_id>[^/]+)/(?:subgraph|paths|relationships|entities(?:/[^/]+)?)$"
+)
+# 随响应体一起缓存的响应头
+CACHED_HEADERS = ("content-type", "x-next-cursor")
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    """弱比较：忽略 W/ 前缀"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+async def conditional_get(request: Request, call_next):
+    match = CONDITIONAL_ROUTES.match(request.scope["path"])
+    if request.method != "GET" or match is None:
+        return await call_next(request)
+
+    campaign_id = match["campaign_id"]
+    key = (request.scope["path"], str(sorted(request.query_params.multi_items())))
+    version = await response_cache.get_version(campaign_id)
+    etag = response_cache.make_etag(version, key)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, etag):
+        response_cache.not_modified()
+        return Response(status_code=304, headers={"ETag": etag})
+
+    cached = response_cache.lookup(campaign_id, key, version)
+    if cached is not None:
+        return Response(content=cached.body, headers={**cached.headers, "ETag": etag})
+
+    response = await call_next(request)
+    if response.status_code != 200 or "no-store" in response.headers.get("cache-control", ""):
+        return response
+    if not response_cache.enabled():
+        response.headers["ETag"] = etag
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = {name: value for name, value in response.headers.items() if name in CACHED_HEADERS}
+    response_cache.store(campaign_id, key, version, body, headers)
+    return Response(content=body, headers={**headers, "ETag": etag})
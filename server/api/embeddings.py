@@ -0,0 +1,16 @@
+"""
+Embedding pipeline API endpoints for tarven-note.
+"""
+from fastapi import APIRouter
+
+from server.db.sqlite import run_sqlite
+from server.services.embedding_worker import get_embedding_status
+
+router = APIRouter(prefix="/api/embeddings", tags=["embeddings"])
+
+
+@router.get("/status")
+async def embedding_status():
+    """嵌入队列与重新嵌入进度"""
+    return await run_sqlite(get_embedding_status)
+
@@ -1,7 +1,8 @@
-import logging
+from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 
+from server.db.sqlite import run_sqlite
 from server.repositories.entities import (
     create_entity,
     delete_entity,
@@ -9,34 +10,49 @@ from server.repositories.entities import (
     list_entities,
     update_entity,
 )
-from server.repositories.sqlite_entities import get_entity_by_name as sqlite_get_entity
+from server.repositories.sqlite_entities import get_entities_by_names, get_entity_by_name as sqlite_get_entity
+from server.repositories.utils import decode_cursor, encode_cursor
 from server.schemas.entities import EntityCreate, EntityResponse, EntityUpdate
-
-logger = logging.getLogger(__name__)
+from server.services.embedding_worker import notify_worker
 
 router = APIRouter(prefix="/api/campaigns/{campaign_id}/entities", tags=["entities"])
 
+# 可按 fields 投影的字段；entity_id / type / name 总是返回
+PROJECTABLE_FIELDS = ("properties", "metadata")
+# SQLite 行中不属于 properties 的基础字段
+SQLITE_BASE_KEYS = {"id", "entity_id", "campaign_id", "type", "name", "created_at", "updated_at"}
+
+
+def _properties(sqlite_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """SQLite 行 → properties：过滤掉基础字段和 null 值"""
+    if not sqlite_data:
+        return {}
+    return {
+        k: v for k, v in sqlite_data.items()
+        if k not in SQLITE_BASE_KEYS and v is not None
+    }
+
 
-def _enrich_entity(campaign_id: str, entity: dict) -> dict:
+async def _enrich_entity(campaign_id: str, entity: dict) -> dict:
     """从SQLite补充属性数据"""
-    sqlite_data = sqlite_get_entity(campaign_id, entity["name"])
-    logger.info(f"_enrich_entity: campaign_id={campaign_id}, name={entity['name']}, sqlite_data={sqlite_data is not None}")
-    if sqlite_data:
-        # 过滤掉基础字段和null值
-        skip_keys = {"id", "entity_id", "campaign_id", "type", "name", "created_at", "updated_at"}
-        entity["properties"] = {
-            k: v for k, v in sqlite_data.items()
-            if k not in skip_keys and v is not None
-        }
-        logger.info(f"_enrich_entity: properties keys={list(entity['properties'].keys())}")
-    else:
-        entity["properties"] = {}
+    sqlite_data = await run_sqlite(sqlite_get_entity, campaign_id, entity["name"])
+    entity["properties"] = _properties(sqlite_data)
     return entity
 
 
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    if fields is None:
+        return list(PROJECTABLE_FIELDS)
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = set(selected) - set(PROJECTABLE_FIELDS) - {"entity_id", "type", "name"}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [field for field in PROJECTABLE_FIELDS if field in selected]
+
+
 @router.post("", response_model=EntityResponse)
 async def create_entity_handler(campaign_id: str, payload: EntityCreate):
-    entity = create_entity(
+    entity = await create_entity(
         campaign_id,
         payload.type,
         payload.name,
@@ -46,26 +62,56 @@ async def create_entity_handler(campaign_id: str, payload: EntityCreate):
     return entity
 
 
-@router.get("", response_model=list[EntityResponse])
+@router.get("", response_model=list[EntityResponse], response_model_exclude_unset=True)
 async def list_entities_handler(
     campaign_id: str,
+    response: Response,
     type: str | None = Query(default=None),
     name: str | None = Query(default=None),
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    after: str | None = Query(default=None, description="上一页响应头 X-Next-Cursor 的值"),
+    fields: str | None = Query(default=None, description="逗号分隔，可选 properties,metadata"),
 ):
-    entities = list_entities(campaign_id, entity_type=type, name=name)
-    result = [_enrich_entity(campaign_id, e) for e in entities]
-    logger.info(f"list_entities_handler: returning {len(result)} entities")
-    if result:
-        logger.info(f"list_entities_handler: first entity properties={result[0].get('properties')}")
+    # 不传 limit 时返回全部实体（按名称排序）；传 limit 时按名称 keyset 分页
+    projected = _parse_fields(fields)
+    after_name = None
+    if after:
+        try:
+            after_name = decode_cursor(after)["name"]
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    entities = await list_entities(
+        campaign_id,
+        entity_type=type,
+        name=name,
+        after=after_name,
+        limit=limit + 1 if limit is not None else None,
+    )
+    if limit is not None and len(entities) > limit:
+        entities = entities[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor({"name": entities[-1]["name"]})
+
+    # 一页一次批量查询补充属性
+    sqlite_rows: Dict[str, Dict[str, Any]] = {}
+    if "properties" in projected and entities:
+        sqlite_rows = await run_sqlite(get_entities_by_names, campaign_id, [e["name"] for e in entities])
+    result = []
+    for entity in entities:
+        item = {"entity_id": entity["entity_id"], "type": entity["type"], "name": entity["name"]}
+        if "properties" in projected:
+            item["properties"] = _properties(sqlite_rows.get(entity["name"]))
+        if "metadata" in projected:
+            item["metadata"] = entity.get("metadata")
+        result.append(item)
     return result
 
 
 @router.get("/{entity_id}", response_model=EntityResponse)
 async def get_entity_handler(campaign_id: str, entity_id: str):
-    entity = get_entity(campaign_id, entity_id)
+    entity = await get_entity(campaign_id, entity_id)
     if not entity:
         raise HTTPException(status_code=404, detail="Entity not found")
-    return _enrich_entity(campaign_id, entity)
+    return await _enrich_entity(campaign_id, entity)
 
 
 @router.put("/{entity_id}", response_model=EntityResponse)
@@ -75,15 +121,18 @@ async def update_entity_handler(
     payload: EntityUpdate,
 ):
     updates = payload.model_dump(exclude_unset=True)
-    entity = update_entity(campaign_id, entity_id, updates)
+    entity = await update_entity(campaign_id, entity_id, updates)
     if not entity:
         raise HTTPException(status_code=404, detail="Entity not found")
+    if updates.get("name"):
+        # 改名后实体重新排队嵌入
+        notify_worker()
     return entity
 
 
 @router.delete("/{entity_id}")
 async def delete_entity_handler(campaign_id: str, entity_id: str):
-    deleted = delete_entity(campaign_id, entity_id)
+    deleted = await delete_entity(campaign_id, entity_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Entity not found")
     return {"status": "deleted"}
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException
 
+from server.db import entity_directory
 from server.repositories.entities import create_entity, get_entity_by_name
 from server.repositories.relationships import create_relationship
 from server.schemas.extract import ExtractRequest, ExtractResponse
@@ -15,38 +16,57 @@ async def extract_handler(campaign_id: str, payload: ExtractRequest):
         raise HTTPException(status_code=501, detail="LLM extraction not configured")
 
     entity_map: dict[str, str] = {}
+    # 已知别名写入对应实体，而不是创建新实体
+    canonical = await entity_directory.canonical_names(campaign_id, [entity.name for entity in extraction.entities])
 
     for entity in extraction.entities:
-        created = create_entity(
+        created = await create_entity(
             campaign_id,
             entity.type,
-            entity.name,
+            canonical.get(entity.name, entity.name),
             entity.properties,
             entity.metadata,
         )
-        entity_map[created["name"]] = created["entity_id"]
+        entity_map[entity.name] = entity_map[created["name"]] = created["entity_id"]
 
-    def resolve_entity_id(name: str) -> str:
+    async def resolve_entity_id(name: str, use_directory: bool = True) -> str:
         if name in entity_map:
             return entity_map[name]
-        existing = get_entity_by_name(campaign_id, name)
-        if existing:
-            entity_map[name] = existing["entity_id"]
-            return existing["entity_id"]
-        created = create_entity(campaign_id, "Unknown", name, {}, {})
-        entity_map[name] = created["entity_id"]
-        return created["entity_id"]
+        # 名称目录（含别名）→ 图存储 → 以 Unknown 创建
+        entity_id = await entity_directory.resolve(campaign_id, name) if use_directory else None
+        if entity_id is None:
+            existing = await get_entity_by_name(campaign_id, name)
+            if existing:
+                entity_id = existing["entity_id"]
+                entity_directory.entity_upserted(campaign_id, entity_id, existing["name"])
+            else:
+                entity_id = (await create_entity(campaign_id, "Unknown", name, {}, {}))["entity_id"]
+        entity_map[name] = entity_id
+        return entity_id
 
     for relationship in extraction.relationships:
-        from_id = resolve_entity_id(relationship.from_entity_name)
-        to_id = resolve_entity_id(relationship.to_entity_name)
-        created = create_relationship(
+        names = (relationship.from_entity_name, relationship.to_entity_name)
+        from_id, to_id = [await resolve_entity_id(name) for name in names]
+        created = await create_relationship(
             campaign_id,
             from_id,
             to_id,
             relationship.type,
             relationship.properties,
         )
+        if not created:
+            # 目录只感知本进程的写入：端点可能已被其他进程删除，丢弃目录结果后重新解析一次
+            for name, entity_id in zip(names, (from_id, to_id)):
+                entity_map.pop(name, None)
+                entity_directory.entity_deleted(campaign_id, entity_id)
+            from_id, to_id = [await resolve_entity_id(name, use_directory=False) for name in names]
+            created = await create_relationship(
+                campaign_id,
+                from_id,
+                to_id,
+                relationship.type,
+                relationship.properties,
+            )
         if not created:
             raise HTTPException(status_code=404, detail="Entity not found")
 
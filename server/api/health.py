@@ -1,7 +1,11 @@
 from fastapi import APIRouter
 
-from server.db.neo4j import ping
-from server.db.schema import get_schema_status
+from server.db.entity_directory import get_directory_status
+from server.db.graph_cache import get_cache_status
+from server.db.response_cache import get_response_cache_status
+from server.db.sqlite import ping as sqlite_ping, run_sqlite
+from server.db.vector import get_vector_index_status
+from server.repositories.graph_store import get_graph_store
 
 router = APIRouter()
 
@@ -14,11 +18,41 @@ async def health_check():
 @router.get("/health/schema")
 async def health_schema():
     try:
-        return get_schema_status()
+        return await get_graph_store().schema_status()
     except Exception as exc:
         return {"ok": False, "error": str(exc)}
 
 
+@router.get("/health/graph")
 @router.get("/health/neo4j")
-async def health_neo4j():
-    return ping()
+async def health_graph():
+    store = get_graph_store()
+    return {"backend": store.name, **await store.ping()}
+
+
+@router.get("/health/sqlite")
+async def health_sqlite():
+    return await run_sqlite(sqlite_ping)
+
+
+@router.get("/health/vector")
+async def health_vector(recall: bool = False):
+    try:
+        return await run_sqlite(get_vector_index_status, with_recall=recall)
+    except Exception as exc:
+        return {"ok": False, "error": str(exc)}
+
+
+@router.get("/health/graph-cache")
+async def health_graph_cache():
+    return get_cache_status()
+
+
+@router.get("/health/entity-directory")
+async def health_entity_directory():
+    return get_directory_status()
+
+
+@router.get("/health/response-cache")
+async def health_response_cache():
+    return get_response_cache_status()
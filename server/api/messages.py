@@ -1,11 +1,14 @@
 """
 Message API endpoints for tarven-note.
 """
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
 from typing import List, Dict, Any
 
-from server.repositories.sqlite_messages import store_message, get_recent_messages
+from server.db.sqlite import run_sqlite
+from server.repositories.sqlite_messages import store_message, get_recent_messages, search_messages
+from server.repositories.utils import split_terms
 from server.schemas.messages import MessageCreate
+from server.services.embedding_worker import notify_worker
 
 router = APIRouter(prefix="/api/campaigns/{campaign_id}/messages", tags=["messages"])
 
@@ -13,17 +16,35 @@ router = APIRouter(prefix="/api/campaigns/{campaign_id}/messages", tags=["messag
 @router.post("")
 async def create_message(campaign_id: str, payload: MessageCreate):
     """存储对话消息"""
-    message_id = store_message(
+    message_id = await run_sqlite(
+        store_message,
         campaign_id=campaign_id,
         role=payload.role,
         content=payload.content,
         entity_ids=payload.entity_ids,
     )
+    # 嵌入在后台完成，不阻塞请求
+    notify_worker()
     return {"message_id": message_id}
 
 
 @router.get("")
 async def list_messages(campaign_id: str, limit: int = 10):
     """获取最近的消息"""
-    messages = get_recent_messages(campaign_id, limit)
+    messages = await run_sqlite(get_recent_messages, campaign_id, limit)
+    return {"messages": messages}
+
+
+@router.get("/search")
+async def search_messages_handler(
+    campaign_id: str,
+    q: str = Query(min_length=1),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+):
+    """全文检索消息，按 BM25 排序并返回高亮片段"""
+    terms = split_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="q required")
+    messages = await run_sqlite(search_messages, campaign_id, terms, limit=limit, offset=offset)
     return {"messages": messages}
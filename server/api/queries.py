@@ -1,10 +1,11 @@
-from typing import Literal
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 
-from server.repositories.queries import find_paths, get_subgraph
+from server.repositories.queries import get_subgraph
 from server.schemas.paths import PathsResponse
 from server.schemas.subgraph import SubgraphResponse
+from server.services.paths import find_paths
 
 router = APIRouter(prefix="/api/campaigns/{campaign_id}", tags=["queries"])
 
@@ -12,14 +13,31 @@ router = APIRouter(prefix="/api/campaigns/{campaign_id}", tags=["queries"])
 @router.get("/paths", response_model=PathsResponse)
 async def paths_handler(
     campaign_id: str,
+    response: Response,
     from_name: str = Query(alias="from"),
     to_name: str = Query(alias="to"),
     max_hops: int = Query(default=3, ge=1, le=6),
+    k: int = Query(default=5, ge=1, le=20),
+    rel_type: Optional[List[str]] = Query(default=None),
+    node_type: Optional[List[str]] = Query(default=None),
+    budget_ms: Optional[int] = Query(default=None, ge=10, le=10000),
 ):
     if from_name in {"", "undefined", "null"} or to_name in {"", "undefined", "null"}:
         raise HTTPException(status_code=400, detail="from/to required")
-    paths = find_paths(campaign_id, from_name, to_name, max_hops)
-    return {"paths": paths}
+    result = await find_paths(
+        campaign_id,
+        from_name,
+        to_name,
+        max_hops,
+        k=k,
+        relationship_types=rel_type,
+        node_types=node_type,
+        budget_ms=budget_ms,
+    )
+    if result["partial"]:
+        # 预算耗尽的结果不缓存，重试可能找到更多路径
+        response.headers["Cache-Control"] = "no-store"
+    return result
 
 
 @router.get("/subgraph", response_model=SubgraphResponse)
@@ -29,6 +47,11 @@ async def subgraph_handler(
     name: str = Query(default=None),
     depth: int = Query(default=2, ge=1, le=4),
     detail_level: Literal["skeleton", "summary", "full"] = Query(default="skeleton"),
+    max_nodes: Optional[int] = Query(default=None, ge=1, le=5000),
+    max_edges: Optional[int] = Query(default=None, ge=1, le=20000),
+    degree_cap: Optional[int] = Query(default=None, ge=1, le=1000),
+    sample: Literal["recent", "weight"] = Query(default="recent"),
+    cursor: Optional[str] = Query(default=None),
 ):
     if entity_id in {"", "undefined", "null"}:
         entity_id = None
@@ -36,10 +59,18 @@ async def subgraph_handler(
         name = None
     if not entity_id and not name:
         raise HTTPException(status_code=400, detail="entity_id or name required")
-    return get_subgraph(
-        campaign_id,
-        entity_id=entity_id,
-        name=name,
-        depth=depth,
-        detail_level=detail_level,
-    )
+    try:
+        return await get_subgraph(
+            campaign_id,
+            entity_id=entity_id,
+            name=name,
+            depth=depth,
+            detail_level=detail_level,
+            max_nodes=max_nodes,
+            max_edges=max_edges,
+            degree_cap=degree_cap,
+            sample=sample,
+            cursor=cursor,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
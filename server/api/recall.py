@@ -0,0 +1,21 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+
+from server.schemas.recall import RecallResponse
+from server.services.recall import recall
+
+router = APIRouter(prefix="/api/campaigns/{campaign_id}", tags=["recall"])
+
+
+@router.get("/recall", response_model=RecallResponse)
+async def recall_handler(
+    campaign_id: str,
+    q: str = Query(min_length=1),
+    limit: int = Query(default=10, ge=1, le=50),
+    budget_ms: Optional[int] = Query(default=None, ge=10, le=10000),
+):
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="q required")
+    return await recall(campaign_id, q, limit=limit, budget_ms=budget_ms)
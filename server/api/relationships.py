@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Response
 
 from server.repositories.relationships import (
     create_relationship,
     delete_relationship,
     list_relationships,
 )
+from server.repositories.utils import decode_cursor, encode_cursor
 from server.schemas.relationships import RelationshipCreate, RelationshipResponse
 
 router = APIRouter(prefix="/api/campaigns/{campaign_id}/relationships", tags=["relationships"])
@@ -12,7 +13,7 @@ router = APIRouter(prefix="/api/campaigns/{campaign_id}/relationships", tags=["r
 
 @router.post("", response_model=RelationshipResponse)
 async def create_relationship_handler(campaign_id: str, payload: RelationshipCreate):
-    relationship = create_relationship(
+    relationship = await create_relationship(
         campaign_id,
         payload.from_entity_id,
         payload.to_entity_id,
@@ -27,21 +28,41 @@ async def create_relationship_handler(campaign_id: str, payload: RelationshipCre
 @router.get("", response_model=list[RelationshipResponse])
 async def list_relationships_handler(
     campaign_id: str,
+    response: Response,
     from_entity_id: str | None = Query(default=None),
     to_entity_id: str | None = Query(default=None),
     type: str | None = Query(default=None),
+    limit: int | None = Query(default=None, ge=1, le=1000),
+    after: str | None = Query(default=None, description="上一页响应头 X-Next-Cursor 的值"),
 ):
-    return list_relationships(
+    # 不传 limit 时返回全部关系；传 limit 时按 (from_entity_id, relationship_id) keyset 分页
+    after_key = None
+    if after:
+        try:
+            cursor = decode_cursor(after)
+            after_key = (str(cursor["from"]), str(cursor["id"]))
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    relationships = await list_relationships(
         campaign_id,
         from_entity_id=from_entity_id,
         to_entity_id=to_entity_id,
         relationship_type=type,
+        after=after_key,
+        limit=limit + 1 if limit is not None else None,
     )
+    if limit is not None and len(relationships) > limit:
+        relationships = relationships[:limit]
+        last = relationships[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            {"from": last["from_entity_id"], "id": last["relationship_id"]}
+        )
+    return relationships
 
 
 @router.delete("/{relationship_id}")
 async def delete_relationship_handler(campaign_id: str, relationship_id: str):
-    deleted = delete_relationship(campaign_id, relationship_id)
+    deleted = await delete_relationship(campaign_id, relationship_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Relationship not found")
     return {"status": "deleted"}
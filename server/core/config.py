@@ -1,18 +1,79 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
+    graph_backend: str = "neo4j"  # neo4j | sqlite（嵌入式，无需 Neo4j 进程）
     neo4j_uri: str = "bolt://localhost:7687"
     neo4j_user: str = "neo4j"
     neo4j_password: str = "password"
+    neo4j_max_pool_size: int = 50  # 连接池上限
+    neo4j_acquisition_timeout: float = 30.0  # 等待空闲连接的秒数
+    neo4j_connection_timeout: float = 15.0  # 建立 TCP 连接的秒数
+    neo4j_max_connection_lifetime: int = 3600  # 秒，超过后连接被替换
+    neo4j_max_retry_time: float = 15.0  # 托管事务重试瞬时错误的总时长（秒）
+    neo4j_transaction_timeout: Optional[float] = None  # 单个事务的服务端超时（秒），None 为服务器默认
     llm_base_url: str = ""
     llm_api_key: str = ""
     llm_model: str = ""
 
     # SQLite settings
     sqlite_db_path: str = "data/tarven_note.db"
+    sqlite_pragma_profile: str = "balanced"  # balanced | durable | fast
+    # 单项覆盖预设，None 表示沿用预设值
+    sqlite_synchronous: Optional[str] = None  # OFF | NORMAL | FULL
+    sqlite_cache_size: Optional[int] = None  # 负数单位为 KiB
+    sqlite_mmap_size: Optional[int] = None
+    sqlite_busy_timeout: Optional[int] = None  # 毫秒
+    sqlite_executor_workers: int = 8  # 异步接口访问 SQLite 的线程池大小
     embedding_model: str = "text-embedding-3-small"
     embedding_dim: int = 1536
+    # 嵌入接口，留空时沿用 llm_base_url / llm_api_key
+    embedding_base_url: str = ""
+    embedding_api_key: str = ""
+    embedding_batch_size: int = 64
+    embedding_batch_wait_ms: int = 20  # 攒批等待时间
+    embedding_timeout: float = 30.0
+
+    # Vector search settings
+    vector_search_mode: str = "exact"  # exact | approximate
+    vector_ann_min_size: int = 2048  # 少于该行数时近似模式退化为精确搜索
+    vector_ann_nlist: int = 0  # 0 表示按 sqrt(N) 自动选择
+    vector_ann_nprobe: int = 16
+    vector_storage_precision: str = "float32"  # float32 | float16 | int8
+    vector_rescore_factor: int = 4  # 量化粗排保留 limit × factor 个候选做全精度精排
+
+    # Graph cache settings
+    graph_cache_enabled: bool = False  # 进程内邻接缓存，只感知本进程写入，多进程部署时关闭
+    graph_cache_budget_mb: int = 256  # 所有战役共享的内存预算，超出按 LRU 淘汰
+
+    # Entity directory settings
+    entity_directory_enabled: bool = True  # 进程内 名称 / 别名 → entity_id 目录，供 ingest 与 extract 解析名称
+    entity_directory_max_entries: int = 200000  # 所有战役共享的条目上限，超出按 LRU 淘汰
+
+    # Response cache settings
+    response_cache_enabled: bool = True  # 按战役版本号缓存读接口的响应体，版本号每次从 SQLite 读取，多进程部署同样适用
+    response_cache_budget_mb: int = 64  # 所有缓存响应体共享的内存预算，超出按 LRU 淘汰
+
+    # Subgraph settings
+    subgraph_max_nodes: int = 300  # 每页节点上限
+    subgraph_max_edges: int = 1000  # 每页边上限
+    subgraph_degree_cap: int = 50  # 每个节点最多展开的邻居数，高度数节点按最近更新或权重采样
+
+    # Path settings
+    path_budget_ms: int = 1000  # 路径搜索的时间预算，耗尽时返回已找到的路径
+
+    # Campaign deletion settings
+    campaign_delete_batch_size: int = 500  # 后台删除战役时每个事务删除的行数
+
+    # Change log settings
+    change_log_compact_interval: int = 1000  # 每写入这么多个版本压缩一次该战役的变更日志
+    change_log_retain_versions: int = 10000  # 最近这么多个版本保留完整日志，更早的每个对象只留最后一条，删除记录被丢弃
+
+    # Recall settings
+    recall_budget_ms: int = 800  # 混合召回的时间预算，超时的检索路径被丢弃
+    recall_rrf_k: int = 60  # 倒数排名融合常数
 
     class Config:
         env_file = ".env"
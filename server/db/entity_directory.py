@@ -0,0 +1,219 @@
+"""
+In-process entity name directory for tarven-note.
+按战役缓存 名称 / 别名 → entity_id，ingest 和 extract 解析实体名称时先查这里，
+不必每个请求都向图存储逐个查询反复出现的 NPC 名称。
+
+战役首次访问时从 SQLite 的 entities / entity_aliases 预热，之后由仓储层的写路径
+（创建、改名、删除、ingest）同步更新；未缓存的战役忽略写入通知。规范名称优先于别名。
+目录里查不到的名称（例如只存在于图存储中的实体）由调用方回退到图存储查询，
+查到后通过 entity_upserted 写回。
+
+所有战役共享 settings.entity_directory_max_entries 个条目，超出时按 LRU 淘汰整个战役。
+目录只感知本进程的写入，调用方须能处理过期的 entity_id（见 api/extract.py）。
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from server.core.config import settings
+from server.db.sqlite import run_sqlite
+from server.repositories.sqlite_entities import load_name_directory
+
+logger = logging.getLogger(__name__)
+
+
+class _Directory:
+    """单个战役的名称表与别名表"""
+
+    def __init__(self) -> None:
+        # 规范名称 → entity_id，entity_id → 规范名称
+        self.names: Dict[str, str] = {}
+        self.canonical: Dict[str, str] = {}
+        # 别名 → entity_id
+        self.aliases: Dict[str, str] = {}
+
+    @property
+    def size(self) -> int:
+        return len(self.names) + len(self.aliases)
+
+    def resolve(self, name: str) -> Optional[str]:
+        entity_id = self.names.get(name)
+        if entity_id is None:
+            entity_id = self.aliases.get(name)
+        return entity_id
+
+    def canonical_name(self, name: str) -> str:
+        """别名 → 实体的规范名称；规范名称和未知名称原样返回"""
+        if name in self.names:
+            return name
+        entity_id = self.aliases.get(name)
+        if entity_id is None:
+            return name
+        return self.canonical.get(entity_id, name)
+
+    def upsert(self, entity_id: str, name: Optional[str], aliases: Iterable[str] = ()) -> None:
+        old_name = self.canonical.get(entity_id)
+        if name is not None and old_name != name:
+            if old_name is not None and self.names.get(old_name) == entity_id:
+                del self.names[old_name]
+            self.names[name] = entity_id
+            self.canonical[entity_id] = name
+        for alias in aliases:
+            # 与 entity_aliases 的 UNIQUE(campaign_id, alias) 一致：先写入者保留
+            if isinstance(alias, str):
+                self.aliases.setdefault(alias, entity_id)
+
+    def remove(self, entity_id: str) -> None:
+        name = self.canonical.pop(entity_id, None)
+        if name is not None and self.names.get(name) == entity_id:
+            del self.names[name]
+        for alias in [alias for alias, owner in self.aliases.items() if owner == entity_id]:
+            del self.aliases[alias]
+
+
+# campaign_id → 目录，按最近使用排序
+_directories: "OrderedDict[str, _Directory]" = OrderedDict()
+# 正在预热的战役：预热期间收到写入通知时标记为脏，结果不入缓存
+_loading: Dict[str, "asyncio.Future[_Directory]"] = {}
+_stale: Set[str] = set()
+_stats = {"hits": 0, "misses": 0}
+
+
+def enabled() -> bool:
+    return settings.entity_directory_enabled
+
+
+async def _load(campaign_id: str) -> _Directory:
+    names, aliases = await run_sqlite(load_name_directory, campaign_id)
+    directory = _Directory()
+    for name, entity_id in names:
+        directory.upsert(entity_id, name)
+    for alias, entity_id in aliases:
+        if entity_id in directory.canonical:
+            directory.upsert(entity_id, None, (alias,))
+    return directory
+
+
+def _evict(keep: str) -> None:
+    total = sum(directory.size for directory in _directories.values())
+    for campaign_id in list(_directories):
+        if total <= settings.entity_directory_max_entries:
+            break
+        if campaign_id == keep:
+            continue
+        total -= _directories.pop(campaign_id).size
+        logger.info(f"Evicted entity directory for campaign {campaign_id}")
+
+
+async def get_directory(campaign_id: str) -> _Directory:
+    """取战役的名称目录，未缓存时从 SQLite 预热（并发请求共享一次预热）"""
+    directory = _directories.get(campaign_id)
+    if directory is not None:
+        _directories.move_to_end(campaign_id)
+        return directory
+    pending = _loading.get(campaign_id)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future: "asyncio.Future[_Directory]" = asyncio.get_running_loop().create_future()
+    _loading[campaign_id] = future
+    _stale.discard(campaign_id)
+    try:
+        directory = await _load(campaign_id)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as exc:
+        future.set_exception(exc)
+        future.exception()
+        raise
+    finally:
+        del _loading[campaign_id]
+    future.set_result(directory)
+    if campaign_id in _stale:
+        _stale.discard(campaign_id)
+        return directory
+    _directories[campaign_id] = directory
+    _evict(campaign_id)
+    return directory
+
+
+async def resolve(campaign_id: str, name: str) -> Optional[str]:
+    """名称或别名 → entity_id；目录中没有时返回 None（调用方回退到图存储）"""
+    if not enabled():
+        return None
+    entity_id = (await get_directory(campaign_id)).resolve(name)
+    _stats["hits" if entity_id is not None else "misses"] += 1
+    return entity_id
+
+
+async def canonical_names(campaign_id: str, names: Iterable[str]) -> Dict[str, str]:
+    """一组名称中属于别名的 → 规范名称；未启用时返回空字典"""
+    if not enabled():
+        return {}
+    directory = await get_directory(campaign_id)
+    result = {}
+    for name in names:
+        canonical = directory.canonical_name(name)
+        if canonical != name:
+            result[name] = canonical
+    return result
+
+
+def _cached(campaign_id: str) -> Optional[_Directory]:
+    if campaign_id in _loading:
+        _stale.add(campaign_id)
+    return _directories.get(campaign_id)
+
+
+# 写路径通知（写入提交之后调用）
+
+def entity_upserted(
+    campaign_id: str,
+    entity_id: str,
+    name: Optional[str],
+    aliases: Iterable[str] = (),
+) -> None:
+    directory = _cached(campaign_id)
+    if directory is not None:
+        directory.upsert(entity_id, name, aliases)
+        _evict(campaign_id)
+
+
+def entities_upserted(campaign_id: str, entries: List[Tuple[str, Optional[str], List[str]]]) -> None:
+    """批量通知，entries 为 (entity_id, name, aliases)"""
+    directory = _cached(campaign_id)
+    if directory is not None:
+        for entity_id, name, aliases in entries:
+            directory.upsert(entity_id, name, aliases)
+        _evict(campaign_id)
+
+
+def entity_deleted(campaign_id: str, entity_id: str) -> None:
+    directory = _cached(campaign_id)
+    if directory is not None:
+        directory.remove(entity_id)
+
+
+def drop_campaign(campaign_id: str) -> None:
+    if campaign_id in _loading:
+        _stale.add(campaign_id)
+    _directories.pop(campaign_id, None)
+
+
+def get_directory_status() -> Dict[str, Any]:
+    return {
+        "enabled": enabled(),
+        "max_entries": settings.entity_directory_max_entries,
+        "hits": _stats["hits"],
+        "misses": _stats["misses"],
+        "campaigns": [
+            {
+                "campaign_id": campaign_id,
+                "names": len(directory.names),
+                "aliases": len(directory.aliases),
+            }
+            for campaign_id, directory in _directories.items()
+        ],
+    }
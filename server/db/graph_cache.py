@@ -0,0 +1,312 @@
+"""
+In-process graph cache for tarven-note.
+按战役缓存实体图的邻接结构，子图等遍历查询在 Python 中完成，不再向 Neo4j 发送
+可变长度展开。
+
+每个战役一份 _CampaignGraph：节点表（entity_id / name / type，按下标存放）、
+边表（relationship_id / 端点下标 / type / properties）以及每个节点的邻接数组
+（array('i')，存放关联边的下标，出入边都在内）。每条边带一个递增的版本号，
+写入或更新时取新值，用于按最近更新采样高度数节点的邻居。战役首次访问时从图存储加载，
+之后由仓储层的写路径同步更新；未缓存的战役忽略写入通知。
+
+所有战役共享 settings.graph_cache_budget_mb 的内存预算，超出时按 LRU 淘汰。
+缓存只感知本进程的写入，多进程部署时保持 settings.graph_cache_enabled = False。
+"""
+import asyncio
+import logging
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from server.core.config import settings
+from server.repositories.graph_store import get_graph_store
+
+logger = logging.getLogger(__name__)
+
+# 内存估算：每个节点 / 每条边的固定开销（列表槽位、字典项、数组项）加字符串长度
+NODE_OVERHEAD = 240
+EDGE_OVERHEAD = 200
+
+
+class _CampaignGraph:
+    """单个战役的节点表 + 边表 + 邻接数组"""
+
+    def __init__(self) -> None:
+        self.node_ids: List[Optional[str]] = []
+        self.names: List[Optional[str]] = []
+        self.types: List[Optional[str]] = []
+        self.by_id: Dict[str, int] = {}
+        self.by_name: Dict[str, int] = {}
+        self.adjacency: List[array] = []
+
+        self.edge_ids: List[Optional[str]] = []
+        self.sources = array("i")
+        self.targets = array("i")
+        self.edge_types: List[Optional[str]] = []
+        self.edge_properties: List[Any] = []
+        # 边的版本号，越大越新
+        self.edge_versions = array("q")
+        self.clock = 0
+        self.edges_by_id: Dict[str, int] = {}
+        self.nbytes = 0
+        # 已删除但未回收的节点 / 边槽位
+        self.dead = 0
+
+    @property
+    def wasteful(self) -> bool:
+        """空槽位过多时整体丢弃，下次访问重新加载"""
+        return self.dead > max(1024, len(self.by_id) + len(self.edges_by_id))
+
+    # 节点
+
+    def upsert_node(self, entity_id: str, name: Optional[str], entity_type: Optional[str]) -> int:
+        index = self.by_id.get(entity_id)
+        if index is None:
+            index = len(self.node_ids)
+            self.node_ids.append(entity_id)
+            self.names.append(None)
+            self.types.append(None)
+            self.adjacency.append(array("i"))
+            self.by_id[entity_id] = index
+            self.nbytes += NODE_OVERHEAD + len(entity_id)
+        old_name = self.names[index]
+        if old_name != name:
+            if old_name is not None and self.by_name.get(old_name) == index:
+                del self.by_name[old_name]
+                self.nbytes -= len(old_name)
+            if name is not None:
+                self.by_name[name] = index
+                self.nbytes += len(name)
+        self.names[index] = name
+        self.types[index] = entity_type
+        return index
+
+    def remove_node(self, entity_id: str) -> None:
+        index = self.by_id.pop(entity_id, None)
+        if index is None:
+            return
+        for edge in list(self.adjacency[index]):
+            self._remove_edge(edge)
+        name = self.names[index]
+        if name is not None and self.by_name.get(name) == index:
+            del self.by_name[name]
+        self.node_ids[index] = self.names[index] = self.types[index] = None
+        self.adjacency[index] = array("i")
+        self.nbytes -= NODE_OVERHEAD + len(entity_id) + len(name or "")
+        self.dead += 1
+
+    # 边
+
+    def upsert_edge(
+        self,
+        relationship_id: str,
+        from_id: str,
+        to_id: str,
+        rel_type: Optional[str],
+        properties: Any,
+    ) -> None:
+        source = self.by_id.get(from_id)
+        target = self.by_id.get(to_id)
+        if source is None or target is None:
+            return
+        edge = self.edges_by_id.get(relationship_id)
+        if edge is not None and (self.sources[edge], self.targets[edge]) != (source, target):
+            self._remove_edge(edge)
+            edge = None
+        if edge is None:
+            edge = len(self.edge_ids)
+            self.edge_ids.append(relationship_id)
+            self.sources.append(source)
+            self.targets.append(target)
+            self.edge_types.append(rel_type)
+            self.edge_properties.append(properties)
+            self.edge_versions.append(self._tick())
+            self.edges_by_id[relationship_id] = edge
+            self.adjacency[source].append(edge)
+            if target != source:
+                self.adjacency[target].append(edge)
+            self.nbytes += EDGE_OVERHEAD + len(relationship_id) + len(properties or "")
+            return
+        self.nbytes += len(properties or "") - len(self.edge_properties[edge] or "")
+        self.edge_types[edge] = rel_type
+        self.edge_properties[edge] = properties
+        self.edge_versions[edge] = self._tick()
+
+    def _tick(self) -> int:
+        self.clock += 1
+        return self.clock
+
+    def remove_edge(self, relationship_id: str) -> None:
+        edge = self.edges_by_id.get(relationship_id)
+        if edge is not None:
+            self._remove_edge(edge)
+
+    def _remove_edge(self, edge: int) -> None:
+        relationship_id = self.edge_ids[edge]
+        if relationship_id is None:
+            return
+        source, target = self.sources[edge], self.targets[edge]
+        self.adjacency[source].remove(edge)
+        if target != source:
+            self.adjacency[target].remove(edge)
+        del self.edges_by_id[relationship_id]
+        self.nbytes -= EDGE_OVERHEAD + len(relationship_id) + len(self.edge_properties[edge] or "")
+        self.edge_ids[edge] = None
+        self.edge_properties[edge] = None
+        self.sources[edge] = self.targets[edge] = -1
+        self.dead += 1
+
+    def neighbours(self, index: int) -> Iterator[Tuple[int, int]]:
+        """节点的 (边下标, 另一端节点下标)，不区分方向"""
+        for edge in self.adjacency[index]:
+            source = self.sources[edge]
+            yield edge, (self.targets[edge] if source == index else source)
+
+    def edge_dict(self, edge: int) -> Dict[str, Any]:
+        return {
+            "relationship_id": self.edge_ids[edge],
+            "from_id": self.node_ids[self.sources[edge]],
+            "to_id": self.node_ids[self.targets[edge]],
+            "type": self.edge_types[edge],
+            "properties": self.edge_properties[edge],
+        }
+
+
+# campaign_id → 图，按最近使用排序
+_graphs: "OrderedDict[str, _CampaignGraph]" = OrderedDict()
+# 正在加载的战役：加载期间收到写入通知时标记为脏，加载结果不入缓存
+_loading: Dict[str, "asyncio.Future[_CampaignGraph]"] = {}
+_stale: Set[str] = set()
+
+
+def enabled() -> bool:
+    return settings.graph_cache_enabled
+
+
+async def _load(campaign_id: str) -> _CampaignGraph:
+    # 边按 updated_at 升序写入，版本号即反映最近更新顺序
+    nodes, edges = await get_graph_store().load_campaign_graph(campaign_id)
+    graph = _CampaignGraph()
+    for row in nodes:
+        if row["entity_id"]:
+            graph.upsert_node(row["entity_id"], row["name"], row["type"])
+    for row in edges:
+        graph.upsert_edge(row["relationship_id"], row["from_id"], row["to_id"], row["type"], row["properties"])
+    return graph
+
+
+def _evict(keep: str) -> None:
+    budget = settings.graph_cache_budget_mb * 1024 * 1024
+    total = sum(graph.nbytes for graph in _graphs.values())
+    for campaign_id in list(_graphs):
+        if total <= budget:
+            break
+        if campaign_id == keep:
+            continue
+        total -= _graphs.pop(campaign_id).nbytes
+        logger.info(f"Evicted graph cache for campaign {campaign_id}")
+
+
+async def get_graph(campaign_id: str) -> _CampaignGraph:
+    """取战役的缓存图，未缓存时从图存储加载（并发请求共享一次加载）"""
+    graph = _graphs.get(campaign_id)
+    if graph is not None:
+        _graphs.move_to_end(campaign_id)
+        return graph
+    pending = _loading.get(campaign_id)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future: "asyncio.Future[_CampaignGraph]" = asyncio.get_running_loop().create_future()
+    _loading[campaign_id] = future
+    _stale.discard(campaign_id)
+    try:
+        graph = await _load(campaign_id)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as exc:
+        future.set_exception(exc)
+        # 没有其他等待者时避免 "exception was never retrieved"
+        future.exception()
+        raise
+    finally:
+        del _loading[campaign_id]
+    future.set_result(graph)
+    if campaign_id in _stale:
+        # 加载期间有写入，结果可能缺少这些写入：本次照常使用，但不缓存
+        _stale.discard(campaign_id)
+        return graph
+    _graphs[campaign_id] = graph
+    _evict(campaign_id)
+    return graph
+
+
+def _cached(campaign_id: str) -> Optional[_CampaignGraph]:
+    if campaign_id in _loading:
+        _stale.add(campaign_id)
+    return _graphs.get(campaign_id)
+
+
+# 写路径通知（写事务提交之后调用）
+
+def entity_upserted(campaign_id: str, entity_id: str, name: Optional[str], entity_type: Optional[str]) -> None:
+    graph = _cached(campaign_id)
+    if graph is not None:
+        graph.upsert_node(entity_id, name, entity_type)
+        _evict(campaign_id)
+
+
+def _collect(campaign_id: str, graph: _CampaignGraph) -> None:
+    if graph.wasteful:
+        _graphs.pop(campaign_id, None)
+
+
+def entity_deleted(campaign_id: str, entity_id: str) -> None:
+    graph = _cached(campaign_id)
+    if graph is not None:
+        graph.remove_node(entity_id)
+        _collect(campaign_id, graph)
+
+
+def relationship_upserted(
+    campaign_id: str,
+    relationship_id: str,
+    from_id: str,
+    to_id: str,
+    rel_type: Optional[str],
+    properties: Any,
+) -> None:
+    graph = _cached(campaign_id)
+    if graph is not None:
+        graph.upsert_edge(relationship_id, from_id, to_id, rel_type, properties)
+        _evict(campaign_id)
+
+
+def relationship_deleted(campaign_id: str, relationship_id: str) -> None:
+    graph = _cached(campaign_id)
+    if graph is not None:
+        graph.remove_edge(relationship_id)
+        _collect(campaign_id, graph)
+
+
+def drop_campaign(campaign_id: str) -> None:
+    if campaign_id in _loading:
+        _stale.add(campaign_id)
+    _graphs.pop(campaign_id, None)
+
+
+def get_cache_status() -> Dict[str, Any]:
+    return {
+        "enabled": enabled(),
+        "budget_bytes": settings.graph_cache_budget_mb * 1024 * 1024,
+        "campaigns": [
+            {
+                "campaign_id": campaign_id,
+                "nodes": len(graph.by_id),
+                "edges": len(graph.edges_by_id),
+                "bytes": graph.nbytes,
+            }
+            for campaign_id, graph in _graphs.items()
+        ],
+    }
@@ -1,27 +1,139 @@
-from neo4j import GraphDatabase
+"""
+Neo4j driver and unit of work for tarven-note.
+
+仓储层通过 execute_read / execute_write（托管事务）访问 Neo4j：
+驱动在 max_transaction_retry_time 内自动重试瞬时错误（死锁、主节点切换等），
+读事务在集群中路由到只读副本。
+
+一个 HTTP 请求内的所有事务复用同一个会话（request_scope，由 main.py 的中间件打开），
+会话在第一次访问 Neo4j 时才借用连接；请求之外（启动、后台任务）每次调用单独开会话。
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from neo4j import AsyncGraphDatabase, AsyncManagedTransaction, AsyncSession, Record, unit_of_work
 
 from server.core.config import settings
 
+T = TypeVar("T")
 
-driver = GraphDatabase.driver(
+driver = AsyncGraphDatabase.driver(
     settings.neo4j_uri,
     auth=(settings.neo4j_user, settings.neo4j_password),
+    max_connection_pool_size=settings.neo4j_max_pool_size,
+    connection_acquisition_timeout=settings.neo4j_acquisition_timeout,
+    connection_timeout=settings.neo4j_connection_timeout,
+    max_connection_lifetime=settings.neo4j_max_connection_lifetime,
+    max_transaction_retry_time=settings.neo4j_max_retry_time,
 )
 
 
+class _RequestScope:
+    """一个请求共享的会话；会话不支持并发事务，用锁串行化"""
+
+    def __init__(self) -> None:
+        self.session: Optional[AsyncSession] = None
+        self.lock = asyncio.Lock()
+
+
+_scope: ContextVar[Optional[_RequestScope]] = ContextVar("neo4j_request_scope", default=None)
+
+
 def get_session():
+    """自动提交会话：async with get_session() as session（仅用于 schema 等无法放入托管事务的语句）"""
     return driver.session()
 
 
-def close_driver():
-    driver.close()
+@asynccontextmanager
+async def request_scope():
+    """在该上下文内的 execute_read / execute_write 共用一个会话"""
+    scope = _RequestScope()
+    token = _scope.set(scope)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+        if scope.session is not None:
+            await scope.session.close()
+
+
+@asynccontextmanager
+async def _acquire():
+    scope = _scope.get()
+    if scope is None:
+        async with driver.session() as session:
+            yield session
+        return
+    async with scope.lock:
+        if scope.session is None:
+            scope.session = driver.session()
+        try:
+            yield scope.session
+        except asyncio.CancelledError:
+            # 被取消的事务会让会话不可再用，丢弃后由下一次调用重新打开
+            session, scope.session = scope.session, None
+            session.cancel()
+            raise
+
+
+def _bounded(work: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    timeout = settings.neo4j_transaction_timeout
+    if timeout is None:
+        return work
+
+    @unit_of_work(timeout=timeout)
+    async def bounded(tx: AsyncManagedTransaction, *args: Any, **kwargs: Any) -> T:
+        return await work(tx, *args, **kwargs)
+
+    return bounded
+
+
+async def execute_read(work: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+    """
+    在托管读事务中执行 work(tx, *args, **kwargs)，瞬时错误时整体重试。
+    work 可能被执行多次，必须在函数内消费完结果。
+    """
+    async with _acquire() as session:
+        return await session.execute_read(_bounded(work), *args, **kwargs)
+
+
+async def execute_write(work: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+    """在托管写事务中执行 work(tx, *args, **kwargs)，语义同 execute_read"""
+    async with _acquire() as session:
+        return await session.execute_write(_bounded(work), *args, **kwargs)
+
+
+async def _fetch_all(tx: AsyncManagedTransaction, query: str, params: Dict[str, Any]) -> List[Record]:
+    result = await tx.run(query, params)
+    return [record async for record in result]
+
+
+async def _fetch_one(tx: AsyncManagedTransaction, query: str, params: Dict[str, Any]) -> Optional[Record]:
+    result = await tx.run(query, params)
+    return await result.single()
+
+
+async def read_all(query: str, params: Optional[Dict[str, Any]] = None) -> List[Record]:
+    return await execute_read(_fetch_all, query, params or {})
+
+
+async def read_one(query: str, params: Optional[Dict[str, Any]] = None) -> Optional[Record]:
+    return await execute_read(_fetch_one, query, params or {})
+
+
+async def write_one(query: str, params: Optional[Dict[str, Any]] = None) -> Optional[Record]:
+    return await execute_write(_fetch_one, query, params or {})
+
+
+async def close_driver():
+    await driver.close()
 
 
-def ping() -> dict:
+async def ping() -> dict:
     try:
-        with get_session() as session:
-            result = session.run("RETURN 1 AS ok")
-            record = result.single()
+        record = await read_one("RETURN 1 AS ok")
         return {"ok": bool(record and record["ok"] == 1)}
     except Exception as exc:
         return {"ok": False, "error": str(exc)}
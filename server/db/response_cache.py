@@ -0,0 +1,92 @@
+"""
+In-process response cache for tarven-note.
+读接口（子图、实体、关系、路径）的条件 GET：ETag 由战役版本号（见
+repositories/sqlite_changes.py）和请求的路径、查询参数生成，请求的 If-None-Match
+与之一致时直接返回 304；否则按 (战役, 路径, 查询参数) 查找缓存的响应体，
+条目生成时的版本号与当前版本号相同即命中，不再访问图存储。
+
+版本号每个请求都从 SQLite 读取（一次主键查询），不在进程内缓存：任何进程的写入
+都在同一事务中把版本号加一，多进程部署时其他进程随即不再命中旧的响应体。
+进程内只缓存响应体，所有响应体共享 settings.response_cache_budget_mb 的内存预算，
+超出时按 LRU 淘汰；旧版本的条目不再命中，之后被覆盖或淘汰。
+关闭 settings.response_cache_enabled 时 ETag / 304 照常工作，但不缓存响应体。
+"""
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from server.core.config import settings
+from server.db.sqlite import run_sqlite
+from server.repositories.sqlite_changes import get_version as sqlite_get_version
+
+# (路径, 排序后的查询参数)
+CacheKey = Tuple[str, str]
+
+
+class CachedResponse(NamedTuple):
+    version: int
+    body: bytes
+    headers: Dict[str, str]
+
+
+# (campaign_id, 路径, 查询参数) → 响应，按最近使用排序
+_responses: "OrderedDict[Tuple[str, str, str], CachedResponse]" = OrderedDict()
+_nbytes = 0
+_stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+
+def enabled() -> bool:
+    return settings.response_cache_enabled
+
+
+async def get_version(campaign_id: str) -> int:
+    """战役当前的版本号，总是从 SQLite 读取，其他进程的写入同样可见"""
+    return await run_sqlite(sqlite_get_version, campaign_id)
+
+
+def make_etag(version: int, key: CacheKey) -> str:
+    digest = zlib.crc32(f"{key[0]}?{key[1]}".encode("utf-8"))
+    return f'W/"{version}-{digest:08x}"'
+
+
+def lookup(campaign_id: str, key: CacheKey, version: int) -> Optional[CachedResponse]:
+    if not enabled():
+        return None
+    entry = _responses.get((campaign_id, *key))
+    if entry is None or entry.version != version:
+        _stats["misses"] += 1
+        return None
+    _responses.move_to_end((campaign_id, *key))
+    _stats["hits"] += 1
+    return entry
+
+
+def store(campaign_id: str, key: CacheKey, version: int, body: bytes, headers: Dict[str, str]) -> None:
+    global _nbytes
+    if not enabled():
+        return
+    budget = settings.response_cache_budget_mb * 1024 * 1024
+    if len(body) > budget:
+        return
+    old = _responses.pop((campaign_id, *key), None)
+    if old is not None:
+        _nbytes -= len(old.body)
+    _responses[(campaign_id, *key)] = CachedResponse(version, body, headers)
+    _nbytes += len(body)
+    while _nbytes > budget:
+        _, evicted = _responses.popitem(last=False)
+        _nbytes -= len(evicted.body)
+
+
+def not_modified() -> None:
+    _stats["not_modified"] += 1
+
+
+def get_response_cache_status() -> Dict[str, Any]:
+    return {
+        "enabled": enabled(),
+        "budget_bytes": settings.response_cache_budget_mb * 1024 * 1024,
+        "bytes": _nbytes,
+        "entries": len(_responses),
+        **_stats,
+    }
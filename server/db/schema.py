@@ -1,9 +1,18 @@
+import asyncio
+import logging
+from typing import Iterable, List, Set
+
+from neo4j.exceptions import Neo4jError
+
 from server.db.neo4j import get_session
 
+logger = logging.getLogger(__name__)
+
 
 CONSTRAINT_NAMES = [
     "campaign_id_unique",
     "entity_id_unique",
+    "entity_campaign_name_unique",
 ]
 
 INDEX_NAMES = [
@@ -11,11 +20,16 @@ INDEX_NAMES = [
     "entity_name_index",
     "entity_campaign_index",
     "entity_type_index",
+    "entity_campaign_entity_index",
 ]
 
 CONSTRAINTS = [
     "CREATE CONSTRAINT campaign_id_unique IF NOT EXISTS FOR (c:Campaign) REQUIRE c.campaign_id IS UNIQUE",
+    # entity_id 唯一约束同时是按 entity_id 查找的索引
     "CREATE CONSTRAINT entity_id_unique IF NOT EXISTS FOR (e:Entity) REQUIRE e.entity_id IS UNIQUE",
+    # 按名称查找实体的入口：MATCH (e:Entity {campaign_id: $campaign_id, name: $name})
+    "CREATE CONSTRAINT entity_campaign_name_unique IF NOT EXISTS "
+    "FOR (e:Entity) REQUIRE (e.campaign_id, e.name) IS UNIQUE",
 ]
 
 INDEXES = [
@@ -23,26 +37,97 @@ INDEXES = [
     "CREATE INDEX entity_name_index IF NOT EXISTS FOR (e:Entity) ON (e.name)",
     "CREATE INDEX entity_campaign_index IF NOT EXISTS FOR (e:Entity) ON (e.campaign_id)",
     "CREATE INDEX entity_type_index IF NOT EXISTS FOR (e:Entity) ON (e.type)",
+    # 关系分页按 (from.entity_id, r.relationship_id) 排序：从该索引按 entity_id 顺序读取战役内的起点
+    "CREATE INDEX entity_campaign_entity_index IF NOT EXISTS FOR (e:Entity) ON (e.campaign_id, e.entity_id)",
 ]
 
+# 关系索引按关系类型建立（Neo4j 的关系属性索引只能针对单一类型），
+# 新类型第一次写入前由 ensure_relationship_indexes 按需创建
+RELATIONSHIP_INDEX_PROPERTIES = ("relationship_id", "type")
+STRUCTURAL_RELATIONSHIP_TYPES = {"IN_CAMPAIGN"}
+
+# 已知的关系类型（normalize_label 之后），delete_relationship 据此逐类型走索引
+_relationship_types: Set[str] = set()
+_relationship_lock = asyncio.Lock()
+
+
+def relationship_index_name(rel_type: str, prop: str) -> str:
+    return f"rel_{rel_type.lower()}_{prop}_index"
+
+
+def known_relationship_types() -> List[str]:
+    return sorted(_relationship_types)
 
-def apply_schema() -> None:
-    with get_session() as session:
+
+async def ensure_relationship_indexes(rel_types: Iterable[str]) -> None:
+    """为尚未见过的关系类型创建 relationship_id / type 索引；需在写事务之外调用"""
+    missing = set(rel_types) - _relationship_types - STRUCTURAL_RELATIONSHIP_TYPES
+    if not missing:
+        return
+    async with _relationship_lock:
+        missing -= _relationship_types
+        if not missing:
+            return
+        async with get_session() as session:
+            for rel_type in sorted(missing):
+                for prop in RELATIONSHIP_INDEX_PROPERTIES:
+                    try:
+                        result = await session.run(
+                            f"CREATE INDEX {relationship_index_name(rel_type, prop)} IF NOT EXISTS "
+                            f"FOR ()-[r:{rel_type}]-() ON (r.{prop})"
+                        )
+                        await result.consume()
+                    except Neo4jError as exc:
+                        # 索引只影响性能，创建失败不阻塞写入，/health/schema 会显示缺失
+                        logger.error(f"Failed to create index for {rel_type}.{prop}: {exc.message}")
+                _relationship_types.add(rel_type)
+
+
+async def _list_relationship_types(session) -> Set[str]:
+    result = await session.run("CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType")
+    return {row["relationshipType"] async for row in result} - STRUCTURAL_RELATIONSHIP_TYPES
+
+
+async def refresh_relationship_types() -> bool:
+    """从数据库同步关系类型（其他进程可能写入了新类型）；有新类型时返回 True"""
+    async with get_session() as session:
+        types = await _list_relationship_types(session)
+    added = bool(types - _relationship_types)
+    await ensure_relationship_indexes(types)
+    return added
+
+
+async def apply_schema() -> None:
+    async with get_session() as session:
         for statement in CONSTRAINTS:
-            session.run(statement)
+            try:
+                result = await session.run(statement)
+                await result.consume()
+            except Neo4jError as exc:
+                # 已有重复数据时约束无法创建，/health/schema 会显示缺失
+                logger.error(f"Failed to create constraint: {exc.message}")
         for statement in INDEXES:
-            session.run(statement)
+            await session.run(statement)
+    await refresh_relationship_types()
 
 
-def get_schema_status() -> dict:
-    with get_session() as session:
-        constraint_rows = session.run("SHOW CONSTRAINTS YIELD name RETURN name")
-        index_rows = session.run("SHOW INDEXES YIELD name RETURN name")
-        existing_constraints = {row["name"] for row in constraint_rows}
-        existing_indexes = {row["name"] for row in index_rows}
+async def get_schema_status() -> dict:
+    async with get_session() as session:
+        constraint_rows = await session.run("SHOW CONSTRAINTS YIELD name RETURN name")
+        existing_constraints = {row["name"] async for row in constraint_rows}
+        index_rows = await session.run("SHOW INDEXES YIELD name, state RETURN name, state")
+        index_states = {row["name"]: row["state"] async for row in index_rows}
+        relationship_types = sorted(await _list_relationship_types(session))
+    existing_indexes = set(index_states)
 
     constraint_missing = sorted(set(CONSTRAINT_NAMES) - existing_constraints)
     index_missing = sorted(set(INDEX_NAMES) - existing_indexes)
+    relationship_index_names = [
+        relationship_index_name(rel_type, prop)
+        for rel_type in relationship_types
+        for prop in RELATIONSHIP_INDEX_PROPERTIES
+    ]
+    relationship_missing = sorted(set(relationship_index_names) - existing_indexes)
 
     return {
         "constraints": {
@@ -55,5 +140,16 @@ def get_schema_status() -> dict:
             "present": sorted(set(INDEX_NAMES) & existing_indexes),
             "missing": index_missing,
         },
-        "ok": not constraint_missing and not index_missing,
+        "relationship_indexes": {
+            "types": relationship_types,
+            "expected": relationship_index_names,
+            "present": sorted(set(relationship_index_names) & existing_indexes),
+            "missing": relationship_missing,
+            # 新建的索引在回填完成前为 POPULATING
+            "populating": sorted(
+                name for name in relationship_index_names
+                if index_states.get(name) not in (None, "ONLINE")
+            ),
+        },
+        "ok": not constraint_missing and not index_missing and not relationship_missing,
     }
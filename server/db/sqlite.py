@@ -1,18 +1,66 @@
 """
 SQLite database connection module for tarven-note.
-Provides connection management and basic utilities for SQLite + sqlite-vss.
+Provides connection management and basic utilities for SQLite.
+
+每个线程持有自己的连接（读写、只读各一个），不再共享一个进程级连接：
+一个请求的回滚不会丢弃另一个请求的写入。数据库运行在 WAL 模式，
+读连接不会被写事务阻塞。PRAGMA 按 settings.sqlite_pragma_profile 选择，
+单项可由 settings.sqlite_* 覆盖。
+
+异步代码通过 run_sqlite 把 SQLite 调用放到有界线程池中执行，不阻塞事件循环；
+线程池中的每个线程同样持有自己的连接。
 """
+import asyncio
+import functools
+import logging
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 from contextlib import contextmanager
 
 from server.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+# PRAGMA 预设：cache_size 为负数时单位是 KiB
+PRAGMA_PROFILES: Dict[str, Dict[str, Any]] = {
+    # 默认：WAL + NORMAL，掉电最多丢失最后几个事务，不会损坏数据库
+    "balanced": {
+        "synchronous": "NORMAL",
+        "cache_size": -16000,
+        "mmap_size": 256 * 1024 * 1024,
+        "busy_timeout": 5000,
+    },
+    # 每次提交都 fsync
+    "durable": {
+        "synchronous": "FULL",
+        "cache_size": -16000,
+        "mmap_size": 0,
+        "busy_timeout": 10000,
+    },
+    # 批量导入 / 基准测试
+    "fast": {
+        "synchronous": "OFF",
+        "cache_size": -64000,
+        "mmap_size": 1024 * 1024 * 1024,
+        "busy_timeout": 5000,
+    },
+}
+
 
 # 数据库文件路径
 _db_path: Optional[Path] = None
-_connection: Optional[sqlite3.Connection] = None
+_local = threading.local()
+# 所有已打开的连接及其所属线程，用于关闭和回收已退出线程的连接
+_registry: List[Tuple[threading.Thread, sqlite3.Connection]] = []
+_registry_lock = threading.Lock()
+# close_connection 后递增，线程里缓存的旧连接随之失效
+_generation = 0
+_executor: Optional[ThreadPoolExecutor] = None
+
+T = TypeVar("T")
 
 
 def get_db_path() -> Path:
@@ -24,47 +72,160 @@ def get_db_path() -> Path:
     return _db_path
 
 
-def get_connection() -> sqlite3.Connection:
-    """获取SQLite连接（单例模式）"""
-    global _connection
-    if _connection is None:
-        db_path = get_db_path()
-        _connection = sqlite3.connect(str(db_path), check_same_thread=False)
-        _connection.row_factory = sqlite3.Row
-        # 启用外键约束
-        _connection.execute("PRAGMA foreign_keys = ON")
-    return _connection
+def get_pragmas() -> Dict[str, Any]:
+    """当前生效的 PRAGMA：预设 + settings 中的单项覆盖"""
+    profile = PRAGMA_PROFILES.get(settings.sqlite_pragma_profile)
+    if profile is None:
+        raise ValueError(f"Unknown sqlite_pragma_profile: {settings.sqlite_pragma_profile}")
+    pragmas = dict(profile)
+    overrides = {
+        "synchronous": settings.sqlite_synchronous,
+        "cache_size": settings.sqlite_cache_size,
+        "mmap_size": settings.sqlite_mmap_size,
+        "busy_timeout": settings.sqlite_busy_timeout,
+    }
+    pragmas.update({key: value for key, value in overrides.items() if value is not None})
+    return pragmas
+
+
+def _register(conn: sqlite3.Connection) -> None:
+    current = threading.current_thread()
+    with _registry_lock:
+        for thread, stale in [entry for entry in _registry if not entry[0].is_alive()]:
+            stale.close()
+            _registry.remove((thread, stale))
+        _registry.append((current, conn))
+
+
+def _open(readonly: bool) -> sqlite3.Connection:
+    db_path = get_db_path()
+    if readonly:
+        if not db_path.exists():
+            # 只读连接无法创建数据库文件
+            get_connection()
+        conn = sqlite3.connect(
+            f"file:{db_path}?mode=ro", uri=True, check_same_thread=False,
+        )
+    else:
+        conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+    conn.row_factory = sqlite3.Row
+    for name, value in get_pragmas().items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    # 启用外键约束
+    conn.execute("PRAGMA foreign_keys = ON")
+    if readonly:
+        conn.execute("PRAGMA query_only = ON")
+    _register(conn)
+    return conn
+
+
+def get_connection(readonly: bool = False) -> sqlite3.Connection:
+    """获取当前线程的 SQLite 连接（读写 / 只读分开）"""
+    attr = "readonly" if readonly else "readwrite"
+    cached = getattr(_local, attr, None)
+    if cached is not None and cached[0] == _generation:
+        return cached[1]
+    conn = _open(readonly)
+    setattr(_local, attr, (_generation, conn))
+    return conn
 
 
 @contextmanager
-def get_cursor():
-    """获取数据库游标的上下文管理器"""
-    conn = get_connection()
+def get_cursor(readonly: bool = False):
+    """
+    获取数据库游标的上下文管理器
+    readonly=True 使用当前线程的只读连接（query_only），适合纯查询
+
+    可以嵌套：只有最外层在退出时提交或回滚；内层使用 SAVEPOINT，
+    内层出错只回滚内层的写入，外层出错时内层的写入一并回滚。
+    """
+    conn = get_connection(readonly)
+    if not hasattr(_local, "depths"):
+        _local.depths = {}
+    # 连接 → 当前线程中尚未退出的 get_cursor 层数
+    depths: Dict[sqlite3.Connection, int] = _local.depths
+    depth = depths.get(conn, 0)
+    savepoint = f"sp_{depth}"
+    if depth:
+        if not conn.in_transaction:
+            # 外层尚未写入时还没有事务；不先开启的话，RELEASE 最外层的 SAVEPOINT 就是提交
+            conn.execute("BEGIN")
+        conn.execute(f"SAVEPOINT {savepoint}")
+    depths[conn] = depth + 1
     cursor = conn.cursor()
     try:
         yield cursor
-        conn.commit()
+        if depth:
+            conn.execute(f"RELEASE {savepoint}")
+        else:
+            conn.commit()
     except Exception:
-        conn.rollback()
+        if depth:
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+        else:
+            conn.rollback()
         raise
     finally:
         cursor.close()
+        if depth:
+            depths[conn] = depth
+        else:
+            del depths[conn]
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """SQLite 专用的有界线程池，大小由 settings.sqlite_executor_workers 决定"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.sqlite_executor_workers,
+            thread_name_prefix="sqlite",
+        )
+    return _executor
+
+
+async def run_sqlite(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在 SQLite 线程池中执行同步的数据访问函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
 
 
 def close_connection():
-    """关闭数据库连接"""
-    global _connection
-    if _connection is not None:
-        _connection.close()
-        _connection = None
+    """关闭所有线程的数据库连接"""
+    global _generation
+    with _registry_lock:
+        _generation += 1
+        for _, conn in _registry:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                logger.exception("Failed to close SQLite connection")
+        _registry.clear()
 
 
 def ping() -> dict:
     """检查数据库连接状态"""
     try:
-        with get_cursor() as cursor:
+        with get_cursor(readonly=True) as cursor:
             cursor.execute("SELECT 1 AS ok")
             row = cursor.fetchone()
-        return {"ok": bool(row and row["ok"] == 1)}
+            cursor.execute("PRAGMA journal_mode")
+            journal_mode = cursor.fetchone()[0]
+        with _registry_lock:
+            connections = len(_registry)
+        return {
+            "ok": bool(row and row["ok"] == 1),
+            "journal_mode": journal_mode,
+            "connections": connections,
+        }
     except Exception as exc:
         return {"ok": False, "error": str(exc)}
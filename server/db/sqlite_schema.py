@@ -3,6 +3,7 @@ SQLite schema definitions for tarven-note.
 包含实体表、别名表、对话表的DDL定义。
 """
 from server.db.sqlite import get_cursor
+from server.repositories.utils import bigram_text
 
 
 # ============================================================
@@ -114,14 +115,60 @@ MESSAGES_INDEXES = [
 
 
 # ============================================================
-# 向量嵌入表 - 存储实体和消息的向量表示
+# 对话全文索引 - FTS5 外部内容表，trigram 分词可直接处理中文（无需分词词典）
+# 由触发器与 messages 保持同步；trigram 要求查询词至少 3 个字符
+# ============================================================
+MESSAGES_FTS_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    content,
+    content='messages',
+    content_rowid='id',
+    tokenize='trigram'
+)
+"""
+
+MESSAGES_FTS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+    END""",
+]
+
+
+# ============================================================
+# 对话二元组索引 - trigram 覆盖不到的 1~2 字查询词（如常见的中文双字词）
+# 无内容表，索引文本为 bigram_text(content)，rowid 与 messages.id 一致；
+# 由 sqlite_messages 在写入 / 删除消息时维护（删除须提供原索引文本），启动时核对行数
+# ============================================================
+MESSAGES_BIGRAM_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_bigram USING fts5(
+    content,
+    content='',
+    tokenize='unicode61',
+    prefix='1'
+)
+"""
+
+
+# ============================================================
+# 向量嵌入表 - 记录实体和消息的向量在段文件中的位置
+# 向量本身存放在 memmap 段文件中（见 server/db/vector_segments.py）
 # ============================================================
 EMBEDDINGS_TABLE = """
 CREATE TABLE IF NOT EXISTS embeddings (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
+    campaign_id TEXT,
     ref_type TEXT NOT NULL,
     ref_id TEXT NOT NULL,
-    embedding BLOB NOT NULL,
+    segment TEXT,      -- 段文件名
+    slot INTEGER,      -- 段内记录序号
+    embedding BLOB,    -- 旧版内联向量，加载分区时迁入段文件后置空
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(ref_type, ref_id)
 )
@@ -129,6 +176,152 @@ CREATE TABLE IF NOT EXISTS embeddings (
 
 EMBEDDINGS_INDEXES = [
     "CREATE INDEX IF NOT EXISTS idx_embeddings_ref ON embeddings(ref_type, ref_id)",
+    "CREATE INDEX IF NOT EXISTS idx_embeddings_campaign ON embeddings(campaign_id, ref_type)",
+]
+
+
+# ============================================================
+# 嵌入缓存表 - 按 (模型, 维度, 文本 sha256) 缓存嵌入结果，避免重复调用接口
+# ============================================================
+EMBEDDING_CACHE_TABLE = """
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    model TEXT NOT NULL,
+    dim INTEGER NOT NULL,
+    text_hash TEXT NOT NULL,
+    embedding BLOB NOT NULL,   -- float32
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (model, dim, text_hash)
+)
+"""
+
+
+# ============================================================
+# 嵌入队列表 - 待（重新）嵌入的消息和实体，后台任务消费，重启后可继续
+# ============================================================
+EMBEDDING_QUEUE_TABLE = """
+CREATE TABLE IF NOT EXISTS embedding_queue (
+    ref_type TEXT NOT NULL,
+    ref_id TEXT NOT NULL,
+    campaign_id TEXT,
+    generation INTEGER NOT NULL DEFAULT 0,  -- 每次重新标记加一，出队时只删除取出时的那一代
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    available_at REAL NOT NULL DEFAULT 0,  -- unix 时间戳，失败后退避
+    enqueued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (ref_type, ref_id)
+)
+"""
+
+EMBEDDING_QUEUE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_embedding_queue_available ON embedding_queue(available_at)",
+]
+
+
+# ============================================================
+# 嵌入状态表 - 记录当前嵌入所用的模型/维度及重嵌入进度
+# ============================================================
+EMBEDDING_STATE_TABLE = """
+CREATE TABLE IF NOT EXISTS embedding_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+)
+"""
+
+
+# ============================================================
+# 图存储表 - settings.graph_backend = "sqlite" 时代替 Neo4j
+# 战役、实体节点和关系邻接表；时间为 ISO 8601 字符串，可直接按字符串排序
+# ============================================================
+GRAPH_CAMPAIGNS_TABLE = """
+CREATE TABLE IF NOT EXISTS graph_campaigns (
+    campaign_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    system TEXT,
+    description TEXT,
+    status TEXT,
+    metadata TEXT,    -- JSON object
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+)
+"""
+
+GRAPH_ENTITIES_TABLE = """
+CREATE TABLE IF NOT EXISTS graph_entities (
+    entity_id TEXT PRIMARY KEY,
+    campaign_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT,
+    properties TEXT,  -- JSON object，仅在通过 update_entity 写入时存在
+    metadata TEXT,    -- JSON object，同上
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+
+    UNIQUE(campaign_id, name),
+    FOREIGN KEY (campaign_id) REFERENCES graph_campaigns(campaign_id) ON DELETE CASCADE
+)
+"""
+
+# label 为 normalize_label 之后的关系类型，同一对端点同一 label 只有一条关系（对应 Neo4j 的 MERGE）
+GRAPH_RELATIONSHIPS_TABLE = """
+CREATE TABLE IF NOT EXISTS graph_relationships (
+    relationship_id TEXT PRIMARY KEY,
+    campaign_id TEXT NOT NULL,
+    from_id TEXT NOT NULL,
+    to_id TEXT NOT NULL,
+    label TEXT NOT NULL,
+    type TEXT,
+    properties TEXT,  -- JSON object
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+
+    UNIQUE(from_id, to_id, label),
+    FOREIGN KEY (from_id) REFERENCES graph_entities(entity_id) ON DELETE CASCADE,
+    FOREIGN KEY (to_id) REFERENCES graph_entities(entity_id) ON DELETE CASCADE
+)
+"""
+
+GRAPH_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_graph_entities_campaign ON graph_entities(campaign_id, type)",
+    "CREATE INDEX IF NOT EXISTS idx_graph_relationships_to ON graph_relationships(to_id)",
+    # 关系列表按 (from_id, relationship_id) 分页
+    "CREATE INDEX IF NOT EXISTS idx_graph_relationships_page ON graph_relationships(campaign_id, from_id, relationship_id)",
+    "CREATE INDEX IF NOT EXISTS idx_graph_relationships_label_page "
+    "ON graph_relationships(campaign_id, label, from_id, relationship_id)",
+]
+
+
+# ============================================================
+# 变更日志 - 每个战役一个单调递增的版本号，实体、关系、消息的每次写入
+# 把版本号加一并追加变更记录，客户端据此增量同步（GET /changes?since=）
+# ============================================================
+CAMPAIGN_VERSIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS campaign_versions (
+    campaign_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    min_version INTEGER NOT NULL DEFAULT 0,     -- since 早于该版本的客户端须全量重新拉取
+    compacted_version INTEGER NOT NULL DEFAULT 0,  -- 上次压缩时的版本号
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+# op 为 upsert 时 data 是写入后的记录（JSON），delete 时为空
+CHANGE_LOG_TABLE = """
+CREATE TABLE IF NOT EXISTS change_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    campaign_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    kind TEXT NOT NULL,    -- entity | relationship | message
+    ref_id TEXT NOT NULL,
+    op TEXT NOT NULL,      -- upsert | delete
+    data TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+CHANGE_LOG_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_change_log_version ON change_log(campaign_id, version)",
+    # 压缩时查找同一对象的后续记录
+    "CREATE INDEX IF NOT EXISTS idx_change_log_ref ON change_log(campaign_id, kind, ref_id, version)",
 ]
 
 
@@ -139,21 +332,115 @@ ALL_TABLES = [
     ENTITIES_TABLE,
     ALIASES_TABLE,
     MESSAGES_TABLE,
+    MESSAGES_FTS_TABLE,
+    MESSAGES_BIGRAM_TABLE,
     EMBEDDINGS_TABLE,
+    EMBEDDING_CACHE_TABLE,
+    EMBEDDING_QUEUE_TABLE,
+    EMBEDDING_STATE_TABLE,
+    GRAPH_CAMPAIGNS_TABLE,
+    GRAPH_ENTITIES_TABLE,
+    GRAPH_RELATIONSHIPS_TABLE,
+    CAMPAIGN_VERSIONS_TABLE,
+    CHANGE_LOG_TABLE,
 ]
 
 ALL_INDEXES = (
     ENTITIES_INDEXES +
     ALIASES_INDEXES +
     MESSAGES_INDEXES +
-    EMBEDDINGS_INDEXES
+    EMBEDDINGS_INDEXES +
+    EMBEDDING_QUEUE_INDEXES +
+    GRAPH_INDEXES +
+    CHANGE_LOG_INDEXES
 )
 
+ALL_TRIGGERS = MESSAGES_FTS_TRIGGERS
+
+
+def _column_names(cursor, table: str) -> set:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row["name"] for row in cursor.fetchall()}
+
+
+def _migrate_embeddings_campaign(cursor) -> None:
+    """旧库的 embeddings 表没有 campaign_id：补列并按 ref_type 回填"""
+    if "campaign_id" not in _column_names(cursor, "embeddings"):
+        cursor.execute("ALTER TABLE embeddings ADD COLUMN campaign_id TEXT")
+    cursor.execute("""
+        UPDATE embeddings SET campaign_id = (
+            SELECT campaign_id FROM messages WHERE message_id = embeddings.ref_id
+        )
+        WHERE campaign_id IS NULL AND ref_type = 'message'
+    """)
+    cursor.execute("""
+        UPDATE embeddings SET campaign_id = (
+            SELECT campaign_id FROM entities WHERE entity_id = embeddings.ref_id
+        )
+        WHERE campaign_id IS NULL AND ref_type = 'entity'
+    """)
+
+
+def _migrate_embeddings_segments(cursor) -> None:
+    """
+    向量迁出到段文件后 embedding 列必须可空。
+    SQLite 无法修改列约束，只能重建表；BLOB 会在分区首次加载时迁入段文件。
+    """
+    cursor.execute("PRAGMA table_info(embeddings)")
+    columns = {row["name"]: row for row in cursor.fetchall()}
+    if "segment" in columns and not columns["embedding"]["notnull"]:
+        return
+    cursor.execute(EMBEDDINGS_TABLE.replace(
+        "CREATE TABLE IF NOT EXISTS embeddings",
+        "CREATE TABLE embeddings_migrated",
+    ))
+    cursor.execute("""
+        INSERT INTO embeddings_migrated (id, campaign_id, ref_type, ref_id, embedding, created_at)
+        SELECT id, campaign_id, ref_type, ref_id, embedding, created_at FROM embeddings
+    """)
+    cursor.execute("DROP TABLE embeddings")
+    cursor.execute("ALTER TABLE embeddings_migrated RENAME TO embeddings")
+
+
+def _migrate_messages_fts(cursor) -> None:
+    """全文索引晚于消息表引入：索引行数与消息数不一致时整体重建"""
+    cursor.execute("SELECT COUNT(*) AS n FROM messages_fts_docsize")
+    indexed = cursor.fetchone()["n"]
+    cursor.execute("SELECT COUNT(*) AS n FROM messages")
+    if cursor.fetchone()["n"] != indexed:
+        cursor.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+
+def _migrate_messages_bigram(cursor) -> None:
+    """二元组索引晚于消息表引入：索引行数与消息数不一致时清空后重建"""
+    cursor.execute("SELECT COUNT(*) AS n FROM messages_bigram_docsize")
+    indexed = cursor.fetchone()["n"]
+    cursor.execute("SELECT COUNT(*) AS n FROM messages")
+    if cursor.fetchone()["n"] == indexed:
+        return
+    cursor.execute("INSERT INTO messages_bigram (messages_bigram) VALUES ('delete-all')")
+    cursor.execute("SELECT id, content FROM messages")
+    rows = [(row["id"], bigram_text(row["content"])) for row in cursor.fetchall()]
+    cursor.executemany("INSERT INTO messages_bigram (rowid, content) VALUES (?, ?)", rows)
+
+
+# 迁移在建表之后、建索引之前执行（索引可能依赖新增的列）
+MIGRATIONS = [
+    _migrate_embeddings_campaign,
+    _migrate_embeddings_segments,
+    _migrate_messages_fts,
+    _migrate_messages_bigram,
+]
+
 
 def apply_sqlite_schema() -> None:
-    """应用所有SQLite表和索引"""
+    """应用所有SQLite表、迁移、索引和触发器"""
     with get_cursor() as cursor:
         for table_ddl in ALL_TABLES:
             cursor.execute(table_ddl)
+        for migration in MIGRATIONS:
+            migration(cursor)
         for index_ddl in ALL_INDEXES:
             cursor.execute(index_ddl)
+        for trigger_ddl in ALL_TRIGGERS:
+            cursor.execute(trigger_ddl)
@@ -1,72 +1,923 @@
 """
 Vector search module for tarven-note.
-提供基于 sqlite-vss 的向量搜索功能。
+提供基于内存映射段文件（NumPy memmap）的向量搜索功能。
+
+向量按 (campaign_id, ref_type) 分区，每个分区对应一个追加写的段文件
+（见 vector_segments.py），行向量写入前已归一化；SQLite 的 embeddings 表
+只保存 ref → (segment, slot) 的映射。分区首次访问时加载映射并映射段文件，
+之后由 store_embedding 同步追加。搜索只扫描目标战役的分区：先按实体类型
+等条件筛行，再在 memmap 视图上做一次矩阵-向量乘法 + argpartition 取 top-k。
+
+更新与删除只打墓碑，墓碑累积到一定比例后在后台线程中压缩段文件。
+模块锁只保护分区元数据：搜索在锁内取快照（见 _Partition.snapshot），打分在锁外进行。
+
+settings.vector_storage_precision 为 float16 / int8 时，分区在内存中只保留
+量化副本做粗排，再从段文件读取前 limit × vector_rescore_factor 个候选按
+全精度精排（见 vector_quant.py）；全量 float32 矩阵不再常驻内存。
+
+settings.vector_search_mode = "approximate" 时，在段之上额外维护
+IVF 近似索引（见 vector_ann.py），持久化到数据库文件旁的 .ann.npz。
 """
-import json
-import struct
-from typing import List, Optional, Tuple
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
 
-from server.db.sqlite import get_cursor, get_connection
 from server.core.config import settings
+from server.db.sqlite import get_cursor, get_db_path
+from server.db.vector_ann import IVFIndex, choose_nlist
+from server.db.vector_quant import QuantizedMatrix
+from server.db.vector_segments import (
+    Segment,
+    get_segments_dir,
+    parse_generation,
+    segment_file_name,
+)
+
+logger = logging.getLogger(__name__)
+
+# 墓碑槽位超过存活行数的该比例时后台压缩段文件
+COMPACT_RATIO = 0.25
+COMPACT_MIN_TOMBSTONES = 1024
+# 存活行数增长到上次训练时的该倍数后重新训练 IVF
+RETRAIN_GROWTH = 4
+# 构建量化副本时每批读取的行数
+QUANTIZE_CHUNK = 8192
+
+# 分区键: (campaign_id, ref_type)；历史数据无法回填战役时 campaign_id 为 None
+PartitionKey = Tuple[Optional[str], str]
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    """L2 归一化，零向量保持为零（相似度按 0 计）"""
+    norm = float(np.linalg.norm(vector))
+    if norm == 0:
+        return vector
+    return vector / norm
+
+
+class _Partition:
+    """单个 (campaign_id, ref_type) 分区：段文件 + 槽位元数据"""
+
+    def __init__(self, segment: Segment):
+        self.segment = segment
+        self.dim = segment.dim
+        # 槽位 → ref_id（墓碑为 None），ref_id → 槽位
+        self.ids: List[Optional[str]] = [None] * segment.count
+        self.rows: Dict[str, int] = {}
+        # 每行的实体类型编码（-1 表示无类型，如消息），用于打分前过滤
+        self.type_codes: Dict[str, int] = {}
+        self._types = np.full(segment.count, -1, dtype=np.int16)
+        self._alive = np.zeros(segment.count, dtype=bool)
+        self.tombstones = segment.count
+        self.generation = parse_generation(segment.name)
+        self.quant: Optional[QuantizedMatrix] = None
+        self.ann: Optional[IVFIndex] = None
+        self.training = False
+        self.compacting = False
+        self.dirty_rows: set = set()
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.segment.view()
+
+    @property
+    def alive(self) -> np.ndarray:
+        return self._alive[:len(self.ids)]
+
+    @property
+    def size(self) -> int:
+        return len(self.rows)
+
+    def _type_code(self, entity_type: Optional[str]) -> int:
+        if entity_type is None:
+            return -1
+        return self.type_codes.setdefault(entity_type, len(self.type_codes))
+
+    def _grow(self, size: int) -> None:
+        if size <= self._alive.shape[0]:
+            return
+        capacity = max(64, size * 2)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._alive.shape[0]] = self._alive
+        self._alive = alive
+        types = np.full(capacity, -1, dtype=np.int16)
+        types[:self._types.shape[0]] = self._types
+        self._types = types
+
+    def attach(self, ref_id: str, slot: int, entity_type: Optional[str]) -> None:
+        """加载时把 SQLite 映射中的 ref 绑定到已存在的槽位"""
+        self.ids[slot] = ref_id
+        self.rows[ref_id] = slot
+        self._alive[slot] = True
+        self._types[slot] = self._type_code(entity_type)
+        self.tombstones -= 1
+
+    def extend(
+        self,
+        ref_ids: List[str],
+        vectors: np.ndarray,
+        entity_types: List[Optional[str]],
+    ) -> int:
+        """批量追加记录，返回第一条的槽位号；已存在的 ref 旧槽位变为墓碑"""
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        normalized = (vectors / norms).astype(np.float32, copy=False)
+        for ref_id in ref_ids:
+            previous = self.rows.get(ref_id)
+            if previous is not None:
+                self._kill(previous)
+        first = self.segment.append(normalized)
+        self._grow(first + len(ref_ids))
+        if self.quant is not None:
+            self.quant.extend(normalized)
+        for offset, (ref_id, entity_type) in enumerate(zip(ref_ids, entity_types)):
+            slot = first + offset
+            self.ids.append(ref_id)
+            self.rows[ref_id] = slot
+            self._alive[slot] = True
+            self._types[slot] = self._type_code(entity_type)
+            if self.training:
+                self.dirty_rows.add(slot)
+        if self.ann is not None:
+            self.ann.add_many(np.arange(first, first + len(ref_ids)), normalized)
+        return first
+
+    def append(
+        self,
+        ref_id: str,
+        vector: np.ndarray,
+        entity_type: Optional[str] = None,
+    ) -> int:
+        return self.extend([ref_id], vector.reshape(1, -1), [entity_type])
+
+    def set_type(self, ref_id: str, entity_type: Optional[str]) -> None:
+        row = self.rows.get(ref_id)
+        if row is not None:
+            self._types[row] = self._type_code(entity_type)
+
+    def filter_rows(
+        self,
+        rows: Optional[np.ndarray],
+        entity_types: Optional[List[str]],
+    ) -> Optional[np.ndarray]:
+        """按实体类型筛选行（打分前执行）；不需要筛选时返回 rows 原样"""
+        if not entity_types:
+            return rows
+        codes = [self.type_codes[t] for t in entity_types if t in self.type_codes]
+        if rows is None:
+            mask = np.isin(self._types[:len(self.ids)], codes) & self.alive
+            return np.flatnonzero(mask)
+        return rows[np.isin(self._types[rows], codes)]
+
+    def _kill(self, slot: int) -> None:
+        self.ids[slot] = None
+        self._alive[slot] = False
+        self.tombstones += 1
+
+    def delete(self, ref_id: str) -> bool:
+        """打墓碑：记录仍留在段文件中，但不再参与打分"""
+        row = self.rows.pop(ref_id, None)
+        if row is None:
+            return False
+        self._kill(row)
+        return True
+
+    def needs_compaction(self) -> bool:
+        return self.tombstones > max(COMPACT_MIN_TOMBSTONES, COMPACT_RATIO * len(self.rows))
+
+    def enable_quantization(self, precision: str) -> None:
+        """从段文件分块构建量化副本，随后解除映射，只在精排时按需读取"""
+        quant = QuantizedMatrix(self.dim, precision)
+        matrix = self.matrix
+        for start in range(0, matrix.shape[0], QUANTIZE_CHUNK):
+            quant.extend(np.asarray(matrix[start:start + QUANTIZE_CHUNK]))
+        self.quant = quant
+        self.segment.close()
+
+    def snapshot(self, rows: Optional[np.ndarray] = None) -> "_PartitionSnapshot":
+        """
+        搜索用的快照（须持锁调用）：段文件追加写、量化副本已写入的行不会被改写，
+        只复制会原地修改的墓碑标记与 ref_id，打分在锁外进行
+        """
+        if rows is not None:
+            rows = rows[self._alive[rows]]
+        return _PartitionSnapshot(
+            matrix=self.matrix,
+            quant=self.quant.snapshot() if self.quant is not None else None,
+            ids=list(self.ids),
+            alive=self.alive.copy() if rows is None and self.tombstones else None,
+            size=self.size,
+            rows=rows,
+        )
+
+
+class _PartitionSnapshot:
+    """某一时刻的分区视图；之后的追加、删除和段压缩都不影响它"""
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        quant: Optional[QuantizedMatrix],
+        ids: List[Optional[str]],
+        alive: Optional[np.ndarray],
+        size: int,
+        rows: Optional[np.ndarray],
+    ):
+        self.matrix = matrix
+        self.quant = quant
+        self.ids = ids
+        # rows 为 None 时打分覆盖全部槽位，alive 为 None 表示没有墓碑
+        self.alive = alive
+        self.size = size
+        self.rows = rows
+
+    def _best_slots(self, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """从打分结果中选出前 k 个存活槽位，按分数降序（同分按槽位）"""
+        rows = self.rows
+        if rows is None:
+            count = self.size
+            if self.alive is not None:
+                scores[~self.alive] = -np.inf
+        else:
+            count = scores.shape[0]
+        k = min(k, count)
+        if k == 0:
+            return np.empty(0, dtype=np.int64), scores[:0]
+        if k < scores.shape[0]:
+            candidates = np.argpartition(-scores, k - 1)[:k]
+            # 先按槽位排序，保证同分时按写入顺序返回
+            candidates.sort()
+        else:
+            candidates = np.arange(scores.shape[0])
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        slots = order if rows is None else rows[order]
+        return slots, scores[order]
+
+    def top_k(self, query: np.ndarray, limit: int) -> List[Tuple[str, float]]:
+        rows = self.rows
+        if self.quant is None:
+            # 直接在 memmap 视图上打分，不复制矩阵；墓碑行置为 -inf
+            scores = self.matrix @ query if rows is None else self.matrix[rows] @ query
+            slots, scores = self._best_slots(scores, limit)
+            return [(self.ids[slot], float(score)) for slot, score in zip(slots.tolist(), scores)]
+
+        # 量化副本粗排，再读取候选行的全精度向量精排
+        rough = self.quant.scores(query, rows)
+        candidates, _ = self._best_slots(rough, limit * settings.vector_rescore_factor)
+        candidates = np.sort(candidates)
+        exact = self.matrix[candidates] @ query
+        order = np.argsort(-exact, kind="stable")[:limit]
+        return [(self.ids[candidates[i]], float(exact[i])) for i in order.tolist()]
+
+
+_indexes: Dict[PartitionKey, _Partition] = {}
+_lock = threading.RLock()
+
+
+def _partition_name(key: PartitionKey) -> str:
+    campaign_id, ref_type = key
+    return f"{campaign_id or '-'}/{ref_type}"
+
+
+def _load_index(key: PartitionKey) -> Optional[_Partition]:
+    """
+    懒加载某个分区：映射段文件并绑定 SQLite 中的 (segment, slot) 映射。
+    仍以 BLOB 形式存放的旧数据在此一次性迁入段文件。
+    """
+    index = _indexes.get(key)
+    if index is not None:
+        return index
+
+    campaign_id, ref_type = key
+    with get_cursor(readonly=True) as cursor:
+        cursor.execute(
+            """SELECT em.ref_id, em.segment, em.slot, em.embedding, en.type AS entity_type
+               FROM embeddings em
+               LEFT JOIN entities en
+                 ON em.ref_type = 'entity' AND en.entity_id = em.ref_id
+               WHERE em.campaign_id IS ? AND em.ref_type = ?
+               ORDER BY em.id""",
+            (campaign_id, ref_type)
+        )
+        rows = cursor.fetchall()
+
+    if not rows:
+        return None
+
+    mapped = [row for row in rows if row["segment"] is not None]
+    legacy = [row for row in rows if row["segment"] is None and row["embedding"]]
+    if mapped:
+        segment = Segment.open(get_segments_dir() / mapped[0]["segment"])
+    else:
+        dim = len(legacy[0]["embedding"]) // 4
+        segment = Segment.create(get_segments_dir() / segment_file_name(key, 0), dim)
+
+    index = _Partition(segment)
+    for row in mapped:
+        if row["segment"] != segment.name or row["slot"] >= segment.count:
+            logger.warning(
+                f"Skipping embedding {ref_type}/{row['ref_id']}: "
+                f"slot {row['segment']}#{row['slot']} not in {segment.name}"
+            )
+            continue
+        index.attach(row["ref_id"], row["slot"], row["entity_type"])
 
+    if legacy:
+        _migrate_legacy_rows(key, index, legacy)
+    if settings.vector_storage_precision != "float32":
+        index.enable_quantization(settings.vector_storage_precision)
 
-def _serialize_embedding(embedding: List[float]) -> bytes:
-    """将浮点数列表序列化为二进制格式"""
-    return struct.pack(f'{len(embedding)}f', *embedding)
+    _indexes[key] = index
+    return index
 
 
-def _deserialize_embedding(data: bytes) -> List[float]:
-    """将二进制数据反序列化为浮点数列表"""
-    count = len(data) // 4
-    return list(struct.unpack(f'{count}f', data))
+def _create_partition(key: PartitionKey, dim: int) -> _Partition:
+    index = _Partition(Segment.create(get_segments_dir() / segment_file_name(key, 0), dim))
+    if settings.vector_storage_precision != "float32":
+        index.enable_quantization(settings.vector_storage_precision)
+    _indexes[key] = index
+    return index
 
 
-def store_embedding(ref_type: str, ref_id: str, embedding: List[float]) -> None:
-    """存储向量嵌入"""
-    blob = _serialize_embedding(embedding)
+def _migrate_legacy_rows(key: PartitionKey, index: _Partition, rows: List[Any]) -> None:
+    """把 embeddings.embedding 中的旧 BLOB 追加到段文件并改写映射"""
+    valid = []
+    for row in rows:
+        if len(row["embedding"]) != index.dim * 4:
+            logger.warning(
+                f"Skipping embedding {key[1]}/{row['ref_id']}: "
+                f"dim {len(row['embedding']) // 4} != {index.dim}"
+            )
+            continue
+        valid.append(row)
+    if not valid:
+        return
+    vectors = np.frombuffer(b"".join(row["embedding"] for row in valid), dtype=np.float32)
+    first = index.extend(
+        [row["ref_id"] for row in valid],
+        vectors.reshape(len(valid), index.dim),
+        [row["entity_type"] for row in valid],
+    )
     with get_cursor() as cursor:
-        cursor.execute("""
-            INSERT INTO embeddings (ref_type, ref_id, embedding)
-            VALUES (?, ?, ?)
-            ON CONFLICT(ref_type, ref_id) DO UPDATE SET
-                embedding = excluded.embedding,
-                created_at = CURRENT_TIMESTAMP
-        """, (ref_type, ref_id, blob))
+        cursor.executemany(
+            """UPDATE embeddings SET segment = ?, slot = ?, embedding = NULL
+               WHERE ref_type = ? AND ref_id = ?""",
+            (
+                (index.segment.name, first + offset, key[1], row["ref_id"])
+                for offset, row in enumerate(valid)
+            )
+        )
+    logger.info(f"Migrated {len(valid)} legacy embeddings of {_partition_name(key)} to segment")
+
+
+def _list_partitions(
+    campaign_id: Optional[str],
+    ref_type: Optional[str],
+) -> List[PartitionKey]:
+    """列出需要扫描的分区；指定 campaign_id 时只会命中该战役"""
+    if campaign_id is not None and ref_type:
+        return [(campaign_id, ref_type)]
+    filters = []
+    params: List[Any] = []
+    if campaign_id is not None:
+        filters.append("campaign_id = ?")
+        params.append(campaign_id)
+    if ref_type:
+        filters.append("ref_type = ?")
+        params.append(ref_type)
+    where_clause = f"WHERE {' AND '.join(filters)}" if filters else ""
+    with get_cursor(readonly=True) as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT campaign_id, ref_type FROM embeddings {where_clause}",
+            params
+        )
+        return [(row["campaign_id"], row["ref_type"]) for row in cursor.fetchall()]
+
+
+def _lookup_owner(cursor, ref_type: str, ref_id: str) -> Tuple[Optional[str], Optional[str]]:
+    """根据被嵌入对象反查 (campaign_id, entity_type)"""
+    if ref_type == "message":
+        cursor.execute("SELECT campaign_id FROM messages WHERE message_id = ?", (ref_id,))
+        row = cursor.fetchone()
+        return (row["campaign_id"], None) if row else (None, None)
+    if ref_type == "entity":
+        cursor.execute("SELECT campaign_id, type FROM entities WHERE entity_id = ?", (ref_id,))
+        row = cursor.fetchone()
+        return (row["campaign_id"], row["type"]) if row else (None, None)
+    return None, None
+
+
+def _approximate_enabled() -> bool:
+    return settings.vector_search_mode == "approximate"
+
+
+# ============================================================
+# 段压缩
+# ============================================================
+def _maybe_compact(key: PartitionKey, index: _Partition) -> None:
+    if index.compacting or not index.needs_compaction():
+        return
+    index.compacting = True
+    thread = threading.Thread(
+        target=_compact_in_background,
+        args=(key, index),
+        name=f"segment-compact-{_partition_name(key)}",
+        daemon=True,
+    )
+    thread.start()
+
+
+def _compact_in_background(key: PartitionKey, index: _Partition) -> None:
+    """
+    把存活记录复制到新一代段文件，再在锁内补齐复制期间追加的记录、
+    改写 SQLite 映射并切换。旧段文件是追加写的，复制期间无需持锁。
+    """
+    target: Optional[Segment] = None
+    try:
+        with _lock:
+            source = index.segment
+            snapshot = source.count
+            live = np.flatnonzero(index.alive[:snapshot])
+        target = Segment.create(
+            get_segments_dir() / segment_file_name(key, index.generation + 1),
+            source.dim,
+        )
+        source.copy_rows(target, live)
+
+        with _lock:
+            if _indexes.get(key) is not index or index.segment is not source:
+                target.remove()
+                return
+            tail = np.flatnonzero(index.alive[snapshot:source.count]) + snapshot
+            source.copy_rows(target, tail)
 
+            old_slots = np.concatenate((live, tail))
+            still_alive = index.alive[old_slots]
+            mapping = np.full(source.count, -1, dtype=np.int64)
+            mapping[old_slots[still_alive]] = np.flatnonzero(still_alive)
 
-def _cosine_similarity(a: List[float], b: List[float]) -> float:
-    """计算两个向量的余弦相似度"""
-    dot = sum(x * y for x, y in zip(a, b))
-    norm_a = sum(x * x for x in a) ** 0.5
-    norm_b = sum(x * x for x in b) ** 0.5
-    if norm_a == 0 or norm_b == 0:
-        return 0.0
-    return dot / (norm_a * norm_b)
+            ids = [index.ids[slot] for slot in old_slots.tolist()]
+            with get_cursor() as cursor:
+                cursor.executemany(
+                    """UPDATE embeddings SET segment = ?, slot = ?
+                       WHERE ref_type = ? AND ref_id = ?""",
+                    (
+                        (target.name, new_slot, key[1], ref_id)
+                        for new_slot, ref_id in enumerate(ids)
+                        if ref_id is not None
+                    )
+                )
+
+            size = old_slots.shape[0]
+            index._alive = np.zeros(max(64, size), dtype=bool)
+            index._alive[:size] = still_alive
+            types = np.full(max(64, size), -1, dtype=np.int16)
+            types[:size] = index._types[old_slots]
+            index._types = types
+            index.ids = ids
+            index.rows = {ref_id: slot for slot, ref_id in enumerate(ids) if ref_id is not None}
+            index.tombstones = size - len(index.rows)
+            index.segment = target
+            index.generation += 1
+            if index.quant is not None:
+                index.quant = index.quant.take(old_slots)
+                target.close()
+            if index.ann is not None:
+                index.ann.remap(mapping)
+            logger.info(
+                f"Compacted segment of {_partition_name(key)}: "
+                f"{source.count} -> {size} slots"
+            )
+        source.remove()
+        target = None
+    except Exception:
+        logger.exception(f"Failed to compact segment of {_partition_name(key)}")
+        if target is not None and index.segment is not target:
+            target.remove()
+    finally:
+        index.compacting = False
+
+
+# ============================================================
+# IVF 训练与持久化
+# ============================================================
+def get_ann_path() -> Path:
+    """近似索引文件路径：与 SQLite 数据库同目录"""
+    db_path = get_db_path()
+    return db_path.with_name(db_path.name + ".ann.npz")
+
+
+def _maybe_train(key: PartitionKey, index: _Partition) -> None:
+    """存活行数达到阈值（或比上次训练增长足够多）时后台训练 IVF"""
+    if not _approximate_enabled() or index.training:
+        return
+    if index.size < settings.vector_ann_min_size:
+        return
+    if index.ann is not None and index.size < RETRAIN_GROWTH * index.ann.trained_size:
+        return
+    index.training = True
+    index.dirty_rows = set()
+    thread = threading.Thread(
+        target=_train_in_background,
+        args=(key, index),
+        name=f"ann-train-{_partition_name(key)}",
+        daemon=True,
+    )
+    thread.start()
+
+
+def train_ann_index(campaign_id: Optional[str], ref_type: str) -> bool:
+    """同步训练某个分区的 IVF（不受 min_size 限制），用于基准测试和手动重建"""
+    key = (campaign_id, ref_type)
+    with _lock:
+        index = _load_index(key)
+        if index is None or index.training or index.size == 0:
+            return False
+        index.training = True
+        index.dirty_rows = set()
+    _train_in_background(key, index)
+    return index.ann is not None
+
+
+def _train_in_background(key: PartitionKey, index: _Partition) -> None:
+    try:
+        with _lock:
+            count = len(index.ids)
+            generation = index.generation
+            # 段文件追加写，[0, count) 的记录不会再变，训练期间无需持锁
+            matrix = index.matrix
+            alive = index.alive.copy()
+        nlist = choose_nlist(int(alive.sum()), settings.vector_ann_nlist)
+        ann = IVFIndex.train(matrix, alive, nlist)
+
+        with _lock:
+            if _indexes.get(key) is not index:
+                return
+            if index.generation != generation:
+                # 训练期间发生过压缩，槽位已变化：沿用聚类中心重新分配全部行
+                ann = IVFIndex(ann.centroids, ann.trained_size)
+                stale = np.flatnonzero(index.alive)
+            else:
+                added = np.arange(count, len(index.ids))
+                dirty = np.fromiter(index.dirty_rows, dtype=np.int64)
+                stale = np.union1d(added, dirty)
+                stale = stale[index.alive[stale]]
+            ann.add_many(stale, index.matrix[stale])
+            index.ann = ann
+            logger.info(
+                f"Trained IVF index for {_partition_name(key)}: rows={index.size}, nlist={ann.nlist}"
+            )
+            save_ann_index()
+    except Exception:
+        logger.exception(f"Failed to train IVF index for {_partition_name(key)}")
+    finally:
+        index.training = False
+        index.dirty_rows = set()
+
+
+def save_ann_index() -> None:
+    """把 IVF 聚类中心与分配结果写入 .ann.npz（原子替换）"""
+    with _lock:
+        arrays: Dict[str, np.ndarray] = {}
+        partitions: List[List[str]] = []
+        for key, index in _indexes.items():
+            if index.ann is None:
+                continue
+            prefix = f"p{len(partitions)}"
+            campaign_id, ref_type = key
+            partitions.append([campaign_id or "", ref_type, "1" if campaign_id is not None else "0"])
+            rows = np.flatnonzero(index.alive)
+            rows = rows[rows < index.ann.assign.shape[0]]
+            arrays[f"{prefix}::centroids"] = index.ann.centroids
+            arrays[f"{prefix}::ref_ids"] = np.array([index.ids[r] for r in rows.tolist()], dtype=str)
+            arrays[f"{prefix}::assign"] = index.ann.assign[rows]
+            arrays[f"{prefix}::trained_size"] = np.array(index.ann.trained_size)
+    if not partitions:
+        return
+    arrays["partitions"] = np.array(partitions, dtype=str)
+
+    path = get_ann_path()
+    tmp_path = path.with_name(path.name + ".tmp.npz")
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_ann_index() -> None:
+    """启动时从 .ann.npz 恢复 IVF；文件之后新增的行按已有中心补分配"""
+    if not _approximate_enabled():
+        return
+    path = get_ann_path()
+    if not path.exists():
+        return
+
+    try:
+        data = np.load(path)
+    except Exception:
+        logger.exception(f"Failed to read ANN index file {path}, ignoring it")
+        return
+
+    with data, _lock:
+        if "partitions" not in data.files:
+            logger.warning(f"Discarding ANN index file {path}: unpartitioned format")
+            return
+        for position, (campaign_id, ref_type, has_campaign) in enumerate(data["partitions"].tolist()):
+            key = (campaign_id if has_campaign == "1" else None, ref_type)
+            prefix = f"p{position}"
+            index = _load_index(key)
+            if index is None:
+                continue
+            centroids = data[f"{prefix}::centroids"]
+            if centroids.shape[1] != index.dim:
+                logger.warning(f"Discarding ANN index for {_partition_name(key)}: dim changed")
+                continue
+
+            ann = IVFIndex(centroids, int(data[f"{prefix}::trained_size"]))
+            ann.assign = np.full(max(64, len(index.ids)), -1, dtype=np.int32)
+            known: List[int] = []
+            for ref_id, label in zip(data[f"{prefix}::ref_ids"].tolist(), data[f"{prefix}::assign"].tolist()):
+                row = index.rows.get(ref_id)
+                if row is None or label < 0 or label >= ann.nlist:
+                    continue
+                ann.assign[row] = label
+                ann._lists[label].append(row)
+                known.append(row)
+
+            missing = np.setdiff1d(np.flatnonzero(index.alive), np.array(known, dtype=np.int64))
+            ann.add_many(missing, index.matrix[missing])
+            index.ann = ann
+            logger.info(
+                f"Loaded IVF index for {_partition_name(key)}: rows={index.size}, "
+                f"nlist={ann.nlist}, reassigned={missing.shape[0]}"
+            )
+            _maybe_train(key, index)
+
+
+# ============================================================
+# 公共接口
+# ============================================================
+def store_embedding(
+    ref_type: str,
+    ref_id: str,
+    embedding: List[float],
+    campaign_id: Optional[str] = None,
+    entity_type: Optional[str] = None,
+) -> None:
+    """
+    存储向量嵌入：追加到分区段文件，并在 SQLite 中记录 (segment, slot)
+    campaign_id / entity_type 未传入时从 messages / entities 表反查
+    """
+    with _lock:
+        with get_cursor() as cursor:
+            if campaign_id is None:
+                campaign_id, looked_up_type = _lookup_owner(cursor, ref_type, ref_id)
+                entity_type = entity_type or looked_up_type
+            cursor.execute(
+                "SELECT campaign_id FROM embeddings WHERE ref_type = ? AND ref_id = ?",
+                (ref_type, ref_id)
+            )
+            previous = cursor.fetchone()
+
+        key = (campaign_id, ref_type)
+        index = _load_index(key)
+        if index is None:
+            index = _create_partition(key, len(embedding))
+        elif len(embedding) != index.dim:
+            raise ValueError(
+                f"Embedding dim {len(embedding)} does not match index dim {index.dim}"
+            )
+
+        # ref 换了战役：旧分区里的记录打墓碑
+        if previous is not None and previous["campaign_id"] != campaign_id:
+            old_index = _indexes.get((previous["campaign_id"], ref_type))
+            if old_index is not None:
+                old_index.delete(ref_id)
+
+        slot = index.append(ref_id, np.asarray(embedding, dtype=np.float32), entity_type)
+        with get_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO embeddings (campaign_id, ref_type, ref_id, segment, slot)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(ref_type, ref_id) DO UPDATE SET
+                    campaign_id = excluded.campaign_id,
+                    segment = excluded.segment,
+                    slot = excluded.slot,
+                    embedding = NULL,
+                    created_at = CURRENT_TIMESTAMP
+            """, (campaign_id, ref_type, ref_id, index.segment.name, slot))
+        _maybe_train(key, index)
+        _maybe_compact(key, index)
+
+
+def update_entity_type(campaign_id: str, entity_id: str, entity_type: str) -> None:
+    """实体类型变化（如 Unknown 升级）时同步内存分区里的类型编码"""
+    with _lock:
+        index = _indexes.get((campaign_id, "entity"))
+        if index is not None:
+            index.set_type(entity_id, entity_type)
+
+
+def delete_embedding(ref_type: str, ref_id: str) -> bool:
+    """删除向量嵌入：删除映射，段文件中的记录打墓碑"""
+    with _lock:
+        with get_cursor() as cursor:
+            cursor.execute(
+                "SELECT campaign_id FROM embeddings WHERE ref_type = ? AND ref_id = ?",
+                (ref_type, ref_id)
+            )
+            row = cursor.fetchone()
+            if not row:
+                return False
+            cursor.execute(
+                "DELETE FROM embeddings WHERE ref_type = ? AND ref_id = ?",
+                (ref_type, ref_id)
+            )
+        key = (row["campaign_id"], ref_type)
+        index = _indexes.get(key)
+        if index is not None:
+            index.delete(ref_id)
+            _maybe_compact(key, index)
+    return True
+
+
+def delete_campaign_embeddings(campaign_id: str, limit: int) -> int:
+    """
+    删除战役的一批向量映射（一个事务），返回删除数量。
+    同时卸载该战役的内存分区，段文件在全部删除后由 drop_campaign_segments 移除
+    """
+    with _lock:
+        for key in [key for key in _indexes if key[0] == campaign_id]:
+            _indexes.pop(key).segment.close()
+        with get_cursor() as cursor:
+            cursor.execute(
+                """DELETE FROM embeddings WHERE id IN (
+                       SELECT id FROM embeddings WHERE campaign_id = ? LIMIT ?
+                   )""",
+                (campaign_id, limit)
+            )
+            return cursor.rowcount
+
+
+def drop_campaign_segments(campaign_id: str) -> int:
+    """移除战役所有分区的段文件（映射须已删除），返回移除的文件数"""
+    removed = 0
+    with _lock:
+        for ref_type in ("entity", "message"):
+            key = (campaign_id, ref_type)
+            index = _indexes.pop(key, None)
+            if index is not None:
+                index.segment.close()
+            prefix = segment_file_name(key, 0).rsplit("-", 1)[0]
+            for path in get_segments_dir().glob(f"{prefix}-*.seg"):
+                path.unlink(missing_ok=True)
+                removed += 1
+    return removed
+
+
+def reset_index() -> None:
+    """清空内存索引，下次搜索时重新加载映射与段文件"""
+    with _lock:
+        for index in _indexes.values():
+            index.segment.close()
+        _indexes.clear()
+
+
+def clear_embeddings() -> None:
+    """删除全部向量（嵌入模型或维度变化后需整体重新嵌入）"""
+    with _lock:
+        for index in _indexes.values():
+            index.segment.close()
+        _indexes.clear()
+        with get_cursor() as cursor:
+            cursor.execute("DELETE FROM embeddings")
+        for path in get_segments_dir().glob("*.seg"):
+            path.unlink(missing_ok=True)
+        get_ann_path().unlink(missing_ok=True)
 
 
 def search_similar(
     query_embedding: List[float],
     ref_type: Optional[str] = None,
-    limit: int = 10
+    limit: int = 10,
+    mode: Optional[str] = None,
+    campaign_id: Optional[str] = None,
+    entity_types: Optional[List[str]] = None,
 ) -> List[Tuple[str, str, float]]:
     """
     搜索相似向量
+    campaign_id: 只扫描该战役的分区（None 表示全部战役）
+    entity_types: 只保留这些实体类型的行，在打分之前过滤
+    mode: exact | approximate，默认取 settings.vector_search_mode
     返回: [(ref_type, ref_id, similarity), ...]
     """
-    with get_cursor() as cursor:
-        if ref_type:
-            cursor.execute(
-                "SELECT ref_type, ref_id, embedding FROM embeddings WHERE ref_type = ?",
-                (ref_type,)
-            )
-        else:
-            cursor.execute("SELECT ref_type, ref_id, embedding FROM embeddings")
+    if limit <= 0:
+        return []
+    mode = mode or settings.vector_search_mode
+    query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+
+    # 锁内只加载分区、筛行并取快照；矩阵-向量乘法和 argpartition 在锁外执行，
+    # 并发的搜索与 store_embedding 不再互相等待
+    snapshots: List[Tuple[str, _PartitionSnapshot]] = []
+    with _lock:
+        for key in _list_partitions(campaign_id, ref_type):
+            index = _load_index(key)
+            if index is None:
+                continue
+            if query.shape[0] != index.dim:
+                raise ValueError(
+                    f"Query dim {query.shape[0]} does not match index dim {index.dim}"
+                )
+            rows = None
+            if mode == "approximate" and index.ann is not None:
+                rows = index.filter_rows(
+                    index.ann.candidates(query, settings.vector_ann_nprobe),
+                    entity_types,
+                )
+                if rows.shape[0] < limit:
+                    # 候选不足时退回精确搜索，保证返回条数
+                    rows = None
+            if rows is None:
+                rows = index.filter_rows(None, entity_types)
+            snapshots.append((key[1], index.snapshot(rows)))
+
+    results: List[Tuple[str, str, float]] = []
+    for partition_type, snapshot in snapshots:
+        results.extend(
+            (partition_type, ref_id, score)
+            for ref_id, score in snapshot.top_k(query, limit)
+        )
+
+    results.sort(key=lambda x: x[2], reverse=True)
+    return results[:limit]
+
+
+def estimate_recall(
+    key: PartitionKey,
+    k: int = 10,
+    samples: int = 32,
+    seed: int = 0,
+) -> Optional[float]:
+    """
+    估计近似搜索的 recall@k：以加噪的已存向量作为查询，
+    对比近似结果与精确结果的重合比例。
+    """
+    campaign_id, ref_type = key
+    with _lock:
+        index = _load_index(key)
+        if index is None or index.ann is None:
+            return None
+        rng = np.random.default_rng(seed)
+        alive_rows = np.flatnonzero(index.alive)
+        picks = rng.choice(alive_rows, min(samples, alive_rows.shape[0]), replace=False)
+        queries = index.matrix[picks] + rng.normal(0, 0.05, (picks.shape[0], index.dim)).astype(np.float32)
+
+    hits = 0
+    total = 0
+    for query in queries:
+        payload = query.tolist()
+        exact = search_similar(payload, ref_type, k, mode="exact", campaign_id=campaign_id)
+        approx = search_similar(payload, ref_type, k, mode="approximate", campaign_id=campaign_id)
+        exact_ids = {ref_id for _, ref_id, _ in exact}
+        hits += len(exact_ids & {ref_id for _, ref_id, _ in approx})
+        total += len(exact_ids)
+    return hits / total if total else None
 
-        results = []
-        for row in cursor.fetchall():
-            emb = _deserialize_embedding(row["embedding"])
-            sim = _cosine_similarity(query_embedding, emb)
-            results.append((row["ref_type"], row["ref_id"], sim))
 
-        results.sort(key=lambda x: x[2], reverse=True)
-        return results[:limit]
+def get_vector_index_status(with_recall: bool = False) -> Dict[str, Any]:
+    """向量索引状态（已加载的分区），用于 /health/vector"""
+    with _lock:
+        partitions = {
+            key: {
+                "campaign_id": key[0],
+                "ref_type": key[1],
+                "segment": index.segment.name,
+                "slots": index.segment.count,
+                "rows": index.size,
+                "tombstones": index.tombstones,
+                "dim": index.dim,
+                "precision": index.quant.precision if index.quant is not None else "float32",
+                "resident_bytes": (
+                    index.quant.nbytes if index.quant is not None
+                    else index.segment.count * index.dim * 4
+                ),
+                "ann": {
+                    "nlist": index.ann.nlist,
+                    "nprobe": settings.vector_ann_nprobe,
+                    "trained_size": index.ann.trained_size,
+                } if index.ann is not None else None,
+                "training": index.training,
+                "compacting": index.compacting,
+            }
+            for key, index in _indexes.items()
+        }
+    if with_recall:
+        for key, status in partitions.items():
+            if status["ann"] is not None:
+                status["ann"]["recall_at_10"] = estimate_recall(key)
+    return {
+        "mode": settings.vector_search_mode,
+        "partitions": list(partitions.values()),
+    }
@@ -0,0 +1,144 @@
+"""
+Approximate nearest-neighbour index for tarven-note.
+基于 IVF（倒排文件）的近似向量索引，纯 NumPy 实现。
+
+IVF 只保存聚类中心与每一行所属的倒排桶，向量本身仍在 vector.py 的
+内存矩阵里；查询时只对 nprobe 个最近桶内的行打分。
+"""
+from typing import List, Optional
+
+import numpy as np
+
+
+# 训练样本上限：每个桶最多取这么多行参与 k-means
+SAMPLES_PER_LIST = 64
+MAX_TRAIN_SAMPLES = 65536
+# 批量分配时每批的行数，控制 (rows × nlist) 临时矩阵的大小
+ASSIGN_CHUNK = 8192
+
+
+def choose_nlist(count: int, configured: int = 0) -> int:
+    """选择倒排桶数量，未配置时取 sqrt(N)"""
+    if configured > 0:
+        return max(1, min(configured, count))
+    return max(1, min(int(count ** 0.5), 4096))
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """把每一行分配到内积最大的聚类中心"""
+    labels = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], ASSIGN_CHUNK):
+        chunk = vectors[start:start + ASSIGN_CHUNK]
+        labels[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return labels
+
+
+def _spherical_kmeans(
+    sample: np.ndarray,
+    nlist: int,
+    iterations: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """球面 k-means：中心始终保持单位长度，与余弦相似度一致"""
+    centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _assign(sample, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        sums = np.add.reduceat(sample[order], starts, axis=0)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        # 空桶保留上一轮的中心
+        centroids[filled] = sums / norms
+    return centroids
+
+
+class IVFIndex:
+    """倒排文件索引：centroids + 行号 → 桶号"""
+
+    def __init__(self, centroids: np.ndarray, trained_size: int):
+        self.centroids = centroids.astype(np.float32, copy=False)
+        self.nlist = centroids.shape[0]
+        self.trained_size = trained_size
+        self.assign = np.full(0, -1, dtype=np.int32)
+        self._lists: List[List[int]] = [[] for _ in range(self.nlist)]
+        self._arrays: List[Optional[np.ndarray]] = [None] * self.nlist
+
+    @classmethod
+    def train(
+        cls,
+        matrix: np.ndarray,
+        alive: np.ndarray,
+        nlist: int,
+        iterations: int = 8,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        rng = np.random.default_rng(seed)
+        rows = np.flatnonzero(alive)
+        sample_size = min(rows.shape[0], nlist * SAMPLES_PER_LIST, MAX_TRAIN_SAMPLES)
+        sample_rows = np.sort(rng.choice(rows, sample_size, replace=False))
+        nlist = min(nlist, sample_size)
+        centroids = _spherical_kmeans(matrix[sample_rows], nlist, iterations, rng)
+
+        index = cls(centroids, trained_size=rows.shape[0])
+        index.add_many(rows, matrix[rows])
+        return index
+
+    def _ensure_capacity(self, size: int) -> None:
+        if size > self.assign.shape[0]:
+            grown = np.full(max(64, size * 2), -1, dtype=np.int32)
+            grown[:self.assign.shape[0]] = self.assign
+            self.assign = grown
+
+    def add_many(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """批量（重新）分配行；旧桶里的残留项在查询时按 assign 过滤"""
+        if rows.shape[0] == 0:
+            return
+        labels = _assign(vectors, self.centroids)
+        self._ensure_capacity(int(rows.max()) + 1)
+        self.assign[rows] = labels
+        for row, label in zip(rows.tolist(), labels.tolist()):
+            self._lists[label].append(row)
+            self._arrays[label] = None
+
+    def add(self, row: int, vector: np.ndarray) -> None:
+        self.add_many(np.array([row]), vector[np.newaxis, :])
+
+    def _list_array(self, label: int) -> np.ndarray:
+        array = self._arrays[label]
+        if array is None:
+            array = np.array(self._lists[label], dtype=np.int64)
+            self._arrays[label] = array
+        return array
+
+    def candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """返回 nprobe 个最近桶内的候选行号（已去除过期项）"""
+        nprobe = max(1, min(nprobe, self.nlist))
+        scores = self.centroids @ query
+        if nprobe < self.nlist:
+            probes = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        else:
+            probes = np.arange(self.nlist)
+        arrays = [self._list_array(int(label)) for label in probes]
+        rows = np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int64)
+        if rows.shape[0] == 0:
+            return rows
+        # 行被重新分配到其他桶后，旧桶中的条目作废
+        labels = np.repeat(probes, [a.shape[0] for a in arrays])
+        rows = rows[self.assign[rows] == labels]
+        return np.unique(rows)
+
+    def remap(self, mapping: np.ndarray) -> None:
+        """矩阵压缩后按 旧行号 → 新行号 重写倒排表，mapping 中 -1 表示已删除"""
+        size = int(mapping.max()) + 1 if mapping.shape[0] else 0
+        assign = np.full(max(64, size), -1, dtype=np.int32)
+        old_rows = np.flatnonzero(mapping >= 0)
+        old_rows = old_rows[old_rows < self.assign.shape[0]]
+        assign[mapping[old_rows]] = self.assign[old_rows]
+        self.assign = assign
+        self._lists = [[] for _ in range(self.nlist)]
+        self._arrays = [None] * self.nlist
+        for row in np.flatnonzero(assign >= 0).tolist():
+            self._lists[assign[row]].append(row)
@@ -0,0 +1,89 @@
+"""
+Quantized embedding storage for tarven-note.
+向量的低精度内存副本，用于第一轮粗排；全精度向量留在 memmap 段文件中，
+只对粗排选出的候选行读取并精排。
+
+precision:
+    float16 - 半精度，内存减半
+    int8    - 每行一个缩放系数的标量量化，内存约为 1/4
+"""
+from typing import Optional
+
+import numpy as np
+
+
+PRECISIONS = ("float32", "float16", "int8")
+# 粗排时分块反量化，限制临时 float32 矩阵的大小
+SCORE_CHUNK = 256
+
+
+class QuantizedMatrix:
+    """按槽位对齐的量化矩阵（float16 或 int8 + 每行 scale）"""
+
+    def __init__(self, dim: int, precision: str):
+        if precision not in ("float16", "int8"):
+            raise ValueError(f"Unsupported quantized precision: {precision}")
+        self.dim = dim
+        self.precision = precision
+        self.count = 0
+        dtype = np.float16 if precision == "float16" else np.int8
+        self._codes = np.empty((0, dim), dtype=dtype)
+        self._scales = np.empty(0, dtype=np.float32)
+
+    @property
+    def nbytes(self) -> int:
+        return self._codes[:self.count].nbytes + (
+            self._scales[:self.count].nbytes if self.precision == "int8" else 0
+        )
+
+    def _grow(self, size: int) -> None:
+        if size <= self._codes.shape[0]:
+            return
+        capacity = max(64, size * 2)
+        codes = np.empty((capacity, self.dim), dtype=self._codes.dtype)
+        codes[:self.count] = self._codes[:self.count]
+        self._codes = codes
+        scales = np.empty(capacity, dtype=np.float32)
+        scales[:self.count] = self._scales[:self.count]
+        self._scales = scales
+
+    def extend(self, vectors: np.ndarray) -> None:
+        """追加已归一化的 float32 行"""
+        size = vectors.shape[0]
+        self._grow(self.count + size)
+        target = slice(self.count, self.count + size)
+        if self.precision == "float16":
+            self._codes[target] = vectors.astype(np.float16)
+        else:
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            self._codes[target] = np.rint(vectors / scales[:, np.newaxis]).astype(np.int8)
+            self._scales[target] = scales
+        self.count += size
+
+    def take(self, slots: np.ndarray) -> "QuantizedMatrix":
+        """按给定槽位顺序抽取出新矩阵（段压缩后使用）"""
+        taken = QuantizedMatrix(self.dim, self.precision)
+        taken._codes = self._codes[slots].copy()
+        taken._scales = self._scales[slots].copy()
+        taken.count = slots.shape[0]
+        return taken
+
+    def snapshot(self) -> "QuantizedMatrix":
+        """当前各行的只读视图：已写入的行不会被改写，扩容时换成新数组，可与原矩阵共享"""
+        view = QuantizedMatrix(self.dim, self.precision)
+        view._codes = self._codes[:self.count]
+        view._scales = self._scales[:self.count]
+        view.count = self.count
+        return view
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """近似内积；rows 为 None 时对全部槽位打分"""
+        codes = self._codes[:self.count] if rows is None else self._codes[rows]
+        out = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], SCORE_CHUNK):
+            chunk = codes[start:start + SCORE_CHUNK].astype(np.float32)
+            out[start:start + chunk.shape[0]] = chunk @ query
+        if self.precision == "int8":
+            out *= self._scales[:self.count] if rows is None else self._scales[rows]
+        return out
@@ -0,0 +1,119 @@
+"""
+Memory-mapped embedding segments for tarven-note.
+向量以定长 float32 记录追加写入段文件，搜索直接在 np.memmap 视图上进行，
+不再把 BLOB 复制成 Python 列表。SQLite 的 embeddings 表只保存 (segment, slot) 映射。
+
+段文件格式:
+    16 字节头: magic "TNVS" | version (u32) | dim (u32) | 保留 (u32)
+    之后是 N 条 dim × float32 记录（行已归一化），槽位号即记录序号
+"""
+import hashlib
+import os
+import struct
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from server.db.sqlite import get_db_path
+
+
+HEADER = struct.Struct("<4sIII")
+MAGIC = b"TNVS"
+VERSION = 1
+# 压缩时分批复制的记录数
+COPY_CHUNK = 8192
+
+
+def get_segments_dir() -> Path:
+    """段文件目录：与 SQLite 数据库同目录"""
+    db_path = get_db_path()
+    path = db_path.with_name(db_path.name + ".segments")
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def segment_file_name(key: Tuple[Optional[str], str], generation: int) -> str:
+    """分区 → 段文件名；campaign_id 可能含任意字符，用摘要作前缀"""
+    campaign_id, ref_type = key
+    raw = f"{campaign_id if campaign_id is not None else ''}\x00{ref_type}"
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+    return f"{digest}-{generation}.seg"
+
+
+def parse_generation(name: str) -> int:
+    return int(name.rsplit("-", 1)[1].split(".", 1)[0])
+
+
+class Segment:
+    """单个追加写段文件及其只读 memmap 视图"""
+
+    def __init__(self, path: Path, dim: int, count: int):
+        self.path = path
+        self.name = path.name
+        self.dim = dim
+        self.count = count
+        self._view: Optional[np.ndarray] = None
+
+    @property
+    def stride(self) -> int:
+        return self.dim * 4
+
+    @classmethod
+    def create(cls, path: Path, dim: int) -> "Segment":
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, dim, 0))
+        return cls(path, dim, 0)
+
+    @classmethod
+    def open(cls, path: Path) -> "Segment":
+        with open(path, "rb") as f:
+            magic, version, dim, _ = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not an embedding segment: {path}")
+        size = path.stat().st_size - HEADER.size
+        count, partial = divmod(size, dim * 4)
+        if partial:
+            # 追加写到一半时崩溃：截掉不完整的尾记录，保证后续记录对齐
+            with open(path, "r+b") as f:
+                f.truncate(HEADER.size + count * dim * 4)
+        return cls(path, dim, count)
+
+    def append(self, vectors: np.ndarray) -> int:
+        """追加若干条记录，返回第一条的槽位号"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        first = self.count
+        with open(self.path, "ab") as f:
+            f.write(vectors.tobytes())
+        self.count += vectors.shape[0]
+        return first
+
+    def view(self) -> np.ndarray:
+        """返回 [0, count) 的只读 memmap 视图，文件增长后按需重新映射"""
+        if self.count == 0:
+            return np.empty((0, self.dim), dtype=np.float32)
+        if self._view is None or self._view.shape[0] < self.count:
+            self._view = np.memmap(
+                self.path,
+                dtype=np.float32,
+                mode="r",
+                offset=HEADER.size,
+                shape=(self.count, self.dim),
+            )
+        return self._view[:self.count]
+
+    def copy_rows(self, target: "Segment", slots: np.ndarray) -> None:
+        """把指定槽位的记录按顺序追加到另一个段"""
+        source = self.view()
+        for start in range(0, slots.shape[0], COPY_CHUNK):
+            target.append(source[slots[start:start + COPY_CHUNK]])
+
+    def close(self) -> None:
+        self._view = None
+
+    def remove(self) -> None:
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
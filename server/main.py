@@ -1,6 +1,6 @@
 import logging
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 logging.basicConfig(
@@ -9,45 +9,80 @@ logging.basicConfig(
 )
 
 from server.api.campaigns import router as campaigns_router
+from server.api.conditional import conditional_get
+from server.api.embeddings import router as embeddings_router
 from server.api.entities import router as entities_router
 from server.api.extract import router as extract_router
 from server.api.health import router as health_router
 from server.api.ingest import router as ingest_router
 from server.api.queries import router as queries_router
+from server.api.recall import router as recall_router
 from server.api.relationships import router as relationships_router
 from server.api.messages import router as messages_router
-from server.db.neo4j import close_driver
-from server.db.schema import apply_schema
-from server.db.sqlite import close_connection as close_sqlite
+from server.db.sqlite import close_connection as close_sqlite, shutdown_executor
 from server.db.sqlite_schema import apply_sqlite_schema
+from server.db.vector import load_ann_index, save_ann_index
+from server.repositories.graph_store import close_graph_store, get_graph_store
+from server.services.campaign_deletion import stop_deletion_jobs
+from server.services.embedding_worker import (
+    prepare_embedding_queue,
+    start_embedding_worker,
+    stop_embedding_worker,
+)
+from server.services.embeddings import close_client as close_embedding_client
 
 app = FastAPI()
 
+
+# 后添加的中间件在外层：CORS → 条件 GET → 图存储作用域
+@app.middleware("http")
+async def graph_request_scope(request: Request, call_next):
+    # 一个请求内的图存储访问共用一个作用域（Neo4j 为同一个会话）
+    async with get_graph_store().request_scope():
+        return await call_next(request)
+
+
+# 命中缓存或返回 304 时不进入图存储作用域
+app.middleware("http")(conditional_get)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # 分页游标和 ETag 放在响应头中，浏览器端需要显式暴露
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+
 app.include_router(health_router)
 app.include_router(campaigns_router)
 app.include_router(entities_router)
 app.include_router(relationships_router)
 app.include_router(queries_router)
+app.include_router(recall_router)
 app.include_router(ingest_router)
 app.include_router(extract_router)
 app.include_router(messages_router)
+app.include_router(embeddings_router)
 
 
 @app.on_event("startup")
-def startup_event():
-    apply_schema()
+async def startup_event():
+    await get_graph_store().apply_schema()
     apply_sqlite_schema()
+    load_ann_index()
+    prepare_embedding_queue()
+    start_embedding_worker()
 
 
 @app.on_event("shutdown")
-def shutdown_event():
-    close_driver()
+async def shutdown_event():
+    await stop_embedding_worker()
+    await stop_deletion_jobs()
+    await close_embedding_client()
+    await close_graph_store()
+    shutdown_executor()
+    save_ann_index()
     close_sqlite()
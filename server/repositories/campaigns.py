@@ -1,150 +1,50 @@
-from datetime import datetime
 from typing import Any, Dict, List, Optional
-from uuid import uuid4
 
-from server.db.neo4j import get_session
-from server.repositories.utils import node_to_dict, serialize_map
+from server.db import entity_directory, graph_cache
+from server.db.sqlite import run_sqlite
+from server.repositories.graph_store import get_graph_store
+from server.repositories.sqlite_changes import reset_changes
 
 
-def create_campaign(
+async def create_campaign(
     name: str,
     system: str,
     description: Optional[str],
     metadata: Dict[str, Any],
     campaign_id: Optional[str] = None,
 ) -> Dict[str, Any]:
-    # 如果没有传入 campaign_id，则自动生成
-    if not campaign_id:
-        campaign_id = str(uuid4())
-    created_at = datetime.utcnow()
-    metadata_payload = serialize_map(metadata)
-    with get_session() as session:
-        result = session.run(
-            """
-            CREATE (c:Campaign {
-              campaign_id: $campaign_id,
-              name: $name,
-              system: $system,
-              description: $description,
-              status: $status,
-              metadata: $metadata,
-              created_at: $created_at,
-              updated_at: $updated_at
-            })
-            RETURN c
-            """,
-            {
-                "campaign_id": campaign_id,
-                "name": name,
-                "system": system,
-                "description": description,
-                "status": "active",
-                "metadata": metadata_payload,
-                "created_at": created_at,
-                "updated_at": created_at,
-            },
-        )
-        record = result.single()
-    return node_to_dict(record["c"], ["metadata"]) if record else None
+    # 如果没有传入 campaign_id，由存储后端自动生成
+    return await get_graph_store().create_campaign(name, system, description, metadata, campaign_id)
 
 
-def list_campaigns() -> List[Dict[str, Any]]:
-    with get_session() as session:
-        result = session.run(
-            """
-            MATCH (c:Campaign)
-            RETURN c
-            ORDER BY c.created_at DESC
-            """
-        )
-        return [node_to_dict(record["c"], ["metadata"]) for record in result]
+async def list_campaigns() -> List[Dict[str, Any]]:
+    return await get_graph_store().list_campaigns()
 
 
-def get_campaign(campaign_id: str) -> Optional[Dict[str, Any]]:
-    with get_session() as session:
-        result = session.run(
-            """
-            MATCH (c:Campaign {campaign_id: $campaign_id})
-            RETURN c
-            """,
-            {"campaign_id": campaign_id},
-        )
-        record = result.single()
-    return node_to_dict(record["c"], ["metadata"]) if record else None
+async def get_campaign(campaign_id: str) -> Optional[Dict[str, Any]]:
+    return await get_graph_store().get_campaign(campaign_id)
 
 
-def update_campaign(
+async def update_campaign(
     campaign_id: str,
     updates: Dict[str, Any],
 ) -> Optional[Dict[str, Any]]:
-    updates["updated_at"] = datetime.utcnow()
-    if "metadata" in updates:
-        updates["metadata"] = serialize_map(updates["metadata"])
-    with get_session() as session:
-        result = session.run(
-            """
-            MATCH (c:Campaign {campaign_id: $campaign_id})
-            SET c += $updates
-            RETURN c
-            """,
-            {"campaign_id": campaign_id, "updates": updates},
-        )
-        record = result.single()
-    return node_to_dict(record["c"], ["metadata"]) if record else None
+    return await get_graph_store().update_campaign(campaign_id, updates)
 
 
-def delete_campaign(campaign_id: str) -> bool:
-    with get_session() as session:
-        # 先删除所有关联的实体及其关系
-        session.run(
-            """
-            MATCH (e:Entity)-[:IN_CAMPAIGN]->(:Campaign {campaign_id: $campaign_id})
-            DETACH DELETE e
-            """,
-            {"campaign_id": campaign_id},
-        )
-        # 再删除战役节点
-        result = session.run(
-            """
-            MATCH (c:Campaign {campaign_id: $campaign_id})
-            DETACH DELETE c
-            RETURN COUNT(c) AS deleted
-            """,
-            {"campaign_id": campaign_id},
-        )
-        record = result.single()
-    return record["deleted"] > 0
+async def delete_campaign(campaign_id: str) -> bool:
+    deleted = await get_graph_store().delete_campaign(campaign_id)
+    graph_cache.drop_campaign(campaign_id)
+    entity_directory.drop_campaign(campaign_id)
+    # 已同步过的客户端在下次拉取变更时收到 reset
+    await run_sqlite(reset_changes, campaign_id)
+    return deleted
 
 
-def ensure_campaign_exists(campaign_id: str) -> Dict[str, Any]:
+async def ensure_campaign_exists(campaign_id: str) -> Dict[str, Any]:
     """确保 campaign 存在，不存在则自动创建"""
-    existing = get_campaign(campaign_id)
+    existing = await get_campaign(campaign_id)
     if existing:
         return existing
-
     # 自动创建，使用 campaign_id 作为名称
-    created_at = datetime.utcnow()
-    with get_session() as session:
-        result = session.run(
-            """
-            CREATE (c:Campaign {
-              campaign_id: $campaign_id,
-              name: $name,
-              system: 'auto',
-              description: 'Auto-created campaign',
-              status: 'active',
-              metadata: '{}',
-              created_at: $created_at,
-              updated_at: $updated_at
-            })
-            RETURN c
-            """,
-            {
-                "campaign_id": campaign_id,
-                "name": campaign_id,
-                "created_at": created_at,
-                "updated_at": created_at,
-            },
-        )
-        record = result.single()
-    return node_to_dict(record["c"], ["metadata"]) if record else None
+    return await get_graph_store().ensure_campaign(campaign_id)
@@ -1,161 +1,94 @@
-from datetime import datetime
 from typing import Any, Dict, List, Optional
-from uuid import uuid4
 
-from server.db.neo4j import get_session
-from server.repositories.utils import node_to_dict
+from server.db import entity_directory, graph_cache
+from server.db.sqlite import run_sqlite
+from server.db.vector import delete_embedding
+from server.repositories.graph_store import get_graph_store
+from server.repositories.sqlite_changes import deleted_change, entity_change, record_changes
+from server.repositories.sqlite_entities import delete_entity_rows, rename_entity
 
 
-def create_entity(
+async def create_entity(
     campaign_id: str,
     entity_type: str,
     name: str,
     properties: Dict[str, Any],
     metadata: Dict[str, Any],
 ) -> Dict[str, Any]:
-    """创建实体节点（Neo4j只存基本信息，属性存SQLite）"""
-    created_at = datetime.utcnow()
-
-    # Check if entity already exists
-    existing = get_entity_by_name(campaign_id, name)
-
-    if existing:
-        entity_id = existing["entity_id"]
-        is_new = False
-        should_update_type = existing.get("type") == "Unknown"
-    else:
-        entity_id = str(uuid4())
-        is_new = True
-        should_update_type = True
-
-    # Build query - Neo4j只存基本信息，属性存SQLite
-    query = (
-        "MATCH (c:Campaign {campaign_id: $campaign_id}) "
-        "MERGE (e:Entity { campaign_id: $campaign_id, name: $name }) "
-        "SET "
-        "e.entity_id = $entity_id, "
-        "e.updated_at = $updated_at"
-    )
-
-    # Update type if it's a new entity or if upgrading from "Unknown"
-    if should_update_type:
-        query += ", e.type = $entity_type "
-
-    if is_new:
-        query += ", e.created_at = $created_at "
-
-    query += " MERGE (e)-[:IN_CAMPAIGN]->(c) RETURN e"
-
-    with get_session() as session:
-        result = session.run(
-            query,
-            {
-                "campaign_id": campaign_id,
-                "entity_id": entity_id,
-                "entity_type": entity_type,
-                "name": name,
-                "created_at": created_at,
-                "updated_at": created_at,
-            },
-        )
-        record = result.single()
-    return node_to_dict(record["e"], [])
-
-
-def list_entities(
+    """创建实体节点（图存储只存基本信息，属性存SQLite）；查重与写入在同一事务内"""
+    entity = await get_graph_store().create_entity(campaign_id, entity_type, name)
+    graph_cache.entity_upserted(campaign_id, entity["entity_id"], entity["name"], entity.get("type"))
+    entity_directory.entity_upserted(campaign_id, entity["entity_id"], entity["name"])
+    await run_sqlite(record_changes, campaign_id, [entity_change(entity)])
+    return entity
+
+
+async def list_entities(
     campaign_id: str,
     entity_type: Optional[str] = None,
     name: Optional[str] = None,
+    after: Optional[str] = None,
+    limit: Optional[int] = None,
 ) -> List[Dict[str, Any]]:
-    filters = []
-    params: Dict[str, Any] = {"campaign_id": campaign_id}
-    if entity_type:
-        filters.append("e.type = $entity_type")
-        params["entity_type"] = entity_type
-    if name:
-        filters.append("e.name = $name")
-        params["name"] = name
-
-    where_clause = " AND ".join(filters)
-    query = (
-        "MATCH (e:Entity)-[:IN_CAMPAIGN]->(:Campaign {campaign_id: $campaign_id}) "
-        f"{('WHERE ' + where_clause) if where_clause else ''} "
-        "RETURN e"
-    )
-    with get_session() as session:
-        result = session.run(query, params)
-        return [node_to_dict(record["e"], ["properties", "metadata"]) for record in result]
-
-
-def get_entity(campaign_id: str, entity_id: str) -> Optional[Dict[str, Any]]:
-    query = (
-        "MATCH (e:Entity {entity_id: $entity_id})-[:IN_CAMPAIGN]->"
-        "(:Campaign {campaign_id: $campaign_id}) "
-        "RETURN e"
-    )
-    with get_session() as session:
-        result = session.run(query, {"campaign_id": campaign_id, "entity_id": entity_id})
-        record = result.single()
-    return node_to_dict(record["e"], ["properties", "metadata"]) if record else None
-
-def get_entity_by_name(
+    """按名称排序；after / limit 用于 keyset 分页"""
+    return await get_graph_store().list_entities(campaign_id, entity_type, name, after, limit)
+
+
+async def get_entity(campaign_id: str, entity_id: str) -> Optional[Dict[str, Any]]:
+    return await get_graph_store().get_entity(campaign_id, entity_id)
+
+
+async def get_entity_by_name(
     campaign_id: str,
     name: str,
     entity_type: Optional[str] = None,
 ) -> Optional[Dict[str, Any]]:
-    filters = ["e.name = $name"]
-    params: Dict[str, Any] = {"campaign_id": campaign_id, "name": name}
-    if entity_type:
-        filters.append("e.type = $entity_type")
-        params["entity_type"] = entity_type
-
-    where_clause = " AND ".join(filters)
-    query = (
-        "MATCH (e:Entity)-[:IN_CAMPAIGN]->(:Campaign {campaign_id: $campaign_id}) "
-        f"WHERE {where_clause} "
-        "RETURN e LIMIT 1"
-    )
-    with get_session() as session:
-        result = session.run(query, params)
-        record = result.single()
-    return node_to_dict(record["e"], ["properties", "metadata"]) if record else None
-
-def update_entity(
+    return await get_graph_store().get_entity_by_name(campaign_id, name, entity_type)
+
+
+async def update_entity(
     campaign_id: str,
     entity_id: str,
     updates: Dict[str, Any],
 ) -> Optional[Dict[str, Any]]:
-    updates["updated_at"] = datetime.utcnow()
-    if "properties" in updates:
-        updates["properties"] = serialize_map(updates["properties"])
-    if "metadata" in updates:
-        updates["metadata"] = serialize_map(updates["metadata"])
-    query = (
-        "MATCH (e:Entity {entity_id: $entity_id})-[:IN_CAMPAIGN]->"
-        "(:Campaign {campaign_id: $campaign_id}) "
-        "SET e += $updates "
-        "RETURN e"
-    )
-    with get_session() as session:
-        result = session.run(
-            query,
-            {
-                "campaign_id": campaign_id,
-                "entity_id": entity_id,
-                "updates": updates,
-            },
-        )
-        record = result.single()
-    return node_to_dict(record["e"], ["properties", "metadata"]) if record else None
-
-def delete_entity(campaign_id: str, entity_id: str) -> bool:
-    query = (
-        "MATCH (e:Entity {entity_id: $entity_id})-[:IN_CAMPAIGN]->"
-        "(:Campaign {campaign_id: $campaign_id}) "
-        "DETACH DELETE e "
-        "RETURN COUNT(e) AS deleted"
-    )
-    with get_session() as session:
-        result = session.run(query, {"campaign_id": campaign_id, "entity_id": entity_id})
-        record = result.single()
-    return record["deleted"] > 0
+    entity = await get_graph_store().update_entity(campaign_id, entity_id, updates)
+    if not entity:
+        return None
+    graph_cache.entity_upserted(campaign_id, entity_id, entity.get("name"), entity.get("type"))
+
+    def write_rows() -> None:
+        if updates.get("name"):
+            # 名称目录从 SQLite 预热，改名须同步到 SQLite
+            rename_entity(campaign_id, entity_id, updates["name"])
+        record_changes(campaign_id, [entity_change({**entity, "entity_id": entity_id})])
+
+    await run_sqlite(write_rows)
+    if updates.get("name"):
+        entity_directory.entity_upserted(campaign_id, entity_id, entity.get("name"))
+    return entity
+
+
+async def delete_entity(campaign_id: str, entity_id: str) -> bool:
+    store = get_graph_store()
+    # 图存储删除实体时连带删除它的关系；先取出关系 ID，一并记入变更日志
+    relationship_ids = {row["relationship_id"] for row in await store.get_adjacency(campaign_id, [entity_id])}
+    if await store.delete_entity(campaign_id, entity_id):
+        graph_cache.entity_deleted(campaign_id, entity_id)
+        entity_directory.entity_deleted(campaign_id, entity_id)
+
+        def delete_rows() -> None:
+            delete_entity_rows(campaign_id, entity_id)
+            delete_embedding("entity", entity_id)
+            record_changes(campaign_id, [
+                *(deleted_change("relationship", relationship_id) for relationship_id in sorted(relationship_ids)),
+                deleted_change("entity", entity_id),
+            ])
+
+        await run_sqlite(delete_rows)
+        return True
+    return False
+
+
+async def resolve_entity_names(campaign_id: str, names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """一次查询解析一组名称，返回 {name: {entity_id, type}}"""
+    return await get_graph_store().resolve_entity_names(campaign_id, names)
@@ -0,0 +1,241 @@
+"""
+Graph store interface for tarven-note.
+图数据（战役、实体节点、关系）的存储后端，由 settings.graph_backend 选择：
+
+- neo4j：原有实现（server/repositories/neo4j_graph.py）
+- sqlite：嵌入式实现（server/repositories/sqlite_graph.py），邻接表存放在同一个
+  SQLite 数据库中，遍历在进程内完成，不需要单独的 Neo4j 进程
+
+campaigns / entities / relationships / queries 等仓储模块只通过 get_graph_store()
+访问图数据，并负责 graph_cache 的写入通知；两个后端返回的字典结构一致。
+"""
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Iterable, List, Literal, Optional, Tuple
+
+from server.core.config import settings
+from server.repositories.utils import deserialize_map
+
+SampleMode = Literal["recent", "weight"]
+# entity_id → (实际度数, 采样后的邻接项)
+# 邻接项：{relationship_id, from_id, to_id, type, properties, other_id, other_name, other_type}
+Adjacency = Dict[str, Tuple[int, List[Dict[str, Any]]]]
+# merge_graph 的规划函数：已存在的 {name: {entity_id, type}} → (实体行, 关系行)
+GraphPlan = Callable[[Dict[str, Dict[str, Any]]], Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]]
+
+
+class IncompleteWrite(Exception):
+    """批量写入中有关系的端点不存在，整个事务已回滚"""
+
+
+def _weight_key(edge: Dict[str, Any]) -> Tuple[int, float]:
+    """按关系属性中的数值 weight 降序，无 weight 的排在最后"""
+    weight = deserialize_map(edge["properties"]).get("weight")
+    if isinstance(weight, (int, float)) and not isinstance(weight, bool):
+        return 0, -weight
+    return 1, 0.0
+
+
+def sample_edges(edges: List[Dict[str, Any]], degree_cap: int, sample: SampleMode) -> List[Dict[str, Any]]:
+    """edges 已按最近更新排序；weight 模式下稳定重排，同权重仍按最近更新"""
+    if sample == "weight":
+        edges = sorted(edges, key=_weight_key)
+    return edges[:degree_cap]
+
+
+class GraphStore:
+    """图存储后端接口；方法语义以 Neo4j 实现为准"""
+
+    name = ""
+
+    # 生命周期
+
+    async def apply_schema(self) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        raise NotImplementedError
+
+    async def ping(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def schema_status(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @asynccontextmanager
+    async def request_scope(self):
+        """一个 HTTP 请求的作用域（Neo4j 用于复用会话），默认无操作"""
+        yield
+
+    # 战役
+
+    async def create_campaign(
+        self,
+        name: str,
+        system: str,
+        description: Optional[str],
+        metadata: Dict[str, Any],
+        campaign_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def list_campaigns(self) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def get_campaign(self, campaign_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def update_campaign(self, campaign_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def delete_campaign(self, campaign_id: str) -> bool:
+        """删除战役及其全部实体和关系"""
+        raise NotImplementedError
+
+    async def ensure_campaign(self, campaign_id: str) -> Dict[str, Any]:
+        """不存在时以 campaign_id 为名称创建；并发调用只创建一个"""
+        raise NotImplementedError
+
+    async def delete_campaign_relationships(self, campaign_id: str, limit: int, batch_size: int) -> int:
+        """分批删除战役内至多 limit 条关系，每 batch_size 条提交一次；返回删除数量"""
+        raise NotImplementedError
+
+    async def delete_campaign_entities(self, campaign_id: str, limit: int, batch_size: int) -> int:
+        """分批删除战役内至多 limit 个实体（连同剩余关系），每 batch_size 个提交一次；返回删除数量"""
+        raise NotImplementedError
+
+    # 实体
+
+    async def create_entity(self, campaign_id: str, entity_type: str, name: str) -> Dict[str, Any]:
+        """按 (campaign_id, name) 创建或更新实体；仅当现有类型为 Unknown 时改写类型"""
+        raise NotImplementedError
+
+    async def list_entities(
+        self,
+        campaign_id: str,
+        entity_type: Optional[str] = None,
+        name: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """按 name 升序；after 为上一页最后一个名称（keyset 分页），limit 为 None 时不限"""
+        raise NotImplementedError
+
+    async def get_entity(self, campaign_id: str, entity_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def get_entity_by_name(
+        self,
+        campaign_id: str,
+        name: str,
+        entity_type: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def update_entity(self, campaign_id: str, entity_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """updates 可含 name / properties / metadata"""
+        raise NotImplementedError
+
+    async def delete_entity(self, campaign_id: str, entity_id: str) -> bool:
+        """删除实体及其全部关系"""
+        raise NotImplementedError
+
+    async def resolve_entity_names(self, campaign_id: str, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """返回 {name: {entity_id, type}}，不存在的名称不出现在结果中"""
+        raise NotImplementedError
+
+    # 关系
+
+    async def prepare_relationship_types(self, rel_types: Iterable[str]) -> None:
+        """写入新的关系类型（normalize_label 之后）前调用，须在写事务之外"""
+
+    async def create_relationship(
+        self,
+        campaign_id: str,
+        from_entity_id: str,
+        to_entity_id: str,
+        relationship_type: str,
+        properties: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        """同一对端点、同一类型只有一条关系（重复创建时更新）；端点不在战役中时返回 None"""
+        raise NotImplementedError
+
+    async def list_relationships(
+        self,
+        campaign_id: str,
+        from_entity_id: Optional[str] = None,
+        to_entity_id: Optional[str] = None,
+        relationship_type: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        不含结构性关系，按 (from_entity_id, relationship_id) 升序；
+        after 为上一页最后一条的该二元组（keyset 分页），limit 为 None 时不限
+        """
+        raise NotImplementedError
+
+    async def delete_relationship(self, campaign_id: str, relationship_id: str) -> bool:
+        raise NotImplementedError
+
+    # 批量写入
+
+    async def merge_graph(self, campaign_id: str, names: List[str], plan: GraphPlan) -> List[Dict[str, Any]]:
+        """
+        在一个写事务中：解析 names → plan(已存在的实体) → 写入实体行和关系行。
+        实体行 {name, entity_id, type, set_type}，关系行 {from_id, to_id, type, properties}；
+        返回写入的关系 [{relationship_id, from_id, to_id, type, properties}]。
+        有关系未能写入时抛出 IncompleteWrite 并回滚；plan 可能被执行多次
+        """
+        raise NotImplementedError
+
+    # 遍历
+
+    async def get_adjacency(self, campaign_id: str, entity_ids: List[str]) -> List[Dict[str, Any]]:
+        """一批实体的全部邻接边，每行 {entity_id, relationship_id, type, other_id, other_name, other_type}"""
+        raise NotImplementedError
+
+    async def get_sampled_adjacency(
+        self,
+        campaign_id: str,
+        entity_ids: List[str],
+        degree_cap: int,
+        sample: SampleMode = "recent",
+    ) -> Adjacency:
+        """每个实体最多 degree_cap 条邻接边，按最近更新或 weight 采样（见 sample_edges）"""
+        raise NotImplementedError
+
+    async def get_neighbours(self, campaign_id: str, entity_ids: List[str], limit: int = 20) -> List[Dict[str, Any]]:
+        """一跳邻居，每行 {entity_id, name, type, links, via}，按 links 降序、name 升序"""
+        raise NotImplementedError
+
+    async def load_campaign_graph(self, campaign_id: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        整个战役的 (节点, 边)，供 graph_cache 加载；
+        节点 {entity_id, name, type}，边 {relationship_id, from_id, to_id, type, properties}，边按 updated_at 升序
+        """
+        raise NotImplementedError
+
+
+_store: Optional[GraphStore] = None
+
+
+def get_graph_store() -> GraphStore:
+    """按 settings.graph_backend 创建（并缓存）图存储后端；后端模块按需导入"""
+    global _store
+    if _store is None:
+        if settings.graph_backend == "neo4j":
+            from server.repositories.neo4j_graph import Neo4jGraphStore
+            _store = Neo4jGraphStore()
+        elif settings.graph_backend == "sqlite":
+            from server.repositories.sqlite_graph import SqliteGraphStore
+            _store = SqliteGraphStore()
+        else:
+            raise ValueError(f"Unknown graph_backend: {settings.graph_backend}")
+    return _store
+
+
+async def close_graph_store() -> None:
+    global _store
+    if _store is not None:
+        store, _store = _store, None
+        await store.close()
@@ -0,0 +1,700 @@
+"""
+Neo4j graph store for tarven-note.
+GraphStore 的 Neo4j 实现：实体为 (:Entity) 节点并以 IN_CAMPAIGN 连接到 (:Campaign)，
+关系以规范化后的类型作为关系标签。查询以 campaign_id / entity_id 上的索引和约束为入口，
+关系类型索引见 server/db/schema.py。
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from uuid import uuid4
+
+from server.db import neo4j as neo4j_db
+from server.db.neo4j import execute_read, execute_write, read_all, read_one, write_one
+from server.db.schema import (
+    STRUCTURAL_RELATIONSHIP_TYPES,
+    apply_schema,
+    ensure_relationship_indexes,
+    get_schema_status,
+    known_relationship_types,
+    refresh_relationship_types,
+)
+from server.repositories.graph_store import (
+    Adjacency,
+    GraphPlan,
+    GraphStore,
+    IncompleteWrite,
+    SampleMode,
+    sample_edges,
+)
+from server.repositories.utils import node_to_dict, normalize_label, relationship_to_dict, serialize_map
+
+
+async def _get_entity_by_name_tx(
+    tx,
+    campaign_id: str,
+    name: str,
+    entity_type: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    filters = []
+    params: Dict[str, Any] = {"campaign_id": campaign_id, "name": name}
+    if entity_type:
+        filters.append("e.type = $entity_type")
+        params["entity_type"] = entity_type
+
+    where_clause = " AND ".join(filters)
+    query = (
+        "MATCH (e:Entity {campaign_id: $campaign_id, name: $name}) "
+        f"{('WHERE ' + where_clause) if where_clause else ''} "
+        "RETURN e LIMIT 1"
+    )
+    result = await tx.run(query, params)
+    record = await result.single()
+    return node_to_dict(record["e"], ["properties", "metadata"]) if record else None
+
+
+async def _create_entity_tx(
+    tx,
+    campaign_id: str,
+    entity_type: str,
+    name: str,
+) -> Dict[str, Any]:
+    created_at = datetime.utcnow()
+
+    # Check if entity already exists
+    existing = await _get_entity_by_name_tx(tx, campaign_id, name)
+
+    if existing:
+        entity_id = existing["entity_id"]
+        is_new = False
+        should_update_type = existing.get("type") == "Unknown"
+    else:
+        entity_id = str(uuid4())
+        is_new = True
+        should_update_type = True
+
+    # Build query - Neo4j只存基本信息，属性存SQLite
+    query = (
+        "MATCH (c:Campaign {campaign_id: $campaign_id}) "
+        "MERGE (e:Entity { campaign_id: $campaign_id, name: $name }) "
+        "SET "
+        "e.entity_id = $entity_id, "
+        "e.updated_at = $updated_at"
+    )
+
+    # Update type if it's a new entity or if upgrading from "Unknown"
+    if should_update_type:
+        query += ", e.type = $entity_type "
+
+    if is_new:
+        query += ", e.created_at = $created_at "
+
+    query += " MERGE (e)-[:IN_CAMPAIGN]->(c) RETURN e"
+
+    result = await tx.run(
+        query,
+        {
+            "campaign_id": campaign_id,
+            "entity_id": entity_id,
+            "entity_type": entity_type,
+            "name": name,
+            "created_at": created_at,
+            "updated_at": created_at,
+        },
+    )
+    record = await result.single()
+    return node_to_dict(record["e"], [])
+
+
+async def _delete_campaign_tx(tx, campaign_id: str) -> int:
+    # 先删除所有关联的实体及其关系
+    result = await tx.run(
+        """
+        MATCH (e:Entity {campaign_id: $campaign_id})
+        DETACH DELETE e
+        """,
+        {"campaign_id": campaign_id},
+    )
+    await result.consume()
+    # 再删除战役节点
+    result = await tx.run(
+        """
+        MATCH (c:Campaign {campaign_id: $campaign_id})
+        DETACH DELETE c
+        RETURN COUNT(c) AS deleted
+        """,
+        {"campaign_id": campaign_id},
+    )
+    record = await result.single()
+    return record["deleted"]
+
+
+# 分批删除：CALL { } IN TRANSACTIONS 每 $batch_size 行提交一个内部事务，
+# 只能在自动提交事务中执行，不经过托管事务（也不受重试影响，重复执行只会删除剩余部分）
+DELETE_CAMPAIGN_RELATIONSHIPS_CYPHER = """
+MATCH (:Entity {campaign_id: $campaign_id})-[r]->(:Entity)
+WITH r LIMIT $limit
+CALL { WITH r DELETE r } IN TRANSACTIONS OF $batch_size ROWS
+RETURN count(*) AS deleted
+"""
+
+DELETE_CAMPAIGN_ENTITIES_CYPHER = """
+MATCH (e:Entity {campaign_id: $campaign_id})
+WITH e LIMIT $limit
+CALL { WITH e DETACH DELETE e } IN TRANSACTIONS OF $batch_size ROWS
+RETURN count(*) AS deleted
+"""
+
+
+async def _delete_in_transactions(query: str, campaign_id: str, limit: int, batch_size: int) -> int:
+    async with neo4j_db.get_session() as session:
+        result = await session.run(
+            query,
+            {"campaign_id": campaign_id, "limit": limit, "batch_size": batch_size},
+        )
+        record = await result.single()
+    return record["deleted"] if record else 0
+
+
+async def resolve_entity_names(tx, campaign_id: str, names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """一次查询解析一组名称，返回 {name: {entity_id, type}}；需在事务中调用"""
+    if not names:
+        return {}
+    result = await tx.run(
+        "UNWIND $names AS name "
+        "MATCH (e:Entity {campaign_id: $campaign_id, name: name}) "
+        "RETURN e.name AS name, e.entity_id AS entity_id, e.type AS type",
+        {"campaign_id": campaign_id, "names": names},
+    )
+    return {
+        record["name"]: {"entity_id": record["entity_id"], "type": record["type"]}
+        async for record in result
+    }
+
+
+async def merge_entities(tx, campaign_id: str, rows: List[Dict[str, Any]]) -> int:
+    """
+    UNWIND 批量 MERGE 实体节点，与逐条 create_entity 的写入一致；需在事务中调用
+    rows: [{name, entity_id, type, set_type}]，set_type 为 False 时保留现有类型
+    """
+    if not rows:
+        return 0
+    now = datetime.utcnow()
+    result = await tx.run(
+        "MATCH (c:Campaign {campaign_id: $campaign_id}) "
+        "UNWIND $rows AS row "
+        "MERGE (e:Entity {campaign_id: $campaign_id, name: row.name}) "
+        "ON CREATE SET e.created_at = $now "
+        "SET e.entity_id = row.entity_id, "
+        "e.updated_at = $now, "
+        "e.type = CASE WHEN row.set_type THEN row.type ELSE e.type END "
+        "MERGE (e)-[:IN_CAMPAIGN]->(c) "
+        "RETURN count(e) AS merged",
+        {"campaign_id": campaign_id, "rows": rows, "now": now},
+    )
+    record = await result.single()
+    return record["merged"] if record else 0
+
+
+async def merge_relationships(tx, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    批量 MERGE 关系：按关系类型分组，每种类型一次 UNWIND；需在事务中调用
+    rows: [{from_id, to_id, type, properties}]，端点须已在同一战役中
+    返回写入的关系 [{relationship_id, from_id, to_id, type, properties}]，
+    条数与逐条 create_relationship 的计数一致
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        rel_type = normalize_label(row["type"], prefix="REL", upper=True)
+        groups.setdefault(rel_type, []).append({
+            "from_id": row["from_id"],
+            "to_id": row["to_id"],
+            "type": row["type"],
+            "properties": serialize_map(row["properties"]),
+            "relationship_id": str(uuid4()),
+        })
+
+    now = datetime.utcnow()
+    merged: List[Dict[str, Any]] = []
+    for rel_type, group in groups.items():
+        result = await tx.run(
+            "UNWIND $rows AS row "
+            "MATCH (from:Entity {entity_id: row.from_id}) "
+            "MATCH (to:Entity {entity_id: row.to_id}) "
+            f"MERGE (from)-[r:{rel_type}]->(to) "
+            "ON CREATE SET "
+            "r.relationship_id = row.relationship_id, "
+            "r.created_at = $now "
+            "SET "
+            "r.type = row.type, "
+            "r.properties = row.properties, "
+            "r.updated_at = $now "
+            "RETURN r.relationship_id AS relationship_id, row.from_id AS from_id, "
+            "row.to_id AS to_id, r.type AS type, r.properties AS properties",
+            {"rows": group, "now": now},
+        )
+        merged.extend([record.data() async for record in result])
+    return merged
+
+
+async def _merge_graph_tx(tx, campaign_id: str, names: List[str], plan: GraphPlan) -> List[Dict[str, Any]]:
+    existing = await resolve_entity_names(tx, campaign_id, names)
+    entity_rows, relationship_rows = plan(existing)
+    await merge_entities(tx, campaign_id, entity_rows)
+    merged = await merge_relationships(tx, relationship_rows)
+    if len(merged) < len(relationship_rows):
+        raise IncompleteWrite(f"Only {len(merged)} of {len(relationship_rows)} relationships were written")
+    return merged
+
+
+class Neo4jGraphStore(GraphStore):
+    name = "neo4j"
+
+    async def apply_schema(self) -> None:
+        await apply_schema()
+
+    async def close(self) -> None:
+        await neo4j_db.close_driver()
+
+    async def ping(self) -> Dict[str, Any]:
+        return await neo4j_db.ping()
+
+    async def schema_status(self) -> Dict[str, Any]:
+        return await get_schema_status()
+
+    def request_scope(self):
+        # 一个请求内的 Neo4j 事务共用一个会话
+        return neo4j_db.request_scope()
+
+    # 战役
+
+    async def create_campaign(
+        self,
+        name: str,
+        system: str,
+        description: Optional[str],
+        metadata: Dict[str, Any],
+        campaign_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        # 如果没有传入 campaign_id，则自动生成
+        if not campaign_id:
+            campaign_id = str(uuid4())
+        created_at = datetime.utcnow()
+        metadata_payload = serialize_map(metadata)
+        record = await write_one(
+            """
+            CREATE (c:Campaign {
+              campaign_id: $campaign_id,
+              name: $name,
+              system: $system,
+              description: $description,
+              status: $status,
+              metadata: $metadata,
+              created_at: $created_at,
+              updated_at: $updated_at
+            })
+            RETURN c
+            """,
+            {
+                "campaign_id": campaign_id,
+                "name": name,
+                "system": system,
+                "description": description,
+                "status": "active",
+                "metadata": metadata_payload,
+                "created_at": created_at,
+                "updated_at": created_at,
+            },
+        )
+        return node_to_dict(record["c"], ["metadata"]) if record else None
+
+    async def list_campaigns(self) -> List[Dict[str, Any]]:
+        records = await read_all(
+            """
+            MATCH (c:Campaign)
+            RETURN c
+            ORDER BY c.created_at DESC
+            """
+        )
+        return [node_to_dict(record["c"], ["metadata"]) for record in records]
+
+    async def get_campaign(self, campaign_id: str) -> Optional[Dict[str, Any]]:
+        record = await read_one(
+            """
+            MATCH (c:Campaign {campaign_id: $campaign_id})
+            RETURN c
+            """,
+            {"campaign_id": campaign_id},
+        )
+        return node_to_dict(record["c"], ["metadata"]) if record else None
+
+    async def update_campaign(self, campaign_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        updates["updated_at"] = datetime.utcnow()
+        if "metadata" in updates:
+            updates["metadata"] = serialize_map(updates["metadata"])
+        record = await write_one(
+            """
+            MATCH (c:Campaign {campaign_id: $campaign_id})
+            SET c += $updates
+            RETURN c
+            """,
+            {"campaign_id": campaign_id, "updates": updates},
+        )
+        return node_to_dict(record["c"], ["metadata"]) if record else None
+
+    async def delete_campaign(self, campaign_id: str) -> bool:
+        deleted = await execute_write(_delete_campaign_tx, campaign_id)
+        return deleted > 0
+
+    async def delete_campaign_relationships(self, campaign_id: str, limit: int, batch_size: int) -> int:
+        return await _delete_in_transactions(DELETE_CAMPAIGN_RELATIONSHIPS_CYPHER, campaign_id, limit, batch_size)
+
+    async def delete_campaign_entities(self, campaign_id: str, limit: int, batch_size: int) -> int:
+        return await _delete_in_transactions(DELETE_CAMPAIGN_ENTITIES_CYPHER, campaign_id, limit, batch_size)
+
+    async def ensure_campaign(self, campaign_id: str) -> Dict[str, Any]:
+        # MERGE 使并发请求只创建一个节点
+        created_at = datetime.utcnow()
+        record = await write_one(
+            """
+            MERGE (c:Campaign {campaign_id: $campaign_id})
+            ON CREATE SET
+              c.name = $name,
+              c.system = 'auto',
+              c.description = 'Auto-created campaign',
+              c.status = 'active',
+              c.metadata = '{}',
+              c.created_at = $created_at,
+              c.updated_at = $updated_at
+            RETURN c
+            """,
+            {
+                "campaign_id": campaign_id,
+                "name": campaign_id,
+                "created_at": created_at,
+                "updated_at": created_at,
+            },
+        )
+        return node_to_dict(record["c"], ["metadata"]) if record else None
+
+    # 实体
+
+    async def create_entity(self, campaign_id: str, entity_type: str, name: str) -> Dict[str, Any]:
+        # 查重与写入在同一事务内
+        return await execute_write(_create_entity_tx, campaign_id, entity_type, name)
+
+    async def list_entities(
+        self,
+        campaign_id: str,
+        entity_type: Optional[str] = None,
+        name: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        filters = []
+        params: Dict[str, Any] = {"campaign_id": campaign_id}
+        # 指定名称时命中 (campaign_id, name) 唯一约束；分页时对 name 的范围条件
+        # 同样走该约束的复合索引，并由索引提供 ORDER BY e.name 的顺序
+        anchor = "{campaign_id: $campaign_id, name: $name}" if name else "{campaign_id: $campaign_id}"
+        if name:
+            params["name"] = name
+        if after is not None or limit is not None:
+            filters.append("e.name > $after")
+            params["after"] = after or ""
+        if entity_type:
+            filters.append("e.type = $entity_type")
+            params["entity_type"] = entity_type
+
+        where_clause = " AND ".join(filters)
+        query = (
+            f"MATCH (e:Entity {anchor}) "
+            f"{('WHERE ' + where_clause) if where_clause else ''} "
+            "RETURN e ORDER BY e.name"
+        )
+        if limit is not None:
+            query += " LIMIT $limit"
+            params["limit"] = limit
+        records = await read_all(query, params)
+        return [node_to_dict(record["e"], ["properties", "metadata"]) for record in records]
+
+    async def get_entity(self, campaign_id: str, entity_id: str) -> Optional[Dict[str, Any]]:
+        query = (
+            "MATCH (e:Entity {entity_id: $entity_id}) "
+            "WHERE e.campaign_id = $campaign_id "
+            "RETURN e"
+        )
+        record = await read_one(query, {"campaign_id": campaign_id, "entity_id": entity_id})
+        return node_to_dict(record["e"], ["properties", "metadata"]) if record else None
+
+    async def get_entity_by_name(
+        self,
+        campaign_id: str,
+        name: str,
+        entity_type: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        return await execute_read(_get_entity_by_name_tx, campaign_id, name, entity_type)
+
+    async def update_entity(self, campaign_id: str, entity_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        updates["updated_at"] = datetime.utcnow()
+        if "properties" in updates:
+            updates["properties"] = serialize_map(updates["properties"])
+        if "metadata" in updates:
+            updates["metadata"] = serialize_map(updates["metadata"])
+        query = (
+            "MATCH (e:Entity {entity_id: $entity_id}) "
+            "WHERE e.campaign_id = $campaign_id "
+            "SET e += $updates "
+            "RETURN e"
+        )
+        record = await write_one(
+            query,
+            {
+                "campaign_id": campaign_id,
+                "entity_id": entity_id,
+                "updates": updates,
+            },
+        )
+        return node_to_dict(record["e"], ["properties", "metadata"]) if record else None
+
+    async def delete_entity(self, campaign_id: str, entity_id: str) -> bool:
+        query = (
+            "MATCH (e:Entity {entity_id: $entity_id}) "
+            "WHERE e.campaign_id = $campaign_id "
+            "DETACH DELETE e "
+            "RETURN COUNT(e) AS deleted"
+        )
+        record = await write_one(query, {"campaign_id": campaign_id, "entity_id": entity_id})
+        return record["deleted"] > 0
+
+    async def resolve_entity_names(self, campaign_id: str, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        return await execute_read(resolve_entity_names, campaign_id, names)
+
+    # 关系
+
+    async def prepare_relationship_types(self, rel_types: Iterable[str]) -> None:
+        # 新关系类型的索引须在写事务之外创建
+        await ensure_relationship_indexes(rel_types)
+
+    async def create_relationship(
+        self,
+        campaign_id: str,
+        from_entity_id: str,
+        to_entity_id: str,
+        relationship_type: str,
+        properties: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        relationship_id = str(uuid4())
+        rel_type = normalize_label(relationship_type, prefix="REL", upper=True)
+        created_at = datetime.utcnow()
+        await ensure_relationship_indexes([rel_type])
+        query = (
+            "MATCH (from:Entity {entity_id: $from_entity_id}) "
+            "WHERE from.campaign_id = $campaign_id "
+            "MATCH (to:Entity {entity_id: $to_entity_id}) "
+            "WHERE to.campaign_id = $campaign_id "
+            f"MERGE (from)-[r:{rel_type}]->(to) "
+            "ON CREATE SET "
+            "r.relationship_id = $relationship_id, "
+            "r.type = $relationship_type, "
+            "r.properties = $properties, "
+            "r.created_at = $created_at, "
+            "r.updated_at = $created_at "
+            "ON MATCH SET "
+            "r.type = $relationship_type, "
+            "r.properties = $properties, "
+            "r.updated_at = $created_at "
+            "RETURN r"
+        )
+        record = await write_one(
+            query,
+            {
+                "campaign_id": campaign_id,
+                "from_entity_id": from_entity_id,
+                "to_entity_id": to_entity_id,
+                "relationship_id": relationship_id,
+                "relationship_type": relationship_type,
+                "properties": serialize_map(properties),
+                "created_at": created_at,
+            },
+        )
+        if not record:
+            return None
+        return {
+            **relationship_to_dict(record["r"], ["properties"]),
+            "from_entity_id": from_entity_id,
+            "to_entity_id": to_entity_id,
+        }
+
+    async def list_relationships(
+        self,
+        campaign_id: str,
+        from_entity_id: Optional[str] = None,
+        to_entity_id: Optional[str] = None,
+        relationship_type: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        label = normalize_label(relationship_type, prefix="REL", upper=True) if relationship_type else None
+        if label in STRUCTURAL_RELATIONSHIP_TYPES:
+            return []
+        params: Dict[str, Any] = {"campaign_id": campaign_id}
+        # 指定类型时限定关系标签（可走该类型的 type 索引），否则在模式中排除结构性关系
+        rel = f"r:{label}" if label else "r:" + "&".join(f"!{t}" for t in sorted(STRUCTURAL_RELATIONSHIP_TYPES))
+        # 从带索引的端点出发：指定端点时走 entity_id 唯一约束，
+        # 否则走 (campaign_id, entity_id) 索引，按 entity_id 顺序读取起点，分页只读到本页为止
+        if from_entity_id:
+            match_clause = f"MATCH (from:Entity {{entity_id: $from_entity_id}})-[{rel}]->(to:Entity)"
+            params["from_entity_id"] = from_entity_id
+        elif to_entity_id:
+            match_clause = f"MATCH (from:Entity)-[{rel}]->(to:Entity {{entity_id: $to_entity_id}})"
+        else:
+            match_clause = f"MATCH (from:Entity)-[{rel}]->(to:Entity)"
+        filters = ["from.campaign_id = $campaign_id", "to.campaign_id = $campaign_id"]
+        if to_entity_id:
+            params["to_entity_id"] = to_entity_id
+            if from_entity_id:
+                filters.append("to.entity_id = $to_entity_id")
+        if relationship_type:
+            filters.append("r.type = $relationship_type")
+            params["relationship_type"] = relationship_type
+        if after is not None:
+            # 第一个条件是可走索引的范围，第二个条件精确到 relationship_id
+            filters.append("from.entity_id >= $after_from")
+            filters.append("(from.entity_id > $after_from OR r.relationship_id > $after_id)")
+            params["after_from"], params["after_id"] = after
+
+        where_clause = " AND ".join(filters)
+        query = (
+            f"{match_clause} "
+            f"WHERE {where_clause} "
+            "RETURN r, from.entity_id AS from_entity_id, to.entity_id AS to_entity_id "
+            "ORDER BY from_entity_id, r.relationship_id"
+        )
+        if limit is not None:
+            query += " LIMIT $limit"
+            params["limit"] = limit
+        records = await read_all(query, params)
+        return [
+            {
+                **relationship_to_dict(record["r"], ["properties"]),
+                "from_entity_id": record["from_entity_id"],
+                "to_entity_id": record["to_entity_id"],
+            }
+            for record in records
+        ]
+
+    async def _delete_relationship(self, campaign_id: str, relationship_id: str, rel_types: List[str]) -> bool:
+        if not rel_types:
+            return False
+        # 每种类型一个分支，各自走 relationship_id 索引
+        branches = " UNION ".join(
+            f"MATCH (from:Entity)-[r:{rel_type} {{relationship_id: $relationship_id}}]->(to:Entity) "
+            "WHERE from.campaign_id = $campaign_id AND to.campaign_id = $campaign_id "
+            "RETURN r"
+            for rel_type in rel_types
+        )
+        query = (
+            f"CALL {{ {branches} }} "
+            "DELETE r "
+            "RETURN COUNT(r) AS deleted"
+        )
+        record = await write_one(
+            query,
+            {"campaign_id": campaign_id, "relationship_id": relationship_id},
+        )
+        return record["deleted"] > 0
+
+    async def delete_relationship(self, campaign_id: str, relationship_id: str) -> bool:
+        deleted = await self._delete_relationship(campaign_id, relationship_id, known_relationship_types())
+        # 未命中时可能是其他进程写入了新的关系类型
+        if not deleted and await refresh_relationship_types():
+            deleted = await self._delete_relationship(campaign_id, relationship_id, known_relationship_types())
+        return deleted
+
+    # 批量写入
+
+    async def merge_graph(self, campaign_id: str, names: List[str], plan: GraphPlan) -> List[Dict[str, Any]]:
+        return await execute_write(_merge_graph_tx, campaign_id, names, plan)
+
+    # 遍历
+
+    async def get_adjacency(self, campaign_id: str, entity_ids: List[str]) -> List[Dict[str, Any]]:
+        if not entity_ids:
+            return []
+        records = await read_all(
+            "UNWIND $entity_ids AS entity_id "
+            "MATCH (n:Entity {entity_id: entity_id})-[r]-(m:Entity) "
+            "WHERE n.campaign_id = $campaign_id AND m.campaign_id = $campaign_id "
+            "AND r.relationship_id IS NOT NULL "
+            "RETURN entity_id, r.relationship_id AS relationship_id, r.type AS type, "
+            "m.entity_id AS other_id, m.name AS other_name, m.type AS other_type",
+            {"campaign_id": campaign_id, "entity_ids": entity_ids},
+        )
+        return [record.data() for record in records]
+
+    async def get_sampled_adjacency(
+        self,
+        campaign_id: str,
+        entity_ids: List[str],
+        degree_cap: int,
+        sample: SampleMode = "recent",
+    ) -> Adjacency:
+        if not entity_ids:
+            return {}
+        # weight 存在序列化的 properties 中，只能取回全部邻接后在 Python 中排序
+        limit = degree_cap if sample == "recent" else None
+        records = await read_all(
+            "UNWIND $entity_ids AS entity_id "
+            "MATCH (n:Entity {entity_id: entity_id})-[r]-(m:Entity) "
+            "WHERE n.campaign_id = $campaign_id AND m.campaign_id = $campaign_id "
+            "AND r.relationship_id IS NOT NULL "
+            "WITH entity_id, r, m ORDER BY r.updated_at DESC, r.relationship_id "
+            "WITH entity_id, count(r) AS degree, collect({"
+            "relationship_id: r.relationship_id, from_id: startNode(r).entity_id, "
+            "to_id: endNode(r).entity_id, type: r.type, properties: r.properties, "
+            "other_id: m.entity_id, other_name: m.name, other_type: m.type"
+            "}) AS edges "
+            "RETURN entity_id, degree, "
+            "CASE WHEN $limit IS NULL THEN edges ELSE edges[..$limit] END AS edges",
+            {"campaign_id": campaign_id, "entity_ids": entity_ids, "limit": limit},
+        )
+        return {
+            record["entity_id"]: (record["degree"], sample_edges(record["edges"], degree_cap, sample))
+            for record in records
+        }
+
+    async def get_neighbours(self, campaign_id: str, entity_ids: List[str], limit: int = 20) -> List[Dict[str, Any]]:
+        if not entity_ids:
+            return []
+        query = (
+            "UNWIND $entity_ids AS seed_id "
+            "MATCH (seed:Entity {entity_id: seed_id}) "
+            "WHERE seed.campaign_id = $campaign_id "
+            "MATCH (seed)-[r:!IN_CAMPAIGN]-(n:Entity) "
+            "WHERE NOT n.entity_id IN $entity_ids "
+            "RETURN n.entity_id AS entity_id, n.name AS name, n.type AS type, "
+            "count(DISTINCT seed) AS links, collect(DISTINCT r.type) AS via "
+            "ORDER BY links DESC, name ASC "
+            "LIMIT $limit"
+        )
+        records = await read_all(
+            query,
+            {"campaign_id": campaign_id, "entity_ids": entity_ids, "limit": limit},
+        )
+        return [record.data() for record in records]
+
+    async def load_campaign_graph(self, campaign_id: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        params = {"campaign_id": campaign_id}
+        nodes = await read_all(
+            "MATCH (e:Entity {campaign_id: $campaign_id}) "
+            "RETURN e.entity_id AS entity_id, e.name AS name, e.type AS type",
+            params,
+        )
+        edges = await read_all(
+            "MATCH (from:Entity {campaign_id: $campaign_id})-[r]->(to:Entity) "
+            "WHERE to.campaign_id = $campaign_id AND r.relationship_id IS NOT NULL "
+            "RETURN r.relationship_id AS relationship_id, from.entity_id AS from_id, "
+            "to.entity_id AS to_id, r.type AS type, r.properties AS properties "
+            "ORDER BY r.updated_at",
+            params,
+        )
+        return [record.data() for record in nodes], [record.data() for record in edges]
@@ -1,141 +1,249 @@
+import heapq
 import logging
-from typing import Any, Dict, List, Literal, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Set
 
-from server.db.neo4j import get_session
-from server.repositories.utils import deserialize_map
+from server.core.config import settings
+from server.db import graph_cache
+from server.db.sqlite import run_sqlite
+from server.repositories.entities import get_entity, get_entity_by_name
+from server.repositories.graph_store import Adjacency, SampleMode, get_graph_store, sample_edges
+from server.repositories.utils import decode_cursor, deserialize_map, encode_cursor
 from server.repositories.sqlite_entities import get_entities_by_names
 
 logger = logging.getLogger(__name__)
 
 
-def find_paths(
+async def get_adjacency(campaign_id: str, entity_ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    一批实体的全部邻接边（不区分方向，不含 IN_CAMPAIGN），供路径搜索逐层展开；
+    每行为 {entity_id, relationship_id, type, other_id, other_name, other_type}
+    """
+    return await get_graph_store().get_adjacency(campaign_id, entity_ids)
+
+
+async def _enrich_nodes(
     campaign_id: str,
-    from_name: str,
-    to_name: str,
-    max_hops: int,
-) -> List[Dict[str, Any]]:
-    max_hops = max(1, min(max_hops, 6))
-    query = (
-        "MATCH path = (from:Entity {name: $from_name})-"
-        f"[*1..{max_hops}]-(to:Entity {{name: $to_name}}) "
-        "WHERE (from)-[:IN_CAMPAIGN]->(:Campaign {campaign_id: $campaign_id}) "
-        "AND (to)-[:IN_CAMPAIGN]->(:Campaign {campaign_id: $campaign_id}) "
-        "RETURN path, length(path) AS hops "
-        "ORDER BY hops ASC "
-        "LIMIT 5"
-    )
-    with get_session() as session:
-        result = session.run(
-            query,
+    nodes: List[Dict[str, Any]],
+    detail_level: Literal["skeleton", "summary", "full"],
+) -> None:
+    """根据 detail_level 补充属性"""
+    if detail_level == "skeleton" or not nodes:
+        return
+    node_names = [n["label"] for n in nodes]
+    sqlite_data = await run_sqlite(get_entities_by_names, campaign_id, node_names)
+    skip_keys = {"id", "entity_id", "campaign_id", "type", "name", "created_at", "updated_at"}
+
+    for node in nodes:
+        entity_data = sqlite_data.get(node["label"])
+        if entity_data:
+            if detail_level == "summary":
+                # summary: 只返回 description
+                node["properties"] = {
+                    "description": entity_data.get("description")
+                } if entity_data.get("description") else {}
+            elif detail_level == "full":
+                # full: 返回所有属性
+                node["properties"] = {
+                    k: v for k, v in entity_data.items()
+                    if k not in skip_keys and v is not None
+                }
+
+
+# 每次展开的最大节点数
+EXPAND_CHUNK = 500
+
+
+async def get_sampled_adjacency(
+    campaign_id: str,
+    entity_ids: List[str],
+    degree_cap: int,
+    sample: SampleMode = "recent",
+) -> Adjacency:
+    """
+    一批实体的邻接边（不含 IN_CAMPAIGN），每个实体最多保留 degree_cap 条：
+    recent 按关系 updated_at 取最新，weight 按属性 weight 取最大；
+    返回 entity_id → (实际度数, 采样后的邻接项)
+    """
+    return await get_graph_store().get_sampled_adjacency(campaign_id, entity_ids, degree_cap, sample)
+
+
+def _cached_adjacency(graph, entity_ids: List[str], degree_cap: int, sample: SampleMode) -> Adjacency:
+    """get_sampled_adjacency 的缓存版本，最近更新顺序取自边的版本号"""
+    result: Adjacency = {}
+    for entity_id in entity_ids:
+        index = graph.by_id.get(entity_id)
+        if index is None:
+            continue
+        adjacency = graph.adjacency[index]
+        if sample == "recent":
+            chosen = heapq.nlargest(degree_cap, adjacency, key=graph.edge_versions.__getitem__)
+        else:
+            chosen = sorted(adjacency, key=graph.edge_versions.__getitem__, reverse=True)
+        edges = []
+        for edge in chosen:
+            source, target = graph.sources[edge], graph.targets[edge]
+            other = target if source == index else source
+            edges.append({
+                "relationship_id": graph.edge_ids[edge],
+                "from_id": graph.node_ids[source],
+                "to_id": graph.node_ids[target],
+                "type": graph.edge_types[edge],
+                "properties": graph.edge_properties[edge],
+                "other_id": graph.node_ids[other],
+                "other_name": graph.names[other],
+                "other_type": graph.types[other],
+            })
+        result[entity_id] = (len(adjacency), sample_edges(edges, degree_cap, sample))
+    return result
+
+
+async def _expand(
+    center: Dict[str, Any],
+    fetch: Callable[[List[str]], Awaitable[Adjacency]],
+    depth: int,
+    max_nodes: int,
+    max_edges: int,
+    offset: int,
+) -> Dict[str, Any]:
+    """
+    从 center 出发按 BFS 顺序分块展开，只展开到本页需要的第 offset + max_nodes 个节点。
+    采样与展开顺序都是确定的，因此节点的 BFS 序号是稳定的，游标只需记录已返回的节点数。
+    每条边归属于两端中序号较大的节点，随该节点返回，保证跨页不重不漏。
+    """
+    order: List[Dict[str, Any]] = [center]
+    levels = [0]
+    position = {center["entity_id"]: 0}
+    owned: List[List[Dict[str, Any]]] = [[]]
+    seen_edges: Set[str] = set()
+    sampled: Set[str] = set()
+    need = offset + max_nodes
+
+    expanded = 0
+    while expanded < min(len(order), need):
+        stop = min(len(order), need, expanded + EXPAND_CHUNK)
+        batch = [order[i]["entity_id"] for i in range(expanded, stop) if levels[i] < depth]
+        adjacency = await fetch(batch) if batch else {}
+        for i in range(expanded, stop):
+            entity_id = order[i]["entity_id"]
+            if levels[i] >= depth or entity_id not in adjacency:
+                continue
+            degree, edges = adjacency[entity_id]
+            if degree > len(edges):
+                sampled.add(entity_id)
+            for edge in edges:
+                other = edge["other_id"]
+                if other not in position:
+                    position[other] = len(order)
+                    order.append({"entity_id": other, "name": edge["other_name"], "type": edge["other_type"]})
+                    levels.append(levels[i] + 1)
+                    owned.append([])
+                if edge["relationship_id"] in seen_edges:
+                    continue
+                seen_edges.add(edge["relationship_id"])
+                owned[max(i, position[other])].append(edge)
+        expanded = stop
+
+    nodes, edges = [], []
+    end = offset
+    while end < min(len(order), need):
+        # 边数超限时截断本页，但至少返回一个节点以保证游标前进
+        if nodes and len(edges) + len(owned[end]) > max_edges:
+            break
+        node = order[end]
+        nodes.append({
+            "id": node["entity_id"],
+            "entity_id": node["entity_id"],
+            "label": node["name"],
+            "type": node["type"],
+            "properties": {},
+        })
+        edges.extend(
             {
-                "campaign_id": campaign_id,
-                "from_name": from_name,
-                "to_name": to_name,
-            },
+                "id": edge["relationship_id"],
+                "from_id": edge["from_id"],
+                "to_id": edge["to_id"],
+                "type": edge["type"],
+                "properties": deserialize_map(edge["properties"]),
+            }
+            for edge in owned[end]
         )
-        paths: List[Dict[str, Any]] = []
-        for record in result:
-            path = record["path"]
-            nodes = [node.get("name") for node in path.nodes]
-            relationships = [rel.get("type") for rel in path.relationships]
-            paths.append(
-                {
-                    "nodes": nodes,
-                    "relationships": relationships,
-                    "hops": record["hops"],
-                }
-            )
-        return paths
+        end += 1
+    next_cursor = encode_cursor({"offset": end}) if end < len(order) else None
+    return {
+        "nodes": nodes,
+        "edges": edges,
+        "sampled": [node["id"] for node in nodes if node["id"] in sampled],
+        "truncated": next_cursor is not None,
+        "next_cursor": next_cursor,
+    }
 
 
-def get_subgraph(
+async def get_subgraph(
     campaign_id: str,
     entity_id: Optional[str] = None,
     name: Optional[str] = None,
     depth: int = 2,
     detail_level: Literal["skeleton", "summary", "full"] = "skeleton",
-) -> Dict[str, List[Dict[str, Any]]]:
+    max_nodes: Optional[int] = None,
+    max_edges: Optional[int] = None,
+    degree_cap: Optional[int] = None,
+    sample: SampleMode = "recent",
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    中心实体周围 depth 跳内的子图，按 BFS 顺序分页：
+    每页最多 max_nodes 个节点、max_edges 条边，每个节点最多展开 degree_cap 个邻居；
+    还有未返回的节点时给出 next_cursor，带上它再次请求即继续展开。
+    cursor 格式错误时抛出 ValueError
+    """
     logger.info(f"get_subgraph called: campaign_id={campaign_id}, entity_id={entity_id}, name={name}, depth={depth}")
     depth = max(1, min(depth, 4))
+    max_nodes = max_nodes or settings.subgraph_max_nodes
+    max_edges = max_edges or settings.subgraph_max_edges
+    degree_cap = degree_cap or settings.subgraph_degree_cap
+    offset = 0
+    if cursor:
+        offset = decode_cursor(cursor).get("offset")
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError("invalid cursor")
+    empty = {"nodes": [], "edges": [], "sampled": [], "truncated": False, "next_cursor": None}
+    if not entity_id and not name:
+        return empty
+
+    if graph_cache.enabled():
+        graph = await graph_cache.get_graph(campaign_id)
+        index = graph.by_id.get(entity_id) if entity_id else graph.by_name.get(name)
+        if index is None:
+            return empty
+        center = {"entity_id": graph.node_ids[index], "name": graph.names[index], "type": graph.types[index]}
 
-    # Build match clause based on provided parameter
-    if entity_id:
-        match_clause = "MATCH (center:Entity {entity_id: $entity_id})-[:IN_CAMPAIGN]->(:Campaign {campaign_id: $campaign_id})"
-        params = {"campaign_id": campaign_id, "entity_id": entity_id}
-    elif name:
-        match_clause = "MATCH (center:Entity {name: $name})-[:IN_CAMPAIGN]->(:Campaign {campaign_id: $campaign_id})"
-        params = {"campaign_id": campaign_id, "name": name}
+        async def fetch(entity_ids: List[str]) -> Adjacency:
+            return _cached_adjacency(graph, entity_ids, degree_cap, sample)
     else:
-        return {"nodes": [], "edges": []}
-
-    query = (
-        f"{match_clause} "
-        "OPTIONAL MATCH path = (center)-[*1.." + str(depth) + "]-(n:Entity) "
-        "WITH center, collect(path) AS paths "
-        "WITH center, paths, "
-        "CASE WHEN size(paths) = 0 THEN [center] "
-        "ELSE reduce(acc = [], p IN paths | acc + nodes(p)) + [center] END AS allNodes, "
-        "CASE WHEN size(paths) = 0 THEN [] "
-        "ELSE reduce(acc = [], p IN paths | acc + relationships(p)) END AS allRels "
-        "UNWIND allNodes AS n "
-        "WITH center, allRels, collect(DISTINCT n) AS nodes "
-        "RETURN nodes, allRels AS rels"
-    )
-    logger.info(f"Query: {query}")
-    logger.info(f"Params: {params}")
-    with get_session() as session:
-        result = session.run(query, params)
-        record = result.single()
-        if not record:
-            logger.info("No record returned from query")
-            return {"nodes": [], "edges": []}
-
-        logger.info(f"Raw record nodes count: {len(record['nodes'])}")
-        logger.info(f"Raw record rels count: {len(record['rels'])}")
-
-        nodes = [
-            {
-                "id": node.get("entity_id"),
-                "entity_id": node.get("entity_id"),
-                "label": node.get("name"),
-                "type": node.get("type"),
-                "properties": {},
-            }
-            for node in record["nodes"]
-            if node.get("entity_id")
-        ]
-        edges = [
-            {
-                "id": rel.get("relationship_id"),
-                "from_id": rel.start_node.get("entity_id"),
-                "to_id": rel.end_node.get("entity_id"),
-                "type": rel.get("type"),
-                "properties": deserialize_map(rel.get("properties")),
-            }
-            for rel in record["rels"]
-            if rel.get("relationship_id")
-        ]
-
-        # 根据 detail_level 补充属性
-        if detail_level != "skeleton" and nodes:
-            node_names = [n["label"] for n in nodes]
-            sqlite_data = get_entities_by_names(campaign_id, node_names)
-            skip_keys = {"id", "entity_id", "campaign_id", "type", "name", "created_at", "updated_at"}
-
-            for node in nodes:
-                entity_data = sqlite_data.get(node["label"])
-                if entity_data:
-                    if detail_level == "summary":
-                        # summary: 只返回 description
-                        node["properties"] = {
-                            "description": entity_data.get("description")
-                        } if entity_data.get("description") else {}
-                    elif detail_level == "full":
-                        # full: 返回所有属性
-                        node["properties"] = {
-                            k: v for k, v in entity_data.items()
-                            if k not in skip_keys and v is not None
-                        }
-
-        logger.info(f"Processed nodes count: {len(nodes)}, edges count: {len(edges)}")
-        return {"nodes": nodes, "edges": edges}
+        if entity_id:
+            entity = await get_entity(campaign_id, entity_id)
+        else:
+            entity = await get_entity_by_name(campaign_id, name)
+        if not entity:
+            return empty
+        center = {"entity_id": entity["entity_id"], "name": entity["name"], "type": entity.get("type")}
+
+        async def fetch(entity_ids: List[str]) -> Adjacency:
+            return await get_sampled_adjacency(campaign_id, entity_ids, degree_cap, sample)
+
+    result = await _expand(center, fetch, depth, max_nodes, max_edges, offset)
+    await _enrich_nodes(campaign_id, result["nodes"], detail_level)
+    logger.info(f"Processed nodes count: {len(result['nodes'])}, edges count: {len(result['edges'])}")
+    return result
+
+
+async def get_neighbours(
+    campaign_id: str,
+    entity_ids: List[str],
+    limit: int = 20,
+) -> List[Dict[str, Any]]:
+    """
+    一跳邻居扩展：返回与种子实体直接相连的实体，
+    与越多种子相连（links）越靠前；种子本身不在结果中
+    """
+    return await get_graph_store().get_neighbours(campaign_id, entity_ids, limit)
@@ -0,0 +1,230 @@
+"""
+SQLite change log repository for tarven-note.
+每个战役一个单调递增的版本号；实体、关系、消息的每次写入把版本号加一，
+并以该版本号追加变更记录。客户端记住上次同步到的版本，之后只拉取增量。
+
+压缩：每写入 settings.change_log_compact_interval 个版本，把早于最近
+settings.change_log_retain_versions 个版本的日志压缩为每个对象只保留最后一条，
+并丢弃其中的删除记录。since 早于被丢弃的删除记录时无法给出正确的增量，
+get_changes 返回 reset，客户端须全量重新拉取。
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from server.core.config import settings
+from server.db.sqlite import get_cursor
+
+# (kind, ref_id, data)：kind 为 entity | relationship | message，data 为 None 表示删除
+Change = Tuple[str, str, Optional[Dict[str, Any]]]
+
+
+def entity_change(entity: Dict[str, Any]) -> Change:
+    """实体只记录图存储中的基本信息，详细属性通过 GET /entities/{id} 获取"""
+    return ("entity", entity["entity_id"], {
+        "entity_id": entity["entity_id"],
+        "type": entity.get("type"),
+        "name": entity.get("name"),
+    })
+
+
+def relationship_change(relationship: Dict[str, Any]) -> Change:
+    return ("relationship", relationship["relationship_id"], {
+        "relationship_id": relationship["relationship_id"],
+        "from_entity_id": relationship["from_entity_id"],
+        "to_entity_id": relationship["to_entity_id"],
+        "type": relationship["type"],
+        "properties": relationship.get("properties") or {},
+    })
+
+
+def deleted_change(kind: str, ref_id: str) -> Change:
+    return (kind, ref_id, None)
+
+
+def append_changes(cursor, campaign_id: str, changes: List[Change]) -> Optional[int]:
+    """版本号加一并追加变更记录，返回新版本号；需在写入源数据的同一事务中调用"""
+    if not changes:
+        return None
+    cursor.execute(
+        """INSERT INTO campaign_versions (campaign_id, version) VALUES (?, 1)
+           ON CONFLICT(campaign_id) DO UPDATE SET
+               version = version + 1,
+               updated_at = CURRENT_TIMESTAMP
+           RETURNING version, compacted_version""",
+        (campaign_id,)
+    )
+    row = cursor.fetchone()
+    version = row["version"]
+    # 同一批内同一对象只保留最后一条
+    latest = {(kind, ref_id): data for kind, ref_id, data in changes}
+    cursor.executemany(
+        """INSERT INTO change_log (campaign_id, version, kind, ref_id, op, data)
+           VALUES (?, ?, ?, ?, ?, ?)""",
+        [
+            (
+                campaign_id, version, kind, ref_id,
+                "delete" if data is None else "upsert",
+                None if data is None else json.dumps(data, ensure_ascii=False, default=str),
+            )
+            for (kind, ref_id), data in latest.items()
+        ]
+    )
+    if version - row["compacted_version"] >= settings.change_log_compact_interval:
+        _compact(cursor, campaign_id, version)
+    return version
+
+
+def record_changes(campaign_id: str, changes: List[Change]) -> Optional[int]:
+    """在独立事务中记录一批变更（源数据不在 SQLite 中时使用）"""
+    if not changes:
+        return None
+    with get_cursor() as cursor:
+        return append_changes(cursor, campaign_id, changes)
+
+
+def get_version(campaign_id: str) -> int:
+    """战役当前的版本号，从未写入过时为 0"""
+    with get_cursor(readonly=True) as cursor:
+        cursor.execute("SELECT version FROM campaign_versions WHERE campaign_id = ?", (campaign_id,))
+        row = cursor.fetchone()
+    return row["version"] if row else 0
+
+
+def get_changes(campaign_id: str, since: int, limit: int) -> Dict[str, Any]:
+    """
+    返回 since 之后的变更，同一对象只保留最后一条。
+    一个版本的记录不会被拆到两页：超过 limit 时在版本边界截断（单个版本超过 limit 时整版返回），
+    has_more 为 True 时以返回的 version 作为下一次的 since。
+    """
+    with get_cursor(readonly=True) as cursor:
+        cursor.execute(
+            "SELECT version, min_version FROM campaign_versions WHERE campaign_id = ?",
+            (campaign_id,)
+        )
+        row = cursor.fetchone()
+        current = row["version"] if row else 0
+        min_version = row["min_version"] if row else 0
+        if since > current or since < min_version:
+            # since 不属于当前日志（已被压缩，或来自被删除后重建的战役）
+            return {"version": current, "reset": True, "has_more": False, "changes": []}
+        cursor.execute(
+            """SELECT version, kind, ref_id, op, data FROM change_log
+               WHERE campaign_id = ? AND version > ?
+               ORDER BY version, id
+               LIMIT ?""",
+            (campaign_id, since, limit + 1)
+        )
+        rows = cursor.fetchall()
+        has_more = len(rows) > limit
+        if has_more:
+            boundary = rows[limit]["version"]
+            rows = [row for row in rows if row["version"] < boundary]
+            if not rows:
+                cursor.execute(
+                    """SELECT version, kind, ref_id, op, data FROM change_log
+                       WHERE campaign_id = ? AND version = ?
+                       ORDER BY id""",
+                    (campaign_id, boundary)
+                )
+                rows = cursor.fetchall()
+
+    latest: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for row in rows:
+        key = (row["kind"], row["ref_id"])
+        latest.pop(key, None)
+        latest[key] = {
+            "version": row["version"],
+            "kind": row["kind"],
+            "id": row["ref_id"],
+            "op": row["op"],
+            "data": json.loads(row["data"]) if row["data"] else None,
+        }
+    return {
+        "version": rows[-1]["version"] if has_more else current,
+        "reset": False,
+        "has_more": has_more,
+        "changes": list(latest.values()),
+    }
+
+
+def _compact(cursor, campaign_id: str, version: int) -> int:
+    horizon = version - settings.change_log_retain_versions
+    removed = 0
+    if horizon > 0:
+        # 被后续记录覆盖的旧记录
+        cursor.execute(
+            """DELETE FROM change_log
+               WHERE campaign_id = ? AND version <= ? AND EXISTS (
+                   SELECT 1 FROM change_log later
+                   WHERE later.campaign_id = change_log.campaign_id
+                     AND later.kind = change_log.kind
+                     AND later.ref_id = change_log.ref_id
+                     AND later.version > change_log.version
+               )""",
+            (campaign_id, horizon)
+        )
+        removed += cursor.rowcount
+        # 窗口外的删除记录：丢弃后 since 早于它们的客户端须全量重新拉取
+        cursor.execute(
+            """SELECT MAX(version) AS version FROM change_log
+               WHERE campaign_id = ? AND version <= ? AND op = 'delete'""",
+            (campaign_id, horizon)
+        )
+        dropped = cursor.fetchone()["version"]
+        if dropped is not None:
+            cursor.execute(
+                "DELETE FROM change_log WHERE campaign_id = ? AND version <= ? AND op = 'delete'",
+                (campaign_id, horizon)
+            )
+            removed += cursor.rowcount
+            cursor.execute(
+                "UPDATE campaign_versions SET min_version = MAX(min_version, ?) WHERE campaign_id = ?",
+                (dropped, campaign_id)
+            )
+    cursor.execute(
+        "UPDATE campaign_versions SET compacted_version = ? WHERE campaign_id = ?",
+        (version, campaign_id)
+    )
+    return removed
+
+
+def compact_changes(campaign_id: str) -> int:
+    """立即压缩战役的变更日志，返回删除的记录数"""
+    with get_cursor() as cursor:
+        cursor.execute("SELECT version FROM campaign_versions WHERE campaign_id = ?", (campaign_id,))
+        row = cursor.fetchone()
+        if not row:
+            return 0
+        return _compact(cursor, campaign_id, row["version"])
+
+
+def delete_campaign_changes(campaign_id: str, limit: int) -> int:
+    """删除战役的一批变更日志，返回删除数量"""
+    with get_cursor() as cursor:
+        cursor.execute(
+            """DELETE FROM change_log WHERE id IN (
+                   SELECT id FROM change_log WHERE campaign_id = ? LIMIT ?
+               )""",
+            (campaign_id, limit)
+        )
+        return cursor.rowcount
+
+
+def reset_changes(campaign_id: str) -> int:
+    """
+    战役被删除：版本号加一并作为 min_version，之前同步过的客户端都会收到 reset。
+    版本行本身保留，同名战役重建后版本号继续递增
+    """
+    with get_cursor() as cursor:
+        cursor.execute(
+            """INSERT INTO campaign_versions (campaign_id, version, min_version, compacted_version)
+               VALUES (?, 1, 1, 1)
+               ON CONFLICT(campaign_id) DO UPDATE SET
+                   version = version + 1,
+                   min_version = version + 1,
+                   compacted_version = version + 1,
+                   updated_at = CURRENT_TIMESTAMP
+               RETURNING version""",
+            (campaign_id,)
+        )
+        return cursor.fetchone()["version"]
@@ -0,0 +1,42 @@
+"""
+SQLite embedding cache repository for tarven-note.
+按 (model, 维度, sha256(text)) 缓存嵌入结果，修改 embedding_dim 后不会取到旧维度的向量。
+"""
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from server.db.sqlite import get_cursor
+
+
+def get_cached_embeddings(model: str, dim: int, text_hashes: List[str]) -> Dict[str, List[float]]:
+    """批量查询缓存，返回 {text_hash: embedding}"""
+    if not text_hashes:
+        return {}
+    with get_cursor(readonly=True) as cursor:
+        placeholders = ", ".join(["?"] * len(text_hashes))
+        cursor.execute(
+            f"""SELECT text_hash, embedding FROM embedding_cache
+                WHERE model = ? AND dim = ? AND text_hash IN ({placeholders})""",
+            [model, dim] + text_hashes
+        )
+        rows = cursor.fetchall()
+    return {
+        row["text_hash"]: np.frombuffer(row["embedding"], dtype=np.float32).tolist()
+        for row in rows
+    }
+
+
+def store_cached_embeddings(model: str, dim: int, items: Iterable[Tuple[str, List[float]]]) -> None:
+    """写入缓存，items 为 (text_hash, embedding)"""
+    with get_cursor() as cursor:
+        cursor.executemany(
+            """INSERT OR REPLACE INTO embedding_cache (model, dim, text_hash, embedding)
+               VALUES (?, ?, ?, ?)""",
+            (
+                (model, dim, text_hash, np.asarray(embedding, dtype=np.float32).tobytes())
+                for text_hash, embedding in items
+                # 接口返回的维度与请求不符时不缓存
+                if len(embedding) == dim
+            )
+        )
@@ -0,0 +1,168 @@
+"""
+SQLite embedding queue repository for tarven-note.
+记录待嵌入的消息和实体（脏行），由后台任务批量消费。
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from server.db.sqlite import get_cursor
+
+
+# 参与实体嵌入文本的字段，这些字段变化时实体需要重新嵌入
+EMBEDDED_ENTITY_FIELDS = ("description", "appearance", "background")
+
+ENQUEUE_SQL = """
+INSERT INTO embedding_queue (ref_type, ref_id, campaign_id)
+VALUES (?, ?, ?)
+ON CONFLICT(ref_type, ref_id) DO UPDATE SET
+    campaign_id = excluded.campaign_id,
+    generation = embedding_queue.generation + 1,
+    attempts = 0,
+    last_error = NULL,
+    available_at = 0,
+    enqueued_at = CURRENT_TIMESTAMP
+"""
+
+
+def enqueue_embedding(cursor, ref_type: str, ref_id: str, campaign_id: Optional[str]) -> None:
+    """标记为待嵌入；需在写入源数据的同一事务中调用"""
+    cursor.execute(ENQUEUE_SQL, (ref_type, ref_id, campaign_id))
+
+
+def enqueue_embeddings(cursor, items: List[Tuple[str, str, Optional[str]]]) -> None:
+    """批量标记待嵌入，items 为 (ref_type, ref_id, campaign_id)"""
+    if items:
+        cursor.executemany(ENQUEUE_SQL, items)
+
+
+def enqueue_missing() -> int:
+    """把尚无向量的消息和实体加入队列（首次启用或清空向量后回填）"""
+    with get_cursor() as cursor:
+        cursor.execute(
+            """INSERT OR IGNORE INTO embedding_queue (ref_type, ref_id, campaign_id)
+               SELECT 'message', m.message_id, m.campaign_id FROM messages m
+               WHERE NOT EXISTS (
+                   SELECT 1 FROM embeddings em
+                   WHERE em.ref_type = 'message' AND em.ref_id = m.message_id
+               )"""
+        )
+        count = cursor.rowcount
+        cursor.execute(
+            """INSERT OR IGNORE INTO embedding_queue (ref_type, ref_id, campaign_id)
+               SELECT 'entity', e.entity_id, e.campaign_id FROM entities e
+               WHERE NOT EXISTS (
+                   SELECT 1 FROM embeddings em
+                   WHERE em.ref_type = 'entity' AND em.ref_id = e.entity_id
+               )"""
+        )
+        return count + cursor.rowcount
+
+
+def fetch_pending(limit: int) -> List[Dict[str, Any]]:
+    """取出一批到期的队列项，并附带需要嵌入的文本（源数据已删除时 text 为 None）"""
+    with get_cursor(readonly=True) as cursor:
+        cursor.execute(
+            """SELECT q.ref_type, q.ref_id, q.campaign_id, q.attempts, q.generation,
+                      m.content AS message_text,
+                      e.name, e.description, e.appearance, e.background
+               FROM embedding_queue q
+               LEFT JOIN messages m
+                 ON q.ref_type = 'message' AND m.message_id = q.ref_id
+               LEFT JOIN entities e
+                 ON q.ref_type = 'entity' AND e.entity_id = q.ref_id
+               WHERE q.available_at <= ?
+               ORDER BY q.enqueued_at
+               LIMIT ?""",
+            (time.time(), limit)
+        )
+        rows = cursor.fetchall()
+
+    items = []
+    for row in rows:
+        item = {
+            "ref_type": row["ref_type"],
+            "ref_id": row["ref_id"],
+            "campaign_id": row["campaign_id"],
+            "attempts": row["attempts"],
+            "generation": row["generation"],
+            "text": None,
+        }
+        if row["ref_type"] == "message":
+            item["text"] = row["message_text"]
+        elif row["name"] is not None:
+            parts = [row["name"]] + [row[field] for field in EMBEDDED_ENTITY_FIELDS]
+            item["text"] = "\n".join(part for part in parts if part)
+        items.append(item)
+    return items
+
+
+def complete(items: List[Dict[str, Any]]) -> None:
+    """
+    出队已处理的项；只删除取出时的那一代，处理期间被重新标记的项
+    （源数据又有修改，刚写入的向量已过时）留在队列中再嵌入一次
+    """
+    with get_cursor() as cursor:
+        cursor.executemany(
+            "DELETE FROM embedding_queue WHERE ref_type = ? AND ref_id = ? AND generation = ?",
+            [(item["ref_type"], item["ref_id"], item["generation"]) for item in items]
+        )
+
+
+def fail(items: List[Dict[str, Any]], error: str, backoff_seconds: float) -> None:
+    """记录失败并按尝试次数指数退避"""
+    now = time.time()
+    with get_cursor() as cursor:
+        cursor.executemany(
+            """UPDATE embedding_queue
+               SET attempts = attempts + 1, last_error = ?, available_at = ?
+               WHERE ref_type = ? AND ref_id = ? AND generation = ?""",
+            [
+                (
+                    error,
+                    now + backoff_seconds * (2 ** min(item["attempts"], 6)),
+                    item["ref_type"],
+                    item["ref_id"],
+                    item["generation"],
+                )
+                for item in items
+            ]
+        )
+
+
+def count_pending() -> Dict[str, int]:
+    with get_cursor(readonly=True) as cursor:
+        cursor.execute(
+            """SELECT COUNT(*) AS queued,
+                      COALESCE(SUM(CASE WHEN attempts > 0 THEN 1 ELSE 0 END), 0) AS failing
+               FROM embedding_queue"""
+        )
+        row = cursor.fetchone()
+    return {"queued": row["queued"], "failing": row["failing"]}
+
+
+def clear_queue() -> None:
+    with get_cursor() as cursor:
+        cursor.execute("DELETE FROM embedding_queue")
+
+
+def delete_campaign_items(campaign_id: str) -> int:
+    """删除战役的全部待嵌入项；队列只含未完成的项，一条语句即可"""
+    with get_cursor() as cursor:
+        cursor.execute("DELETE FROM embedding_queue WHERE campaign_id = ?", (campaign_id,))
+        return cursor.rowcount
+
+
+def get_state(key: str) -> Optional[str]:
+    with get_cursor(readonly=True) as cursor:
+        cursor.execute("SELECT value FROM embedding_state WHERE key = ?", (key,))
+        row = cursor.fetchone()
+    return row["value"] if row else None
+
+
+def set_state(key: str, value: Optional[str]) -> None:
+    with get_cursor() as cursor:
+        cursor.execute(
+            """INSERT INTO embedding_state (key, value) VALUES (?, ?)
+               ON CONFLICT(key) DO UPDATE SET value = excluded.value""",
+            (key, value)
+        )
@@ -5,9 +5,11 @@ SQLite entity repository for tarven-note.
 import json
 import logging
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from server.db.sqlite import get_cursor
+from server.db.vector import update_entity_type
+from server.repositories.sqlite_embedding_queue import EMBEDDED_ENTITY_FIELDS, enqueue_embedding, enqueue_embeddings
 
 logger = logging.getLogger(__name__)
 from server.schemas.entity_attributes import LIST_FIELDS, ATTRIBUTES_KEYS
@@ -27,6 +29,11 @@ JSON_COLUMNS = {
     "aliases", "used_names", "notes", "metadata",
 }
 
+# 批量写入时使用的固定列顺序
+ENTITY_COLUMN_ORDER = sorted(ENTITY_COLUMNS)
+# 批量按名称查询时每条 SQL 的最大参数数
+NAME_CHUNK = 500
+
 
 def _to_json(value: Any) -> Optional[str]:
     """转换为JSON字符串"""
@@ -45,16 +52,6 @@ def _merge_list(old_json: Optional[str], new_val: Any) -> str:
     return json.dumps(old, ensure_ascii=False)
 
 
-def _sync_aliases(cursor, campaign_id: str, entity_id: str, aliases: List[str]) -> None:
-    """同步别名到 entity_aliases 表"""
-    for alias in aliases:
-        cursor.execute(
-            """INSERT OR IGNORE INTO entity_aliases
-               (campaign_id, entity_id, alias) VALUES (?, ?, ?)""",
-            (campaign_id, entity_id, alias)
-        )
-
-
 def upsert_entity(
     entity_id: str,
     campaign_id: str,
@@ -64,125 +61,271 @@ def upsert_entity(
     metadata: Optional[Dict[str, Any]] = None,
 ) -> None:
     """插入或更新实体"""
-    now = datetime.utcnow().isoformat()
+    upsert_entities(campaign_id, [{
+        "entity_id": entity_id,
+        "entity_type": entity_type,
+        "name": name,
+        "properties": properties,
+        "metadata": metadata,
+    }])
 
-    with get_cursor() as cursor:
-        # 查询是否存在
-        cursor.execute(
-            "SELECT * FROM entities WHERE campaign_id = ? AND name = ?",
-            (campaign_id, name)
+
+def _apply_upsert(
+    row: Optional[Dict[str, Any]],
+    item: Dict[str, Any],
+    campaign_id: str,
+    now: str,
+) -> Dict[str, Any]:
+    """把一条 upsert 合并到行数据上（row 为 None 表示新实体），返回新的行数据"""
+    properties = item["properties"]
+    if row is None:
+        row = {column: None for column in ENTITY_COLUMN_ORDER}
+        row.update(
+            entity_id=item["entity_id"], campaign_id=campaign_id, type=item["entity_type"],
+            name=item["name"], created_at=now, updated_at=now,
         )
-        existing = cursor.fetchone()
+        for key, val in properties.items():
+            if key in ENTITY_COLUMNS:
+                row[key] = _to_json(val) if key in JSON_COLUMNS else val
+        if item.get("metadata"):
+            row["metadata"] = _to_json(item["metadata"])
+        return row
 
-        if not existing:
-            # INSERT 新记录
-            cols = ["entity_id", "campaign_id", "type", "name", "created_at", "updated_at"]
-            vals = [entity_id, campaign_id, entity_type, name, now, now]
+    row = dict(row)
+    row["updated_at"] = now
+    # 如果当前type是Unknown，允许更新type
+    if row["type"] == "Unknown" and item["entity_type"] != "Unknown":
+        row["type"] = item["entity_type"]
+    for key, val in properties.items():
+        if key not in ENTITY_COLUMNS:
+            continue
+        if key in LIST_FIELDS:
+            # 列表字段：追加
+            row[key] = _merge_list(row[key], val)
+        else:
+            # 普通字段：覆盖
+            row[key] = _to_json(val) if key in JSON_COLUMNS else val
+    return row
 
-            for key, val in properties.items():
-                if key in ENTITY_COLUMNS:
-                    cols.append(key)
-                    vals.append(_to_json(val) if key in JSON_COLUMNS else val)
 
-            if metadata:
-                cols.append("metadata")
-                vals.append(_to_json(metadata))
+def upsert_entities(campaign_id: str, items: List[Dict[str, Any]]) -> None:
+    """
+    批量插入或更新实体，一个事务内完成。
+    items: [{entity_id, entity_type, name, properties, metadata}]，按顺序合并，
+    同名条目与逐条调用 upsert_entity 的结果一致。
+    """
+    if not items:
+        return
+    now = datetime.utcnow().isoformat()
+    names = list(dict.fromkeys(item["name"] for item in items))
+
+    with get_cursor() as cursor:
+        existing: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(names), NAME_CHUNK):
+            chunk = names[start:start + NAME_CHUNK]
+            placeholders = ", ".join(["?"] * len(chunk))
+            cursor.execute(
+                f"SELECT * FROM entities WHERE campaign_id = ? AND name IN ({placeholders})",
+                [campaign_id] + chunk
+            )
+            existing.update({row["name"]: dict(row) for row in cursor.fetchall()})
 
-            placeholders = ", ".join(["?"] * len(cols))
-            col_names = ", ".join(cols)
-            cursor.execute(f"INSERT INTO entities ({col_names}) VALUES ({placeholders})", vals)
+        rows: Dict[str, Dict[str, Any]] = {}
+        aliases: List[tuple] = []
+        dirty: Dict[str, None] = {}
+        for item in items:
+            name = item["name"]
+            before = rows.get(name, existing.get(name))
+            row = _apply_upsert(before, item, campaign_id, now)
+            rows[name] = row
 
+            properties = item["properties"]
+            # 新实体或参与嵌入的字段有变化时（重新）嵌入
+            if before is None or any(
+                key in properties and properties[key] != before[key]
+                for key in EMBEDDED_ENTITY_FIELDS
+            ):
+                dirty[row["entity_id"]] = None
             # 同步别名
-            if "aliases" in properties:
-                aliases = properties["aliases"]
-                if isinstance(aliases, list):
-                    _sync_aliases(cursor, campaign_id, entity_id, aliases)
+            if isinstance(properties.get("aliases"), list):
+                aliases.extend((campaign_id, row["entity_id"], alias) for alias in properties["aliases"])
 
-        else:
-            # UPDATE 现有记录
-            updates = ["updated_at = ?"]
-            vals = [now]
-
-            # 如果当前type是Unknown，允许更新type
-            if existing["type"] == "Unknown" and entity_type != "Unknown":
-                updates.append("type = ?")
-                vals.append(entity_type)
-
-            for key, val in properties.items():
-                if key not in ENTITY_COLUMNS:
-                    continue
-
-                if key in LIST_FIELDS:
-                    # 列表字段：追加
-                    merged = _merge_list(existing[key], val)
-                    updates.append(f"{key} = ?")
-                    vals.append(merged)
-                else:
-                    # 普通字段：覆盖
-                    updates.append(f"{key} = ?")
-                    vals.append(_to_json(val) if key in JSON_COLUMNS else val)
-
-            set_clause = ", ".join(updates)
-            vals.extend([campaign_id, name])
-            cursor.execute(
+        inserts = [row for name, row in rows.items() if name not in existing]
+        updates = [row for name, row in rows.items() if name in existing]
+        if inserts:
+            columns = ["entity_id", "campaign_id", "type", "name", "created_at", "updated_at"] + ENTITY_COLUMN_ORDER
+            cursor.executemany(
+                f"INSERT INTO entities ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})",
+                [[row[column] for column in columns] for row in inserts]
+            )
+        if updates:
+            columns = ["type", "updated_at"] + ENTITY_COLUMN_ORDER
+            set_clause = ", ".join(f"{column} = ?" for column in columns)
+            cursor.executemany(
                 f"UPDATE entities SET {set_clause} WHERE campaign_id = ? AND name = ?",
-                vals
+                [[row[column] for column in columns] + [campaign_id, row["name"]] for row in updates]
             )
+        if aliases:
+            cursor.executemany(
+                """INSERT OR IGNORE INTO entity_aliases
+                   (campaign_id, entity_id, alias) VALUES (?, ?, ?)""",
+                aliases
+            )
+        enqueue_embeddings(cursor, [("entity", entity_id, campaign_id) for entity_id in dirty])
 
-            # 同步别名
-            if "aliases" in properties:
-                aliases = properties["aliases"]
-                if isinstance(aliases, list):
-                    _sync_aliases(cursor, campaign_id, existing["entity_id"], aliases)
+    for name, row in rows.items():
+        previous = existing.get(name)
+        if previous is not None and previous["type"] != row["type"]:
+            # 向量分区按实体类型过滤，类型升级后同步
+            update_entity_type(campaign_id, row["entity_id"], row["type"])
+
+
+def _parse_json_columns(entity: Dict[str, Any]) -> Dict[str, Any]:
+    for key in JSON_COLUMNS:
+        if key in entity and entity[key]:
+            try:
+                entity[key] = json.loads(entity[key])
+            except (json.JSONDecodeError, TypeError):
+                pass
+    return entity
 
 
 def get_entities_by_names(campaign_id: str, names: List[str]) -> Dict[str, Dict[str, Any]]:
-    """批量根据名称获取实体，返回 {name: entity_data} 字典"""
+    """批量根据名称获取实体（命中 UNIQUE(campaign_id, name) 索引），返回 {name: entity_data} 字典"""
     if not names:
         return {}
-    with get_cursor() as cursor:
-        placeholders = ", ".join(["?"] * len(names))
-        cursor.execute(
-            f"SELECT * FROM entities WHERE campaign_id = ? AND name IN ({placeholders})",
-            [campaign_id] + names
-        )
-        rows = cursor.fetchall()
-        result = {}
-        for row in rows:
-            entity = dict(row)
-            for key in JSON_COLUMNS:
-                if key in entity and entity[key]:
-                    try:
-                        entity[key] = json.loads(entity[key])
-                    except (json.JSONDecodeError, TypeError):
-                        pass
-            result[entity["name"]] = entity
-        return result
+    result = {}
+    with get_cursor(readonly=True) as cursor:
+        for start in range(0, len(names), NAME_CHUNK):
+            chunk = names[start:start + NAME_CHUNK]
+            placeholders = ", ".join(["?"] * len(chunk))
+            cursor.execute(
+                f"SELECT * FROM entities WHERE campaign_id = ? AND name IN ({placeholders})",
+                [campaign_id] + chunk
+            )
+            for row in cursor.fetchall():
+                result[row["name"]] = _parse_json_columns(dict(row))
+    return result
 
 
 def get_entity_by_name(campaign_id: str, name: str) -> Optional[Dict[str, Any]]:
     """根据名称获取实体"""
-    logger.info(f"get_entity_by_name: campaign_id={campaign_id}, name={name}")
-    with get_cursor() as cursor:
+    with get_cursor(readonly=True) as cursor:
         cursor.execute(
             "SELECT * FROM entities WHERE campaign_id = ? AND name = ?",
             (campaign_id, name)
         )
         row = cursor.fetchone()
-        if not row:
-            logger.warning(f"get_entity_by_name: No row found for campaign_id={campaign_id}, name={name}")
-            # 调试：列出该campaign的所有实体
-            cursor.execute("SELECT name FROM entities WHERE campaign_id = ?", (campaign_id,))
-            all_names = [r[0] for r in cursor.fetchall()]
-            logger.info(f"get_entity_by_name: All names in campaign: {all_names}")
-            return None
-        result = dict(row)
-        logger.info(f"get_entity_by_name: Found row, keys={list(result.keys())}")
-        # 解析JSON字段
-        for key in JSON_COLUMNS:
-            if key in result and result[key]:
-                try:
-                    result[key] = json.loads(result[key])
-                except (json.JSONDecodeError, TypeError):
-                    pass
-        return result
+    return _parse_json_columns(dict(row)) if row else None
+
+
+def get_entities_by_ids(campaign_id: str, entity_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """批量根据 entity_id 获取实体（不解析 JSON 字段），返回 {entity_id: entity_data}"""
+    if not entity_ids:
+        return {}
+    with get_cursor(readonly=True) as cursor:
+        placeholders = ", ".join(["?"] * len(entity_ids))
+        cursor.execute(
+            f"SELECT * FROM entities WHERE campaign_id = ? AND entity_id IN ({placeholders})",
+            [campaign_id] + entity_ids
+        )
+        rows = cursor.fetchall()
+    return {row["entity_id"]: dict(row) for row in rows}
+
+
+def rename_entity(campaign_id: str, entity_id: str, name: str) -> None:
+    """
+    图中的实体改名后同步名称；新名称已被其他行占用时保持原样。
+    名称是嵌入文本的一部分，改名后重新加入嵌入队列
+    """
+    with get_cursor() as cursor:
+        cursor.execute(
+            "UPDATE OR IGNORE entities SET name = ?, updated_at = ? WHERE campaign_id = ? AND entity_id = ?",
+            (name, datetime.utcnow().isoformat(), campaign_id, entity_id)
+        )
+        if cursor.rowcount:
+            enqueue_embedding(cursor, "entity", entity_id, campaign_id)
+
+
+def delete_entity_rows(campaign_id: str, entity_id: str) -> None:
+    """图中的实体删除后删除其属性行和别名"""
+    with get_cursor() as cursor:
+        cursor.execute("DELETE FROM entity_aliases WHERE entity_id = ?", (entity_id,))
+        cursor.execute(
+            "DELETE FROM entities WHERE campaign_id = ? AND entity_id = ?",
+            (campaign_id, entity_id)
+        )
+
+
+def load_name_directory(campaign_id: str) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    """战役的 ([(name, entity_id)], [(alias, entity_id)])，用于预热名称目录"""
+    with get_cursor(readonly=True) as cursor:
+        cursor.execute("SELECT name, entity_id FROM entities WHERE campaign_id = ?", (campaign_id,))
+        names = [(row["name"], row["entity_id"]) for row in cursor.fetchall()]
+        cursor.execute("SELECT alias, entity_id FROM entity_aliases WHERE campaign_id = ?", (campaign_id,))
+        aliases = [(row["alias"], row["entity_id"]) for row in cursor.fetchall()]
+    return names, aliases
+
+
+def delete_campaign_entities(campaign_id: str, limit: int) -> int:
+    """删除战役的一批实体及其别名（一个事务），返回删除的实体数"""
+    with get_cursor() as cursor:
+        cursor.execute(
+            "SELECT entity_id FROM entities WHERE campaign_id = ? LIMIT ?",
+            (campaign_id, limit)
+        )
+        entity_ids = [row["entity_id"] for row in cursor.fetchall()]
+        if not entity_ids:
+            return 0
+        placeholders = ", ".join(["?"] * len(entity_ids))
+        cursor.execute(
+            f"DELETE FROM entity_aliases WHERE entity_id IN ({placeholders})",
+            entity_ids
+        )
+        cursor.execute(
+            f"DELETE FROM entities WHERE entity_id IN ({placeholders})",
+            entity_ids
+        )
+    return len(entity_ids)
+
+
+def find_mentioned_entities(campaign_id: str, text: str, limit: int = 10) -> List[str]:
+    """找出名称或别名出现在文本中的实体，名称越长越优先；返回 entity_id 列表"""
+    with get_cursor(readonly=True) as cursor:
+        cursor.execute(
+            """SELECT entity_id, MAX(length(term)) AS matched FROM (
+                   SELECT entity_id, name AS term FROM entities WHERE campaign_id = ?
+                   UNION ALL
+                   SELECT entity_id, alias AS term FROM entity_aliases WHERE campaign_id = ?
+               )
+               WHERE term <> '' AND instr(?, term) > 0
+               GROUP BY entity_id
+               ORDER BY matched DESC
+               LIMIT ?""",
+            (campaign_id, campaign_id, text, limit)
+        )
+        rows = cursor.fetchall()
+    return [row["entity_id"] for row in rows]
+
+
+def search_entities_keyword(
+    campaign_id: str,
+    terms: List[str],
+    limit: int = 10,
+) -> List[str]:
+    """按关键词匹配实体名称与描述，名称命中优先；返回 entity_id 列表"""
+    if not terms:
+        return []
+    name_hits = " + ".join(["(instr(name, ?) > 0)"] * len(terms))
+    text_hits = " + ".join(["(instr(COALESCE(description, ''), ?) > 0)"] * len(terms))
+    with get_cursor(readonly=True) as cursor:
+        cursor.execute(
+            f"""SELECT entity_id, {name_hits} AS name_hits, {text_hits} AS text_hits
+                FROM entities
+                WHERE campaign_id = ? AND name_hits + text_hits > 0
+                ORDER BY name_hits DESC, text_hits DESC, updated_at DESC
+                LIMIT ?""",
+            terms + terms + [campaign_id, limit]
+        )
+        rows = cursor.fetchall()
+    return [row["entity_id"] for row in rows]
@@ -0,0 +1,688 @@
+"""
+Embedded SQLite graph store for tarven-note.
+GraphStore 的嵌入式实现，供单用户部署免去 Neo4j 进程：战役、实体节点和关系存放在
+graph_campaigns / graph_entities / graph_relationships 三张表中（见 sqlite_schema.py），
+与实体属性共用同一个数据库文件。
+
+邻接查询走 from_id / to_id 索引，多跳遍历（子图、路径）由上层在进程内逐层展开。
+删除依赖外键 ON DELETE CASCADE：删除战役即删除其实体，删除实体即删除其关系。
+写操作以 BEGIN IMMEDIATE 开始，先读后写的检查与写入之间不会插入其他写事务。
+"""
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from uuid import uuid4
+
+from server.db.sqlite import get_cursor, ping, run_sqlite
+from server.db.sqlite_schema import GRAPH_INDEXES
+from server.repositories.graph_store import (
+    Adjacency,
+    GraphPlan,
+    GraphStore,
+    IncompleteWrite,
+    SampleMode,
+    sample_edges,
+)
+from server.repositories.utils import deserialize_map, normalize_label, serialize_map
+
+T = TypeVar("T")
+
+GRAPH_TABLES = ["graph_campaigns", "graph_entities", "graph_relationships"]
+GRAPH_INDEX_NAMES = [statement.split()[5] for statement in GRAPH_INDEXES]
+
+CAMPAIGN_COLUMNS = {"name", "system", "description", "status", "metadata", "updated_at"}
+ENTITY_COLUMNS = {"name", "properties", "metadata", "updated_at"}
+
+# 一批实体的邻接边（不区分方向），以 json_each 传入 entity_id 列表；自环只出现一次。
+# +r.campaign_id 让 campaign_id 条件不参与选索引，查询从 from_id / to_id 索引出发
+ADJACENCY_SQL = """
+    SELECT r.from_id AS entity_id, r.relationship_id, r.from_id, r.to_id, r.type, r.properties,
+           r.updated_at, m.entity_id AS other_id, m.name AS other_name, m.type AS other_type
+    FROM graph_relationships AS r
+    JOIN graph_entities AS m ON m.entity_id = r.to_id
+    WHERE r.from_id IN (SELECT value FROM json_each(:entity_ids)) AND +r.campaign_id = :campaign_id
+    UNION ALL
+    SELECT r.to_id AS entity_id, r.relationship_id, r.from_id, r.to_id, r.type, r.properties,
+           r.updated_at, m.entity_id AS other_id, m.name AS other_name, m.type AS other_type
+    FROM graph_relationships AS r
+    JOIN graph_entities AS m ON m.entity_id = r.from_id
+    WHERE r.to_id IN (SELECT value FROM json_each(:entity_ids)) AND +r.campaign_id = :campaign_id
+      AND r.from_id != r.to_id
+"""
+
+# 端点须在同一战役中；同一对端点同一 label 已存在时更新（对应 Neo4j 的 MERGE）
+UPSERT_RELATIONSHIP_SQL = """
+    INSERT INTO graph_relationships
+        (relationship_id, campaign_id, from_id, to_id, label, type, properties, created_at, updated_at)
+    SELECT :relationship_id, :campaign_id, from_entity.entity_id, to_entity.entity_id,
+           :label, :type, :properties, :now, :now
+    FROM graph_entities AS from_entity
+    JOIN graph_entities AS to_entity ON to_entity.entity_id = :to_id
+    WHERE from_entity.entity_id = :from_id
+      AND from_entity.campaign_id = :campaign_id AND to_entity.campaign_id = :campaign_id
+    ON CONFLICT(from_id, to_id, label) DO UPDATE SET
+        type = excluded.type,
+        properties = excluded.properties,
+        updated_at = excluded.updated_at
+    RETURNING relationship_id, from_id, to_id, type, properties, created_at, updated_at
+"""
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+def _datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+def _campaign(row) -> Dict[str, Any]:
+    data = dict(row)
+    data["metadata"] = deserialize_map(data["metadata"])
+    data["created_at"] = _datetime(data["created_at"])
+    data["updated_at"] = _datetime(data["updated_at"])
+    return data
+
+
+def _entity(row) -> Dict[str, Any]:
+    data = {
+        "entity_id": row["entity_id"],
+        "campaign_id": row["campaign_id"],
+        "name": row["name"],
+        "type": row["type"],
+        "created_at": _datetime(row["created_at"]),
+        "updated_at": _datetime(row["updated_at"]),
+    }
+    # 与 Neo4j 节点一致：未写入过的属性不出现
+    for field in ("properties", "metadata"):
+        if row[field] is not None:
+            data[field] = deserialize_map(row[field])
+    return data
+
+
+def _relationship(row) -> Dict[str, Any]:
+    return {
+        "relationship_id": row["relationship_id"],
+        "type": row["type"],
+        "properties": deserialize_map(row["properties"]),
+        "created_at": _datetime(row["created_at"]),
+        "updated_at": _datetime(row["updated_at"]),
+        "from_entity_id": row["from_id"],
+        "to_entity_id": row["to_id"],
+    }
+
+
+def _read(func: Callable[..., T], *args: Any) -> T:
+    with get_cursor(readonly=True) as cursor:
+        return func(cursor, *args)
+
+
+def _write(func: Callable[..., T], *args: Any) -> T:
+    with get_cursor() as cursor:
+        cursor.execute("BEGIN IMMEDIATE")
+        return func(cursor, *args)
+
+
+# 战役
+
+def _insert_campaign(cursor, campaign: Dict[str, Any]) -> Dict[str, Any]:
+    cursor.execute(
+        """
+        INSERT INTO graph_campaigns
+            (campaign_id, name, system, description, status, metadata, created_at, updated_at)
+        VALUES (:campaign_id, :name, :system, :description, :status, :metadata, :created_at, :updated_at)
+        """,
+        campaign,
+    )
+    return _select_campaign(cursor, campaign["campaign_id"])
+
+
+def _select_campaign(cursor, campaign_id: str) -> Optional[Dict[str, Any]]:
+    cursor.execute("SELECT * FROM graph_campaigns WHERE campaign_id = ?", (campaign_id,))
+    row = cursor.fetchone()
+    return _campaign(row) if row else None
+
+
+def _select_campaigns(cursor) -> List[Dict[str, Any]]:
+    cursor.execute("SELECT * FROM graph_campaigns ORDER BY created_at DESC")
+    return [_campaign(row) for row in cursor.fetchall()]
+
+
+def _update_campaign(cursor, campaign_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    columns = [column for column in updates if column in CAMPAIGN_COLUMNS]
+    assignments = ", ".join(f"{column} = :{column}" for column in columns)
+    cursor.execute(
+        f"UPDATE graph_campaigns SET {assignments} WHERE campaign_id = :campaign_id",
+        {**{column: updates[column] for column in columns}, "campaign_id": campaign_id},
+    )
+    if cursor.rowcount == 0:
+        return None
+    return _select_campaign(cursor, campaign_id)
+
+
+def _delete_campaign(cursor, campaign_id: str) -> bool:
+    cursor.execute("DELETE FROM graph_campaigns WHERE campaign_id = ?", (campaign_id,))
+    return cursor.rowcount > 0
+
+
+def _delete_campaign_rows(cursor, table: str, key: str, campaign_id: str, limit: int) -> int:
+    cursor.execute(
+        f"DELETE FROM {table} WHERE {key} IN "
+        f"(SELECT {key} FROM {table} WHERE campaign_id = ? LIMIT ?)",
+        (campaign_id, limit),
+    )
+    return cursor.rowcount
+
+
+def _ensure_campaign(cursor, campaign_id: str) -> Dict[str, Any]:
+    now = _now()
+    cursor.execute(
+        """
+        INSERT INTO graph_campaigns
+            (campaign_id, name, system, description, status, metadata, created_at, updated_at)
+        VALUES (?, ?, 'auto', 'Auto-created campaign', 'active', '{}', ?, ?)
+        ON CONFLICT(campaign_id) DO NOTHING
+        """,
+        (campaign_id, campaign_id, now, now),
+    )
+    return _select_campaign(cursor, campaign_id)
+
+
+# 实体
+
+def _select_entity(cursor, campaign_id: str, entity_id: str) -> Optional[Dict[str, Any]]:
+    cursor.execute(
+        "SELECT * FROM graph_entities WHERE entity_id = ? AND campaign_id = ?",
+        (entity_id, campaign_id),
+    )
+    row = cursor.fetchone()
+    return _entity(row) if row else None
+
+
+def _select_entity_by_name(
+    cursor,
+    campaign_id: str,
+    name: str,
+    entity_type: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    cursor.execute(
+        "SELECT * FROM graph_entities WHERE campaign_id = ? AND name = ?",
+        (campaign_id, name),
+    )
+    row = cursor.fetchone()
+    if row is None or (entity_type and row["type"] != entity_type):
+        return None
+    return _entity(row)
+
+
+def _select_entities(
+    cursor,
+    campaign_id: str,
+    entity_type: Optional[str],
+    name: Optional[str],
+    after: Optional[str],
+    limit: Optional[int],
+) -> List[Dict[str, Any]]:
+    query = "SELECT * FROM graph_entities WHERE campaign_id = ?"
+    params: List[Any] = [campaign_id]
+    if name:
+        query += " AND name = ?"
+        params.append(name)
+    if after is not None:
+        query += " AND name > ?"
+        params.append(after)
+    if entity_type:
+        query += " AND type = ?"
+        params.append(entity_type)
+    # UNIQUE(campaign_id, name) 的索引同时提供范围扫描和顺序
+    query += " ORDER BY name"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    cursor.execute(query, params)
+    return [_entity(row) for row in cursor.fetchall()]
+
+
+def _create_entity(cursor, campaign_id: str, entity_type: str, name: str) -> Dict[str, Any]:
+    now = _now()
+    existing = _select_entity_by_name(cursor, campaign_id, name)
+    if existing:
+        # 仅当现有类型为 Unknown 时更新类型
+        cursor.execute(
+            """
+            UPDATE graph_entities
+            SET updated_at = ?, type = CASE WHEN type = 'Unknown' THEN ? ELSE type END
+            WHERE entity_id = ?
+            """,
+            (now, entity_type, existing["entity_id"]),
+        )
+        return _select_entity(cursor, campaign_id, existing["entity_id"])
+    entity_id = str(uuid4())
+    cursor.execute(
+        """
+        INSERT INTO graph_entities (entity_id, campaign_id, name, type, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (entity_id, campaign_id, name, entity_type, now, now),
+    )
+    return _select_entity(cursor, campaign_id, entity_id)
+
+
+def _update_entity(cursor, campaign_id: str, entity_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    columns = [column for column in updates if column in ENTITY_COLUMNS]
+    assignments = ", ".join(f"{column} = :{column}" for column in columns)
+    cursor.execute(
+        f"UPDATE graph_entities SET {assignments} WHERE entity_id = :entity_id AND campaign_id = :campaign_id",
+        {**{column: updates[column] for column in columns}, "entity_id": entity_id, "campaign_id": campaign_id},
+    )
+    if cursor.rowcount == 0:
+        return None
+    return _select_entity(cursor, campaign_id, entity_id)
+
+
+def _delete_entity(cursor, campaign_id: str, entity_id: str) -> bool:
+    cursor.execute(
+        "DELETE FROM graph_entities WHERE entity_id = ? AND campaign_id = ?",
+        (entity_id, campaign_id),
+    )
+    return cursor.rowcount > 0
+
+
+def _resolve_entity_names(cursor, campaign_id: str, names: List[str]) -> Dict[str, Dict[str, Any]]:
+    if not names:
+        return {}
+    cursor.execute(
+        """
+        SELECT name, entity_id, type FROM graph_entities
+        WHERE campaign_id = ? AND name IN (SELECT value FROM json_each(?))
+        """,
+        (campaign_id, json.dumps(names)),
+    )
+    return {row["name"]: {"entity_id": row["entity_id"], "type": row["type"]} for row in cursor.fetchall()}
+
+
+# 关系
+
+def _upsert_relationship(cursor, campaign_id: str, row: Dict[str, Any], now: str):
+    cursor.execute(
+        UPSERT_RELATIONSHIP_SQL,
+        {
+            "relationship_id": str(uuid4()),
+            "campaign_id": campaign_id,
+            "from_id": row["from_id"],
+            "to_id": row["to_id"],
+            "label": normalize_label(row["type"], prefix="REL", upper=True),
+            "type": row["type"],
+            "properties": serialize_map(row["properties"]),
+            "now": now,
+        },
+    )
+    return cursor.fetchone()
+
+
+def _create_relationship(cursor, campaign_id: str, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    record = _upsert_relationship(cursor, campaign_id, row, _now())
+    return _relationship(record) if record else None
+
+
+def _select_relationships(
+    cursor,
+    campaign_id: str,
+    from_entity_id: Optional[str],
+    to_entity_id: Optional[str],
+    relationship_type: Optional[str],
+    after: Optional[Tuple[str, str]],
+    limit: Optional[int],
+) -> List[Dict[str, Any]]:
+    # 指定端点时从端点索引出发（见 ADJACENCY_SQL），否则走 (campaign_id, [label,] from_id, relationship_id)
+    # 索引，该索引同时提供分页顺序，一页只读取本页的行
+    anchored = from_entity_id or to_entity_id
+    query = f"SELECT * FROM graph_relationships WHERE {'+' if anchored else ''}campaign_id = ?"
+    params: List[Any] = [campaign_id]
+    if from_entity_id:
+        query += " AND from_id = ?"
+        params.append(from_entity_id)
+    if to_entity_id:
+        query += " AND to_id = ?"
+        params.append(to_entity_id)
+    if relationship_type:
+        query += " AND label = ? AND type = ?"
+        params.extend([normalize_label(relationship_type, prefix="REL", upper=True), relationship_type])
+    if after is not None:
+        query += " AND (from_id, relationship_id) > (?, ?)"
+        params.extend(after)
+    query += " ORDER BY from_id, relationship_id"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    cursor.execute(query, params)
+    return [_relationship(row) for row in cursor.fetchall()]
+
+
+def _delete_relationship(cursor, campaign_id: str, relationship_id: str) -> bool:
+    cursor.execute(
+        "DELETE FROM graph_relationships WHERE relationship_id = ? AND campaign_id = ?",
+        (relationship_id, campaign_id),
+    )
+    return cursor.rowcount > 0
+
+
+def _merge_graph(cursor, campaign_id: str, names: List[str], plan: GraphPlan) -> List[Dict[str, Any]]:
+    existing = _resolve_entity_names(cursor, campaign_id, names)
+    entity_rows, relationship_rows = plan(existing)
+    now = _now()
+    cursor.executemany(
+        """
+        INSERT INTO graph_entities (entity_id, campaign_id, name, type, created_at, updated_at)
+        VALUES (:entity_id, :campaign_id, :name, :type, :now, :now)
+        ON CONFLICT(campaign_id, name) DO UPDATE SET
+            updated_at = excluded.updated_at,
+            type = CASE WHEN :set_type THEN excluded.type ELSE graph_entities.type END
+        """,
+        [{**row, "campaign_id": campaign_id, "now": now} for row in entity_rows],
+    )
+    merged = []
+    for row in relationship_rows:
+        record = _upsert_relationship(cursor, campaign_id, row, now)
+        if record is None:
+            raise IncompleteWrite(f"Relationship endpoint missing: {row['from_id']} -> {row['to_id']}")
+        merged.append({
+            "relationship_id": record["relationship_id"],
+            "from_id": record["from_id"],
+            "to_id": record["to_id"],
+            "type": record["type"],
+            "properties": record["properties"],
+        })
+    return merged
+
+
+# 遍历
+
+def _select_adjacency(cursor, campaign_id: str, entity_ids: List[str]) -> List[Dict[str, Any]]:
+    cursor.execute(
+        f"SELECT entity_id, relationship_id, type, other_id, other_name, other_type FROM ({ADJACENCY_SQL})",
+        {"campaign_id": campaign_id, "entity_ids": json.dumps(entity_ids)},
+    )
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def _select_sampled_adjacency(
+    cursor,
+    campaign_id: str,
+    entity_ids: List[str],
+    degree_cap: int,
+    sample: SampleMode,
+) -> Adjacency:
+    # weight 存在序列化的 properties 中，只能取回全部邻接后在 Python 中排序
+    limit = degree_cap if sample == "recent" else None
+    cursor.execute(
+        f"""
+        SELECT * FROM (
+            SELECT *,
+                   ROW_NUMBER() OVER (PARTITION BY entity_id ORDER BY updated_at DESC, relationship_id) AS position,
+                   COUNT(*) OVER (PARTITION BY entity_id) AS degree
+            FROM ({ADJACENCY_SQL})
+        )
+        WHERE :limit IS NULL OR position <= :limit
+        ORDER BY entity_id, position
+        """,
+        {"campaign_id": campaign_id, "entity_ids": json.dumps(entity_ids), "limit": limit},
+    )
+    grouped: Dict[str, Tuple[int, List[Dict[str, Any]]]] = {}
+    for row in cursor.fetchall():
+        entry = grouped.setdefault(row["entity_id"], (row["degree"], []))
+        entry[1].append({
+            key: row[key]
+            for key in (
+                "relationship_id", "from_id", "to_id", "type", "properties",
+                "other_id", "other_name", "other_type",
+            )
+        })
+    return {
+        entity_id: (degree, sample_edges(edges, degree_cap, sample))
+        for entity_id, (degree, edges) in grouped.items()
+    }
+
+
+def _select_neighbours(cursor, campaign_id: str, entity_ids: List[str], limit: int) -> List[Dict[str, Any]]:
+    cursor.execute(
+        f"""
+        SELECT other_id AS entity_id, other_name AS name, other_type AS type,
+               COUNT(DISTINCT entity_id) AS links, json_group_array(DISTINCT type) AS via
+        FROM ({ADJACENCY_SQL})
+        WHERE other_id NOT IN (SELECT value FROM json_each(:entity_ids))
+        GROUP BY other_id
+        ORDER BY links DESC, name ASC
+        LIMIT :limit
+        """,
+        {"campaign_id": campaign_id, "entity_ids": json.dumps(entity_ids), "limit": limit},
+    )
+    rows = []
+    for row in cursor.fetchall():
+        data = dict(row)
+        data["via"] = [rel_type for rel_type in json.loads(data["via"]) if rel_type is not None]
+        rows.append(data)
+    return rows
+
+
+def _select_campaign_graph(cursor, campaign_id: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    cursor.execute(
+        "SELECT entity_id, name, type FROM graph_entities WHERE campaign_id = ?",
+        (campaign_id,),
+    )
+    nodes = [dict(row) for row in cursor.fetchall()]
+    cursor.execute(
+        """
+        SELECT relationship_id, from_id, to_id, type, properties
+        FROM graph_relationships WHERE campaign_id = ?
+        ORDER BY updated_at
+        """,
+        (campaign_id,),
+    )
+    edges = [dict(row) for row in cursor.fetchall()]
+    return nodes, edges
+
+
+def _schema_status(cursor) -> Dict[str, Any]:
+    cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")
+    existing = {row["name"] for row in cursor.fetchall()}
+    table_missing = sorted(set(GRAPH_TABLES) - existing)
+    index_missing = sorted(set(GRAPH_INDEX_NAMES) - existing)
+    return {
+        "backend": "sqlite",
+        "tables": {
+            "expected": GRAPH_TABLES,
+            "present": sorted(set(GRAPH_TABLES) & existing),
+            "missing": table_missing,
+        },
+        "indexes": {
+            "expected": GRAPH_INDEX_NAMES,
+            "present": sorted(set(GRAPH_INDEX_NAMES) & existing),
+            "missing": index_missing,
+        },
+        "ok": not table_missing and not index_missing,
+    }
+
+
+class SqliteGraphStore(GraphStore):
+    name = "sqlite"
+
+    async def apply_schema(self) -> None:
+        # 表和索引随其他 SQLite 表一起由 apply_sqlite_schema 创建
+        return None
+
+    async def close(self) -> None:
+        # 连接由 server.db.sqlite.close_connection 统一关闭
+        return None
+
+    async def ping(self) -> Dict[str, Any]:
+        return await run_sqlite(ping)
+
+    async def schema_status(self) -> Dict[str, Any]:
+        return await run_sqlite(_read, _schema_status)
+
+    # 战役
+
+    async def create_campaign(
+        self,
+        name: str,
+        system: str,
+        description: Optional[str],
+        metadata: Dict[str, Any],
+        campaign_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        now = _now()
+        campaign = {
+            "campaign_id": campaign_id or str(uuid4()),
+            "name": name,
+            "system": system,
+            "description": description,
+            "status": "active",
+            "metadata": serialize_map(metadata),
+            "created_at": now,
+            "updated_at": now,
+        }
+        return await run_sqlite(_write, _insert_campaign, campaign)
+
+    async def list_campaigns(self) -> List[Dict[str, Any]]:
+        return await run_sqlite(_read, _select_campaigns)
+
+    async def get_campaign(self, campaign_id: str) -> Optional[Dict[str, Any]]:
+        return await run_sqlite(_read, _select_campaign, campaign_id)
+
+    async def update_campaign(self, campaign_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        updates = {**updates, "updated_at": _now()}
+        if "metadata" in updates:
+            updates["metadata"] = serialize_map(updates["metadata"])
+        return await run_sqlite(_write, _update_campaign, campaign_id, updates)
+
+    async def delete_campaign(self, campaign_id: str) -> bool:
+        return await run_sqlite(_write, _delete_campaign, campaign_id)
+
+    async def ensure_campaign(self, campaign_id: str) -> Dict[str, Any]:
+        return await run_sqlite(_write, _ensure_campaign, campaign_id)
+
+    async def _delete_campaign_batches(self, table: str, key: str, campaign_id: str, limit: int, batch_size: int) -> int:
+        # 每批一个写事务，批与批之间释放写锁
+        deleted = 0
+        while deleted < limit:
+            count = await run_sqlite(
+                _write, _delete_campaign_rows, table, key, campaign_id, min(batch_size, limit - deleted),
+            )
+            deleted += count
+            if count < batch_size:
+                break
+        return deleted
+
+    async def delete_campaign_relationships(self, campaign_id: str, limit: int, batch_size: int) -> int:
+        return await self._delete_campaign_batches(
+            "graph_relationships", "relationship_id", campaign_id, limit, batch_size,
+        )
+
+    async def delete_campaign_entities(self, campaign_id: str, limit: int, batch_size: int) -> int:
+        # 剩余关系由外键级联删除
+        return await self._delete_campaign_batches("graph_entities", "entity_id", campaign_id, limit, batch_size)
+
+    # 实体
+
+    async def create_entity(self, campaign_id: str, entity_type: str, name: str) -> Dict[str, Any]:
+        return await run_sqlite(_write, _create_entity, campaign_id, entity_type, name)
+
+    async def list_entities(
+        self,
+        campaign_id: str,
+        entity_type: Optional[str] = None,
+        name: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        return await run_sqlite(_read, _select_entities, campaign_id, entity_type, name, after, limit)
+
+    async def get_entity(self, campaign_id: str, entity_id: str) -> Optional[Dict[str, Any]]:
+        return await run_sqlite(_read, _select_entity, campaign_id, entity_id)
+
+    async def get_entity_by_name(
+        self,
+        campaign_id: str,
+        name: str,
+        entity_type: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        return await run_sqlite(_read, _select_entity_by_name, campaign_id, name, entity_type)
+
+    async def update_entity(self, campaign_id: str, entity_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        updates = {**updates, "updated_at": _now()}
+        for field in ("properties", "metadata"):
+            if field in updates:
+                updates[field] = serialize_map(updates[field])
+        return await run_sqlite(_write, _update_entity, campaign_id, entity_id, updates)
+
+    async def delete_entity(self, campaign_id: str, entity_id: str) -> bool:
+        return await run_sqlite(_write, _delete_entity, campaign_id, entity_id)
+
+    async def resolve_entity_names(self, campaign_id: str, names: List[str]) -> Dict[str, Dict[str, Any]]:
+        return await run_sqlite(_read, _resolve_entity_names, campaign_id, names)
+
+    # 关系
+
+    async def create_relationship(
+        self,
+        campaign_id: str,
+        from_entity_id: str,
+        to_entity_id: str,
+        relationship_type: str,
+        properties: Dict[str, Any],
+    ) -> Optional[Dict[str, Any]]:
+        row = {
+            "from_id": from_entity_id,
+            "to_id": to_entity_id,
+            "type": relationship_type,
+            "properties": properties,
+        }
+        return await run_sqlite(_write, _create_relationship, campaign_id, row)
+
+    async def list_relationships(
+        self,
+        campaign_id: str,
+        from_entity_id: Optional[str] = None,
+        to_entity_id: Optional[str] = None,
+        relationship_type: Optional[str] = None,
+        after: Optional[Tuple[str, str]] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        return await run_sqlite(
+            _read, _select_relationships, campaign_id, from_entity_id, to_entity_id, relationship_type, after, limit,
+        )
+
+    async def delete_relationship(self, campaign_id: str, relationship_id: str) -> bool:
+        return await run_sqlite(_write, _delete_relationship, campaign_id, relationship_id)
+
+    # 批量写入
+
+    async def merge_graph(self, campaign_id: str, names: List[str], plan: GraphPlan) -> List[Dict[str, Any]]:
+        return await run_sqlite(_write, _merge_graph, campaign_id, names, plan)
+
+    # 遍历
+
+    async def get_adjacency(self, campaign_id: str, entity_ids: List[str]) -> List[Dict[str, Any]]:
+        if not entity_ids:
+            return []
+        return await run_sqlite(_read, _select_adjacency, campaign_id, entity_ids)
+
+    async def get_sampled_adjacency(
+        self,
+        campaign_id: str,
+        entity_ids: List[str],
+        degree_cap: int,
+        sample: SampleMode = "recent",
+    ) -> Adjacency:
+        if not entity_ids:
+            return {}
+        return await run_sqlite(_read, _select_sampled_adjacency, campaign_id, entity_ids, degree_cap, sample)
+
+    async def get_neighbours(self, campaign_id: str, entity_ids: List[str], limit: int = 20) -> List[Dict[str, Any]]:
+        if not entity_ids:
+            return []
+        return await run_sqlite(_read, _select_neighbours, campaign_id, entity_ids, limit)
+
+    async def load_campaign_graph(self, campaign_id: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        return await run_sqlite(_read, _select_campaign_graph, campaign_id)
@@ -4,10 +4,13 @@ SQLite message repository for tarven-note.
 """
 import json
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 
 from server.db.sqlite import get_cursor
+from server.repositories.sqlite_changes import append_changes
+from server.repositories.sqlite_embedding_queue import enqueue_embedding
+from server.repositories.utils import WORD_RUN, bigram_text
 
 
 def store_message(
@@ -28,6 +31,19 @@ def store_message(
                VALUES (?, ?, ?, ?, ?, ?)""",
             (message_id, campaign_id, role, content, entity_ids_json, now)
         )
+        cursor.execute(
+            "INSERT INTO messages_bigram (rowid, content) VALUES (?, ?)",
+            (cursor.lastrowid, bigram_text(content))
+        )
+        # 嵌入由后台任务完成，这里只标记待嵌入
+        enqueue_embedding(cursor, "message", message_id, campaign_id)
+        append_changes(cursor, campaign_id, [("message", message_id, {
+            "message_id": message_id,
+            "role": role,
+            "content": content,
+            "entity_ids": entity_ids,
+            "created_at": now,
+        })])
     return message_id
 
 
@@ -36,7 +52,7 @@ def get_recent_messages(
     limit: int = 10,
 ) -> List[Dict[str, Any]]:
     """获取最近的消息"""
-    with get_cursor() as cursor:
+    with get_cursor(readonly=True) as cursor:
         cursor.execute(
             """SELECT * FROM messages
                WHERE campaign_id = ?
@@ -46,3 +62,193 @@ def get_recent_messages(
         )
         rows = cursor.fetchall()
     return [dict(row) for row in rows]
+
+
+def get_messages_by_ids(message_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """批量获取消息，返回 {message_id: message}"""
+    if not message_ids:
+        return {}
+    with get_cursor(readonly=True) as cursor:
+        placeholders = ", ".join(["?"] * len(message_ids))
+        cursor.execute(
+            f"SELECT * FROM messages WHERE message_id IN ({placeholders})",
+            message_ids
+        )
+        rows = cursor.fetchall()
+    return {row["message_id"]: dict(row) for row in rows}
+
+
+def delete_campaign_messages(campaign_id: str, limit: int) -> int:
+    """
+    删除战役的一批消息（一个事务），返回删除数量。
+    trigram 索引由触发器同步；二元组索引是无内容表，按原文重新生成索引文本后删除
+    """
+    with get_cursor() as cursor:
+        cursor.execute(
+            "SELECT id, content FROM messages WHERE campaign_id = ? LIMIT ?",
+            (campaign_id, limit)
+        )
+        rows = cursor.fetchall()
+        cursor.executemany(
+            "INSERT INTO messages_bigram (messages_bigram, rowid, content) VALUES ('delete', ?, ?)",
+            [(row["id"], bigram_text(row["content"])) for row in rows]
+        )
+        cursor.executemany("DELETE FROM messages WHERE id = ?", [(row["id"],) for row in rows])
+        return len(rows)
+
+
+# trigram 分词的最短可索引长度，更短的词走二元组索引（messages_bigram）
+FTS_MIN_TERM_LENGTH = 3
+SNIPPET_TOKENS = 40
+SNIPPET_RADIUS = 24
+
+
+def _fts_phrase(term: str) -> str:
+    """把查询词包成 FTS5 短语，避免被解析为语法"""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _split_fts_terms(terms: List[str]) -> Tuple[List[str], List[str]]:
+    long_terms = [t for t in terms if len(t) >= FTS_MIN_TERM_LENGTH]
+    short_terms = [t for t in terms if len(t) < FTS_MIN_TERM_LENGTH]
+    return long_terms, short_terms
+
+
+def _bigram_query(term: str) -> Optional[str]:
+    """
+    短词 → messages_bigram 的查询：2 字词匹配对应二元组，单字词用前缀查询。
+    含标点等非词字符的短词无法用二元组精确表达，返回 None（逐行匹配）
+    """
+    if not WORD_RUN.fullmatch(term):
+        return None
+    return _fts_phrase(term.lower()) + ("*" if len(term) == 1 else "")
+
+
+def _split_short_terms(terms: List[str]) -> Tuple[List[str], List[str]]:
+    """短词 → (二元组查询, 只能逐行匹配的词)"""
+    queries = [q for q in (_bigram_query(t) for t in terms) if q]
+    unindexed = [t for t in terms if _bigram_query(t) is None]
+    return queries, unindexed
+
+
+def _make_snippet(content: str, terms: List[str], start_mark: str, end_mark: str) -> str:
+    """短词回退路径没有 FTS snippet()，按首个命中位置截取片段"""
+    positions = [content.find(t) for t in terms if t in content]
+    if not positions:
+        return content[:SNIPPET_RADIUS * 2]
+    first = min(positions)
+    begin = max(0, first - SNIPPET_RADIUS)
+    end = min(len(content), first + SNIPPET_RADIUS)
+    window = content[begin:end]
+    for term in terms:
+        window = window.replace(term, f"{start_mark}{term}{end_mark}")
+    return ("…" if begin > 0 else "") + window + ("…" if end < len(content) else "")
+
+
+def search_messages(
+    campaign_id: str,
+    terms: List[str],
+    limit: int = 20,
+    offset: int = 0,
+    start_mark: str = "<mark>",
+    end_mark: str = "</mark>",
+) -> List[Dict[str, Any]]:
+    """
+    全文检索消息（所有词都须命中），按 BM25 排序并返回高亮片段。
+    3 字及以上的词走 trigram 索引，1~2 字的词走二元组索引；有长词时按 trigram 排序，
+    短词作为附加过滤条件。只有无法进入二元组索引的短词时退化为战役内扫描，按时间倒序。
+    """
+    if not terms:
+        return []
+    long_terms, short_terms = _split_fts_terms(terms)
+    bigram_queries, unindexed = _split_short_terms(short_terms)
+    filters = "".join(" AND instr(m.content, ?) > 0" for _ in unindexed)
+
+    with get_cursor(readonly=True) as cursor:
+        if long_terms:
+            if bigram_queries:
+                filters += " AND m.id IN (SELECT rowid FROM messages_bigram WHERE messages_bigram MATCH ?)"
+            cursor.execute(
+                f"""SELECT m.message_id, m.role, m.content, m.created_at,
+                           -bm25(messages_fts) AS score,
+                           snippet(messages_fts, 0, ?, ?, '…', ?) AS snippet
+                    FROM messages_fts
+                    JOIN messages m ON m.id = messages_fts.rowid
+                    WHERE messages_fts MATCH ? AND m.campaign_id = ?{filters}
+                    ORDER BY bm25(messages_fts)
+                    LIMIT ? OFFSET ?""",
+                [start_mark, end_mark, SNIPPET_TOKENS,
+                 " AND ".join(_fts_phrase(t) for t in long_terms), campaign_id]
+                + unindexed
+                + ([" AND ".join(bigram_queries)] if bigram_queries else [])
+                + [limit, offset]
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+        if bigram_queries:
+            # 无内容表没有 snippet()，片段在 Python 中截取
+            cursor.execute(
+                f"""SELECT m.message_id, m.role, m.content, m.created_at,
+                           -bm25(messages_bigram) AS score
+                    FROM messages_bigram
+                    JOIN messages m ON m.id = messages_bigram.rowid
+                    WHERE messages_bigram MATCH ? AND m.campaign_id = ?{filters}
+                    ORDER BY bm25(messages_bigram)
+                    LIMIT ? OFFSET ?""",
+                [" AND ".join(bigram_queries), campaign_id] + unindexed + [limit, offset]
+            )
+        else:
+            cursor.execute(
+                f"""SELECT m.message_id, m.role, m.content, m.created_at, 0.0 AS score
+                    FROM messages m
+                    WHERE m.campaign_id = ?{filters}
+                    ORDER BY m.created_at DESC
+                    LIMIT ? OFFSET ?""",
+                [campaign_id] + unindexed + [limit, offset]
+            )
+        rows = [dict(row) for row in cursor.fetchall()]
+    for row in rows:
+        row["snippet"] = _make_snippet(row["content"], short_terms, start_mark, end_mark)
+    return rows
+
+
+def search_messages_keyword(
+    campaign_id: str,
+    terms: List[str],
+    limit: int = 10,
+) -> List[str]:
+    """召回用的关键词检索：任一词命中即可，按 BM25 排序；返回 message_id 列表"""
+    if not terms:
+        return []
+    long_terms, short_terms = _split_fts_terms(terms)
+    bigram_queries, unindexed = _split_short_terms(short_terms)
+    with get_cursor(readonly=True) as cursor:
+        if long_terms:
+            cursor.execute(
+                """SELECT m.message_id FROM messages_fts
+                   JOIN messages m ON m.id = messages_fts.rowid
+                   WHERE messages_fts MATCH ? AND m.campaign_id = ?
+                   ORDER BY bm25(messages_fts)
+                   LIMIT ?""",
+                (" OR ".join(_fts_phrase(t) for t in long_terms), campaign_id, limit)
+            )
+        elif bigram_queries:
+            cursor.execute(
+                """SELECT m.message_id FROM messages_bigram
+                   JOIN messages m ON m.id = messages_bigram.rowid
+                   WHERE messages_bigram MATCH ? AND m.campaign_id = ?
+                   ORDER BY bm25(messages_bigram)
+                   LIMIT ?""",
+                (" OR ".join(bigram_queries), campaign_id, limit)
+            )
+        else:
+            hits = " + ".join(["(instr(content, ?) > 0)"] * len(unindexed))
+            cursor.execute(
+                f"""SELECT message_id, {hits} AS hits FROM messages
+                    WHERE campaign_id = ? AND hits > 0
+                    ORDER BY hits DESC, created_at DESC
+                    LIMIT ?""",
+                unindexed + [campaign_id, limit]
+            )
+        rows = cursor.fetchall()
+    return [row["message_id"] for row in rows]
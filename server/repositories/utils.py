@@ -1,9 +1,15 @@
+import base64
+import binascii
 import json
 import re
-from typing import Any, Dict, Iterable
+from typing import Any, Dict, Iterable, List
 
 
 LABEL_PATTERN = re.compile(r"^[A-Za-z][A-Za-z0-9_]*$")
+# 二元组索引的切分单位：连续的字母 / 数字，与 FTS5 unicode61 分词的词字符一致
+WORD_RUN = re.compile(r"[^\W_]+")
+# 关键词分隔符：空白与中英文标点
+TERM_SPLIT = re.compile(r"[\s,，。.!！?？;；:：、\"'“”‘’()（）\[\]【】]+")
 
 
 def normalize_label(value: str, prefix: str, upper: bool = False) -> str:
@@ -18,6 +24,23 @@ def normalize_label(value: str, prefix: str, upper: bool = False) -> str:
     return cleaned
 
 
+def split_terms(query: str) -> List[str]:
+    """按空白和标点切分关键词，去重并保持顺序"""
+    return list(dict.fromkeys(term for term in TERM_SPLIT.split(query) if term))
+
+
+def bigram_text(text: str) -> str:
+    """
+    文本 → 空格分隔的二元组，每段末字另外单独成词（见 messages_bigram）。
+    2 字词对应一个二元组，单字词用前缀查询即可命中该字的所有出现位置
+    """
+    tokens: List[str] = []
+    for run in WORD_RUN.findall(text.lower()):
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        tokens.append(run[-1])
+    return " ".join(tokens)
+
+
 def serialize_map(value: Any) -> str:
     if value is None:
         return json.dumps({})
@@ -65,3 +88,21 @@ def relationship_to_dict(rel: Any, map_fields: Iterable[str]) -> Dict[str, Any]:
         if field in data:
             data[field] = _normalize_datetime(data[field])
     return data
+
+
+def encode_cursor(value: Dict[str, Any]) -> str:
+    """分页游标：JSON 的 URL 安全 base64，对客户端不透明"""
+    raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """解析 encode_cursor 的结果，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise ValueError("invalid cursor") from exc
+    if not isinstance(value, dict):
+        raise ValueError("invalid cursor")
+    return value
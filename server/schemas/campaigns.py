@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -29,3 +29,28 @@ class CampaignResponse(BaseModel):
     metadata: Dict[str, Any]
     created_at: datetime
     updated_at: datetime
+
+
+class CampaignDeletionStatus(BaseModel):
+    campaign_id: str
+    status: str  # running | completed | failed
+    stage: Optional[str] = None  # 正在删除的数据，见 services/campaign_deletion.py
+    deleted: Dict[str, int] = Field(default_factory=dict)  # 各阶段已删除的行数
+    error: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+
+
+class CampaignChange(BaseModel):
+    version: int
+    kind: str  # entity | relationship | message
+    id: str
+    op: str  # upsert | delete；删除实体时其关系一并删除，不单独记录
+    data: Optional[Dict[str, Any]] = None  # upsert 时为写入后的记录
+
+
+class CampaignChanges(BaseModel):
+    version: int  # 下一次请求的 since
+    reset: bool = False  # since 已不在日志范围内，需全量重新拉取后从 version 继续
+    has_more: bool = False
+    changes: List[CampaignChange] = Field(default_factory=list)
@@ -1,13 +1,18 @@
 from typing import List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class PathResponse(BaseModel):
     nodes: List[str]
     relationships: List[str]
     hops: int
+    node_ids: List[str] = Field(default_factory=list)
+    relationship_ids: List[str] = Field(default_factory=list)
 
 
 class PathsResponse(BaseModel):
     paths: List[PathResponse]
+    # 时间预算耗尽，paths 只包含已找到的部分
+    partial: bool = False
+    elapsed_ms: float = 0.0
@@ -0,0 +1,33 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class RecallItem(BaseModel):
+    ref_type: str  # message | entity
+    ref_id: str
+    score: float
+    # 各检索路径中的名次（从 1 开始），未命中的路径不出现
+    ranks: Dict[str, int] = Field(default_factory=dict)
+    # message
+    role: Optional[str] = None
+    content: Optional[str] = None
+    created_at: Optional[str] = None
+    # entity
+    name: Optional[str] = None
+    type: Optional[str] = None
+    description: Optional[str] = None
+
+
+class RecallStage(BaseModel):
+    status: str  # ok | skipped | timeout | error
+    elapsed_ms: float
+    hits: int = 0
+    error: Optional[str] = None
+
+
+class RecallResponse(BaseModel):
+    query: str
+    items: List[RecallItem]
+    stages: Dict[str, RecallStage]
+    elapsed_ms: float
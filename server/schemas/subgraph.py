@@ -1,4 +1,4 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -21,3 +21,7 @@ class SubgraphEdge(BaseModel):
 class SubgraphResponse(BaseModel):
     nodes: List[SubgraphNode]
     edges: List[SubgraphEdge]
+    # 邻居被采样截断的节点
+    sampled: List[str] = Field(default_factory=list)
+    truncated: bool = False
+    next_cursor: Optional[str] = None
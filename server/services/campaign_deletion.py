@@ -0,0 +1,171 @@
+"""
+Background campaign deletion for tarven-note.
+删除战役在后台分批进行，接口立即返回：先把战役标记为 deleting，再按阶段依次删除
+图中的关系和实体、SQLite 中的嵌入队列、实体与别名、消息、向量映射和变更日志，
+最后移除段文件和战役本身。
+
+每一批都是独立的短事务（Neo4j 为 CALL { } IN TRANSACTIONS），大战役不会触及
+事务内存上限，也不会长时间持有锁。进度只保存在本进程内；任务失败或进程重启后
+再次发起删除即可从剩余数据继续。
+"""
+import asyncio
+import contextvars
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from server.core.config import settings
+from server.db import entity_directory, graph_cache
+from server.db.sqlite import run_sqlite
+from server.db.vector import delete_campaign_embeddings, drop_campaign_segments
+from server.repositories.campaigns import delete_campaign, get_campaign, update_campaign
+from server.repositories.graph_store import get_graph_store
+from server.repositories.sqlite_changes import delete_campaign_changes
+from server.repositories.sqlite_embedding_queue import delete_campaign_items
+from server.repositories.sqlite_entities import delete_campaign_entities
+from server.repositories.sqlite_messages import delete_campaign_messages
+
+logger = logging.getLogger(__name__)
+
+# 图存储每轮删除的批数：每轮结束更新一次进度
+GRAPH_BATCHES_PER_ROUND = 10
+# 保留的已结束任务数，超出后丢弃最早的
+MAX_FINISHED_JOBS = 256
+
+_jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+async def _delete_graph_relationships(campaign_id: str, batch_size: int) -> int:
+    return await get_graph_store().delete_campaign_relationships(
+        campaign_id, batch_size * GRAPH_BATCHES_PER_ROUND, batch_size,
+    )
+
+
+async def _delete_graph_entities(campaign_id: str, batch_size: int) -> int:
+    return await get_graph_store().delete_campaign_entities(
+        campaign_id, batch_size * GRAPH_BATCHES_PER_ROUND, batch_size,
+    )
+
+
+async def _delete_embedding_queue(campaign_id: str, batch_size: int) -> int:
+    return await run_sqlite(delete_campaign_items, campaign_id)
+
+
+async def _delete_sqlite_entities(campaign_id: str, batch_size: int) -> int:
+    return await run_sqlite(delete_campaign_entities, campaign_id, batch_size)
+
+
+async def _delete_messages(campaign_id: str, batch_size: int) -> int:
+    return await run_sqlite(delete_campaign_messages, campaign_id, batch_size)
+
+
+async def _delete_embeddings(campaign_id: str, batch_size: int) -> int:
+    return await run_sqlite(delete_campaign_embeddings, campaign_id, batch_size)
+
+
+async def _delete_change_log(campaign_id: str, batch_size: int) -> int:
+    return await run_sqlite(delete_campaign_changes, campaign_id, batch_size)
+
+
+# (阶段名, 删除一轮并返回删除数量)；返回 0 时进入下一阶段。
+# 嵌入队列先于源数据删除，后台嵌入任务不会再为该战役写入向量
+STAGES: List[Tuple[str, Callable[[str, int], Awaitable[int]]]] = [
+    ("graph_relationships", _delete_graph_relationships),
+    ("graph_entities", _delete_graph_entities),
+    ("embedding_queue", _delete_embedding_queue),
+    ("entities", _delete_sqlite_entities),
+    ("messages", _delete_messages),
+    ("embeddings", _delete_embeddings),
+    ("change_log", _delete_change_log),
+]
+
+
+async def _run(job: Dict[str, Any]) -> None:
+    campaign_id = job["campaign_id"]
+    batch_size = settings.campaign_delete_batch_size
+    try:
+        for stage, delete_batch in STAGES:
+            job["stage"] = stage
+            job["deleted"].setdefault(stage, 0)
+            while True:
+                deleted = await delete_batch(campaign_id, batch_size)
+                if not deleted:
+                    break
+                job["deleted"][stage] += deleted
+            if stage == "graph_entities":
+                graph_cache.drop_campaign(campaign_id)
+            elif stage == "entities":
+                entity_directory.drop_campaign(campaign_id)
+        job["stage"] = "segments"
+        job["deleted"]["segments"] = await run_sqlite(drop_campaign_segments, campaign_id)
+        job["stage"] = "campaign"
+        await delete_campaign(campaign_id)
+        job["stage"] = None
+        job["status"] = "completed"
+        logger.info(f"Deleted campaign {campaign_id}: {job['deleted']}")
+    except asyncio.CancelledError:
+        job["status"] = "failed"
+        job["error"] = "cancelled"
+        raise
+    except Exception as exc:
+        logger.exception(f"Failed to delete campaign {campaign_id} at stage {job['stage']}")
+        job["status"] = "failed"
+        job["error"] = str(exc)
+    finally:
+        job["finished_at"] = datetime.utcnow()
+        _tasks.pop(campaign_id, None)
+        _prune_jobs()
+
+
+def _prune_jobs() -> None:
+    finished = [campaign_id for campaign_id, job in _jobs.items() if job["status"] != "running"]
+    for campaign_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        del _jobs[campaign_id]
+
+
+async def start_campaign_deletion(campaign_id: str) -> Optional[Dict[str, Any]]:
+    """
+    在后台删除战役，返回任务状态；同一战役已有任务在运行时直接返回该任务。
+    战役不存在且没有任务时返回 None
+    """
+    job = _jobs.get(campaign_id)
+    if job is not None and job["status"] == "running":
+        return job
+    campaign = await get_campaign(campaign_id)
+    if not campaign:
+        return None
+    # 标记后战役仍可读取，删除完成前 status 为 deleting
+    await update_campaign(campaign_id, {"status": "deleting"})
+    job = {
+        "campaign_id": campaign_id,
+        "status": "running",
+        "stage": None,
+        "deleted": {},
+        "error": None,
+        "started_at": datetime.utcnow(),
+        "finished_at": None,
+    }
+    _jobs[campaign_id] = job
+    _jobs.move_to_end(campaign_id)
+    # 在空白上下文中运行：任务比请求活得久，不能继承请求作用域（如 Neo4j 的请求会话，
+    # 响应发出后即被关闭），每次访问图存储各自开会话
+    _tasks[campaign_id] = asyncio.get_running_loop().create_task(_run(job), context=contextvars.Context())
+    return job
+
+
+def get_deletion_status(campaign_id: str) -> Optional[Dict[str, Any]]:
+    return _jobs.get(campaign_id)
+
+
+async def stop_deletion_jobs() -> None:
+    """关闭时取消进行中的删除；已删除的批次不会回滚，再次删除时继续"""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
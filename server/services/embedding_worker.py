@@ -0,0 +1,161 @@
+"""
+Background embedding worker for tarven-note.
+消费 embedding_queue：批量获取嵌入并写入向量索引，不占用请求路径。
+队列持久化在 SQLite 中，重启后从未完成的位置继续。
+"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from server.core.config import settings
+from server.db.sqlite import run_sqlite
+from server.db.vector import clear_embeddings, store_embedding
+from server.repositories import sqlite_embedding_queue as queue
+from server.services.embeddings import embed_texts
+
+logger = logging.getLogger(__name__)
+
+# 队列为空或嵌入接口未配置时的轮询间隔（秒）
+IDLE_INTERVAL = 30.0
+# 失败重试的基础退避时间（秒），按尝试次数指数增长
+RETRY_BACKOFF = 5.0
+
+_task: Optional[asyncio.Task] = None
+_wakeup: Optional[asyncio.Event] = None
+_stats: Dict[str, Any] = {
+    "embedded": 0,
+    "failed": 0,
+    "last_error": None,
+}
+
+
+def _model_signature() -> str:
+    return f"{settings.embedding_model}:{settings.embedding_dim}"
+
+
+def prepare_embedding_queue() -> None:
+    """
+    启动时调用：嵌入模型或维度变化时清空全部向量并重新嵌入；
+    再把尚无向量的消息 / 实体补进队列（首次启用、历史数据）。
+    """
+    signature = _model_signature()
+    previous = queue.get_state("model")
+    if previous is not None and previous != signature:
+        logger.info(f"Embedding model changed ({previous} -> {signature}), re-embedding everything")
+        clear_embeddings()
+        queue.clear_queue()
+    queue.set_state("model", signature)
+
+    added = queue.enqueue_missing()
+    if previous != signature:
+        queue.set_state("reembed_total", str(queue.count_pending()["queued"]))
+    if added:
+        logger.info(f"Queued {added} messages/entities for embedding")
+
+
+def notify_worker() -> None:
+    """有新的待嵌入数据时唤醒后台任务"""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+async def _process_batch() -> int:
+    """处理一批队列项，返回处理数量（0 表示没有可处理的项或接口未配置）"""
+    items = await run_sqlite(queue.fetch_pending, settings.embedding_batch_size)
+    if not items:
+        return 0
+
+    # 源数据已删除或没有可嵌入的文本：直接出队
+    empty = [item for item in items if not item["text"]]
+    if empty:
+        await run_sqlite(queue.complete, empty)
+    items = [item for item in items if item["text"]]
+    if not items:
+        return len(empty)
+
+    try:
+        embeddings = await embed_texts([item["text"] for item in items])
+    except Exception as exc:
+        _stats["failed"] += len(items)
+        _stats["last_error"] = str(exc)
+        await run_sqlite(queue.fail, items, str(exc), RETRY_BACKOFF)
+        return len(empty) + len(items)
+    if embeddings is None:
+        return 0
+
+    def store() -> None:
+        done, failed = [], []
+        for item, embedding in zip(items, embeddings):
+            try:
+                store_embedding(item["ref_type"], item["ref_id"], embedding, campaign_id=item["campaign_id"])
+                done.append(item)
+            except Exception as exc:
+                logger.exception(f"Failed to store embedding for {item['ref_type']}/{item['ref_id']}")
+                failed.append(item)
+                _stats["last_error"] = str(exc)
+        queue.complete(done)
+        if failed:
+            queue.fail(failed, _stats["last_error"], RETRY_BACKOFF)
+        _stats["embedded"] += len(done)
+        _stats["failed"] += len(failed)
+
+    await run_sqlite(store)
+    return len(empty) + len(items)
+
+
+async def _run() -> None:
+    while True:
+        _wakeup.clear()
+        try:
+            processed = await _process_batch()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            logger.exception("Embedding worker iteration failed")
+            _stats["last_error"] = str(exc)
+            processed = 0
+        if processed:
+            continue
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=IDLE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_embedding_worker() -> None:
+    global _task, _wakeup
+    if _task is not None and not _task.done():
+        return
+    _wakeup = asyncio.Event()
+    _task = asyncio.get_running_loop().create_task(_run())
+
+
+async def stop_embedding_worker() -> None:
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
+
+
+def get_embedding_status() -> Dict[str, Any]:
+    pending = queue.count_pending()
+    total = int(queue.get_state("reembed_total") or 0)
+    return {
+        "model": settings.embedding_model,
+        "dim": settings.embedding_dim,
+        "running": _task is not None and not _task.done(),
+        "queued": pending["queued"],
+        "failing": pending["failing"],
+        "reembed": {
+            "total": total,
+            "done": max(0, total - pending["queued"]),
+        },
+        "embedded": _stats["embedded"],
+        "failed": _stats["failed"],
+        "last_error": _stats["last_error"],
+    }
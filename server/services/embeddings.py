@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import logging
+from typing import Dict, List, Optional, Set
+
+import httpx
+
+from server.core.config import settings
+from server.db.sqlite import run_sqlite
+from server.repositories.sqlite_embedding_cache import (
+    get_cached_embeddings,
+    store_cached_embeddings,
+)
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+# text_hash -> 等待结果的共享 future（排队中或请求中），相同文本只请求一次
+_futures: Dict[str, asyncio.Future] = {}
+# text_hash -> text，尚未发出的排队项（按加入顺序）
+_pending: Dict[str, str] = {}
+_flush_handle: Optional[asyncio.TimerHandle] = None
+# 进行中的 flush 任务：事件循环只持有任务的弱引用，需要在这里保留，关闭时等待
+_flush_tasks: Set[asyncio.Task] = set()
+
+
+def _base_url() -> str:
+    return settings.embedding_base_url or settings.llm_base_url
+
+
+def _api_key() -> str:
+    return settings.embedding_api_key or settings.llm_api_key
+
+
+def _is_configured() -> bool:
+    return bool(_base_url() and _api_key() and settings.embedding_model)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def get_client() -> httpx.AsyncClient:
+    """进程内共享的连接池客户端"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=_base_url(),
+            timeout=settings.embedding_timeout,
+            limits=httpx.Limits(max_connections=8, max_keepalive_connections=8),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client, _flush_handle
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+        _flush_handle = None
+    # 等待已发出的批量请求，结果写入缓存后再关闭连接
+    if _flush_tasks:
+        await asyncio.gather(*_flush_tasks, return_exceptions=True)
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _request_embeddings(texts: List[str]) -> List[List[float]]:
+    response = await get_client().post(
+        "/v1/embeddings",
+        headers={"Authorization": f"Bearer {_api_key()}"},
+        json={"model": settings.embedding_model, "input": texts, "dimensions": settings.embedding_dim},
+    )
+    response.raise_for_status()
+    data = sorted(response.json()["data"], key=lambda item: item["index"])
+    embeddings = [item["embedding"] for item in data]
+    if len(embeddings) != len(texts):
+        raise ValueError(f"Embedding API returned {len(embeddings)} vectors for {len(texts)} inputs")
+    if embeddings and len(embeddings[0]) != settings.embedding_dim:
+        logger.warning(
+            f"Embedding dim {len(embeddings[0])} from {settings.embedding_model} "
+            f"does not match settings.embedding_dim={settings.embedding_dim}"
+        )
+    return embeddings
+
+
+def _on_flush_done(task: asyncio.Task) -> None:
+    _flush_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Embedding flush failed", exc_info=task.exception())
+
+
+def _start_flush() -> None:
+    task = asyncio.get_running_loop().create_task(_flush())
+    _flush_tasks.add(task)
+    task.add_done_callback(_on_flush_done)
+
+
+def _schedule_flush() -> None:
+    """攒够一批立即发送，否则等待 embedding_batch_wait_ms 后发送"""
+    global _flush_handle
+    loop = asyncio.get_running_loop()
+    if len(_pending) >= settings.embedding_batch_size:
+        if _flush_handle is not None:
+            _flush_handle.cancel()
+            _flush_handle = None
+        _start_flush()
+    elif _pending and _flush_handle is None:
+        _flush_handle = loop.call_later(settings.embedding_batch_wait_ms / 1000, _start_flush)
+
+
+async def _flush() -> None:
+    global _flush_handle
+    if _flush_handle is not None:
+        _flush_handle.cancel()
+        _flush_handle = None
+
+    batch: Dict[str, str] = {}
+    for key in list(_pending)[:settings.embedding_batch_size]:
+        batch[key] = _pending.pop(key)
+    if not batch:
+        return
+    # 剩余排队项交给下一次 flush，多个批次可以并发请求
+    _schedule_flush()
+
+    model, dim = settings.embedding_model, settings.embedding_dim
+    try:
+        embeddings = await _request_embeddings(list(batch.values()))
+    except Exception as exc:
+        logger.warning(f"Embedding request for {len(batch)} texts failed: {exc}")
+        for key in batch:
+            future = _futures.pop(key, None)
+            if future is not None and not future.done():
+                future.set_exception(exc)
+        return
+
+    try:
+        await run_sqlite(store_cached_embeddings, model, dim, list(zip(batch.keys(), embeddings)))
+    except Exception:
+        logger.exception("Failed to persist embedding cache")
+    for key, embedding in zip(batch.keys(), embeddings):
+        future = _futures.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(embedding)
+
+
+async def embed_texts(texts: List[str]) -> Optional[List[List[float]]]:
+    """
+    获取一组文本的嵌入；未配置嵌入接口时返回 None。
+    先查 SQLite 缓存，未命中的文本与其他并发调用合并成批量请求。
+    """
+    if not _is_configured():
+        return None
+    if not texts:
+        return []
+
+    hashes = [text_hash(text) for text in texts]
+    results = await run_sqlite(
+        get_cached_embeddings, settings.embedding_model, settings.embedding_dim, list(dict.fromkeys(hashes)),
+    )
+
+    loop = asyncio.get_running_loop()
+    waiting: Dict[str, asyncio.Future] = {}
+    for text, key in zip(texts, hashes):
+        if key in results or key in waiting:
+            continue
+        future = _futures.get(key)
+        if future is None:
+            future = loop.create_future()
+            _futures[key] = future
+            _pending[key] = text
+        waiting[key] = future
+
+    if waiting:
+        _schedule_flush()
+        # shield：某个调用方被取消时，不影响共享同一 future 的其他调用方
+        embeddings = await asyncio.gather(*(asyncio.shield(f) for f in waiting.values()))
+        results.update(zip(waiting.keys(), embeddings))
+
+    return [results[key] for key in hashes]
+
+
+async def embed_text(text: str) -> Optional[List[float]]:
+    embeddings = await embed_texts([text])
+    return embeddings[0] if embeddings is not None else None
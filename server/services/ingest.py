@@ -0,0 +1,204 @@
+"""
+Batched ingest for tarven-note.
+一次 ingest 只需要常数次往返：图存储中的名称解析、实体 MERGE、关系 MERGE
+在同一个写事务里完成（GraphStore.merge_graph）；SQLite 的实体属性随后用 executemany 一次写入。
+写入前先用名称目录把别名替换为规范名称，别名不会被当作新实体创建。
+"""
+from typing import Any, Dict, List, Tuple
+from uuid import uuid4
+
+from server.db import entity_directory, graph_cache
+from server.db.sqlite import run_sqlite
+from server.repositories.graph_store import IncompleteWrite, get_graph_store
+from server.repositories.sqlite_changes import entity_change, record_changes, relationship_change
+from server.repositories.sqlite_entities import upsert_entities
+from server.repositories.utils import deserialize_map, normalize_label
+from server.schemas.ingest import IngestRequest
+from server.services.normalizer import normalize_entity_type
+
+
+class IngestError(Exception):
+    """关系端点未能写入（实体缺失）"""
+
+
+def _plan_entities(
+    payload: IngestRequest,
+    existing: Dict[str, Dict[str, Any]],
+) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    按逐条 create_entity 的语义规划实体写入：已存在的实体沿用 entity_id，
+    仅当现有类型为 Unknown 时更新类型；关系中出现的未知名称以 Unknown 创建。
+    返回 (name → Neo4j 行, SQLite upsert 条目)
+    """
+    rows: Dict[str, Dict[str, Any]] = {}
+    sqlite_items: List[Dict[str, Any]] = []
+
+    def plan(name: str, entity_type: str) -> Dict[str, Any]:
+        row = rows.get(name)
+        if row is not None:
+            if row["type"] == "Unknown":
+                row.update(type=entity_type, set_type=True)
+            return row
+        found = existing.get(name)
+        if found is not None:
+            row = {
+                "name": name,
+                "entity_id": found["entity_id"],
+                "type": entity_type if found["type"] == "Unknown" else found["type"],
+                "set_type": found["type"] == "Unknown",
+            }
+        else:
+            row = {"name": name, "entity_id": str(uuid4()), "type": entity_type, "set_type": True}
+        rows[name] = row
+        return row
+
+    for entity in payload.entities:
+        entity_type = normalize_entity_type(entity.type)
+        row = plan(entity.name, entity_type)
+        sqlite_items.append({
+            "entity_id": row["entity_id"],
+            "entity_type": entity_type,
+            "name": entity.name,
+            "properties": entity.properties,
+            "metadata": entity.metadata,
+        })
+
+    for relationship in payload.relationships:
+        for name in (relationship.from_entity_name, relationship.to_entity_name):
+            if name in rows:
+                continue
+            if name in existing:
+                # 已存在且未出现在 entities 中：只解析 ID，不改写节点
+                rows[name] = {"name": name, "entity_id": existing[name]["entity_id"], "skip": True}
+                continue
+            row = plan(name, "Unknown")
+            sqlite_items.append({
+                "entity_id": row["entity_id"],
+                "entity_type": "Unknown",
+                "name": name,
+                "properties": {},
+                "metadata": None,
+            })
+    return rows, sqlite_items
+
+
+async def _canonicalize(campaign_id: str, payload: IngestRequest) -> IngestRequest:
+    """把 payload 中属于已知别名的名称替换为实体的规范名称"""
+    names = {entity.name for entity in payload.entities}
+    for relationship in payload.relationships:
+        names.update((relationship.from_entity_name, relationship.to_entity_name))
+    mapping = await entity_directory.canonical_names(campaign_id, names)
+    if not mapping:
+        return payload
+    return payload.model_copy(update={
+        "entities": [
+            entity.model_copy(update={"name": mapping.get(entity.name, entity.name)})
+            for entity in payload.entities
+        ],
+        "relationships": [
+            relationship.model_copy(update={
+                "from_entity_name": mapping.get(relationship.from_entity_name, relationship.from_entity_name),
+                "to_entity_name": mapping.get(relationship.to_entity_name, relationship.to_entity_name),
+            })
+            for relationship in payload.relationships
+        ],
+    })
+
+
+def _plan_relationships(payload: IngestRequest, rows: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    planned = []
+    for relationship in payload.relationships:
+        from_id = rows[relationship.from_entity_name]["entity_id"]
+        to_id = rows[relationship.to_entity_name]["entity_id"]
+        planned.append({
+            "from_id": from_id,
+            "to_id": to_id,
+            "type": relationship.type,
+            "properties": relationship.properties,
+        })
+        # 如果是双向关系，创建反向关系（未指定 reverse_type 时沿用 type）
+        if relationship.bidirectional:
+            planned.append({
+                "from_id": to_id,
+                "to_id": from_id,
+                "type": relationship.reverse_type or relationship.type,
+                "properties": relationship.properties,
+            })
+    return planned
+
+
+async def ingest(campaign_id: str, payload: IngestRequest) -> Dict[str, int]:
+    """批量写入实体与关系；返回与 IngestResponse 一致的计数"""
+    store = get_graph_store()
+    payload = await _canonicalize(campaign_id, payload)
+    rel_types = set()
+    for relationship in payload.relationships:
+        rel_types.add(relationship.type)
+        if relationship.bidirectional:
+            rel_types.add(relationship.reverse_type or relationship.type)
+    await store.prepare_relationship_types(
+        normalize_label(rel_type, prefix="REL", upper=True) for rel_type in rel_types
+    )
+
+    names = [entity.name for entity in payload.entities]
+    for relationship in payload.relationships:
+        names.extend((relationship.from_entity_name, relationship.to_entity_name))
+    planned: Dict[str, Any] = {}
+
+    def plan(existing: Dict[str, Dict[str, Any]]):
+        # 在写事务内执行，事务重试时重新规划
+        rows, sqlite_items = _plan_entities(payload, existing)
+        planned.update(rows=rows, sqlite_items=sqlite_items)
+        entity_rows = [
+            {key: row[key] for key in ("name", "entity_id", "type", "set_type")}
+            for row in rows.values() if not row.get("skip")
+        ]
+        return entity_rows, _plan_relationships(payload, rows)
+
+    try:
+        merged = await store.merge_graph(campaign_id, list(dict.fromkeys(names)), plan)
+    except IncompleteWrite as exc:
+        raise IngestError(str(exc))
+    rows, sqlite_items = planned["rows"], planned["sqlite_items"]
+    for row in rows.values():
+        if not row.get("skip"):
+            graph_cache.entity_upserted(campaign_id, row["entity_id"], row["name"], row["type"])
+    for relationship in merged:
+        graph_cache.relationship_upserted(
+            campaign_id,
+            relationship["relationship_id"],
+            relationship["from_id"],
+            relationship["to_id"],
+            relationship["type"],
+            relationship["properties"],
+        )
+    changes = [entity_change(row) for row in rows.values() if not row.get("skip")]
+    changes.extend(
+        relationship_change({
+            "relationship_id": relationship["relationship_id"],
+            "from_entity_id": relationship["from_id"],
+            "to_entity_id": relationship["to_id"],
+            "type": relationship["type"],
+            "properties": deserialize_map(relationship["properties"]),
+        })
+        for relationship in merged
+    )
+
+    def write_rows() -> None:
+        # 同时写入 SQLite（存储详细属性），整批 ingest 记为一个版本
+        upsert_entities(campaign_id, sqlite_items)
+        record_changes(campaign_id, changes)
+
+    await run_sqlite(write_rows)
+    aliases: Dict[str, List[str]] = {}
+    for item in sqlite_items:
+        if isinstance(item["properties"].get("aliases"), list):
+            aliases.setdefault(item["entity_id"], []).extend(item["properties"]["aliases"])
+    entity_directory.entities_upserted(campaign_id, [
+        (row["entity_id"], row["name"], aliases.get(row["entity_id"], []))
+        for row in rows.values()
+    ])
+    return {
+        "entities_count": len(payload.entities),
+        "relationships_count": len(merged),
+    }
@@ -0,0 +1,319 @@
+"""
+Path engine for tarven-note.
+两个命名实体之间的路径搜索：双向 BFS 求最短路径，Yen 算法求前 k 条最短简单路径。
+
+图数据通过邻接提供者逐层获取：开启 graph_cache 时直接读进程内缓存，
+否则每层向 Neo4j 批量查询一次邻接边（同一次搜索内缓存已展开的节点）。
+支持关系类型、中间节点类型约束，以及硬性时间预算：预算耗尽时返回已找到的路径并标记 partial。
+"""
+import asyncio
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from server.core.config import settings
+from server.db import graph_cache
+from server.repositories.entities import get_entity_by_name
+from server.repositories.queries import get_adjacency
+from server.repositories.utils import normalize_label
+
+# 每次向 Neo4j 展开的最大节点数
+EXPAND_CHUNK = 500
+# 展开一层时每处理这么多个节点检查一次时间预算
+BUDGET_CHECK_INTERVAL = 256
+
+# (relationship_id, 另一端 entity_id, 关系 type)
+Neighbour = Tuple[str, str, str]
+# (节点 entity_id 列表, 关系 relationship_id 列表)
+Path = Tuple[List[str], List[str]]
+
+
+class BudgetExceeded(Exception):
+    """时间预算耗尽"""
+
+
+class NeighbourProvider:
+    """按需展开节点邻接并缓存在本次搜索内"""
+
+    def __init__(self, campaign_id: str, deadline: float) -> None:
+        self.campaign_id = campaign_id
+        self.deadline = deadline
+        self.adjacency: Dict[str, List[Neighbour]] = {}
+        # entity_id → (name, type)
+        self.nodes: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+    def remaining(self) -> float:
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise BudgetExceeded()
+        return remaining
+
+    async def resolve(self, name: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def _fetch(self, entity_ids: List[str]) -> None:
+        raise NotImplementedError
+
+    async def neighbours(self, entity_ids: Iterable[str]) -> Dict[str, List[Neighbour]]:
+        missing = [entity_id for entity_id in entity_ids if entity_id not in self.adjacency]
+        if missing:
+            try:
+                await asyncio.wait_for(self._fetch(missing), timeout=self.remaining())
+            except asyncio.TimeoutError:
+                raise BudgetExceeded()
+        return self.adjacency
+
+
+class CachedNeighbourProvider(NeighbourProvider):
+    """从进程内邻接缓存读取"""
+
+    async def _load(self):
+        return await graph_cache.get_graph(self.campaign_id)
+
+    async def resolve(self, name: str) -> Optional[str]:
+        graph = await self._load()
+        index = graph.by_name.get(name)
+        if index is None:
+            return None
+        entity_id = graph.node_ids[index]
+        self.nodes[entity_id] = (graph.names[index], graph.types[index])
+        return entity_id
+
+    async def _fetch(self, entity_ids: List[str]) -> None:
+        graph = await self._load()
+        for position, entity_id in enumerate(entity_ids):
+            if position % BUDGET_CHECK_INTERVAL == 0:
+                self.remaining()
+            rows: List[Neighbour] = []
+            index = graph.by_id.get(entity_id)
+            if index is not None:
+                for edge, other in graph.neighbours(index):
+                    other_id = graph.node_ids[other]
+                    self.nodes[other_id] = (graph.names[other], graph.types[other])
+                    rows.append((graph.edge_ids[edge], other_id, graph.edge_types[edge]))
+            self.adjacency[entity_id] = rows
+
+
+class Neo4jNeighbourProvider(NeighbourProvider):
+    """每层一次批量查询"""
+
+    async def resolve(self, name: str) -> Optional[str]:
+        entity = await get_entity_by_name(self.campaign_id, name)
+        if not entity:
+            return None
+        self.nodes[entity["entity_id"]] = (entity.get("name"), entity.get("type"))
+        return entity["entity_id"]
+
+    async def _fetch(self, entity_ids: List[str]) -> None:
+        for start in range(0, len(entity_ids), EXPAND_CHUNK):
+            chunk = entity_ids[start:start + EXPAND_CHUNK]
+            for entity_id in chunk:
+                self.adjacency[entity_id] = []
+            for row in await get_adjacency(self.campaign_id, chunk):
+                self.nodes[row["other_id"]] = (row["other_name"], row["other_type"])
+                self.adjacency[row["entity_id"]].append(
+                    (row["relationship_id"], row["other_id"], row["type"])
+                )
+
+
+class Constraints:
+    """关系类型（按 normalize_label 比较）与中间节点类型约束；None 表示不限"""
+
+    def __init__(self, relationship_types: Optional[List[str]], node_types: Optional[List[str]]) -> None:
+        self.relationship_labels = (
+            {normalize_label(value, prefix="REL", upper=True) for value in relationship_types}
+            if relationship_types else None
+        )
+        self.node_types = set(node_types) if node_types else None
+
+    def allows_edge(self, rel_type: Optional[str]) -> bool:
+        if self.relationship_labels is None:
+            return True
+        return normalize_label(rel_type or "", prefix="REL", upper=True) in self.relationship_labels
+
+    def allows_node(self, node: Tuple[Optional[str], Optional[str]]) -> bool:
+        return self.node_types is None or node[1] in self.node_types
+
+
+def _trace(parents: Dict[str, Tuple[Optional[str], Optional[str]]], node: str) -> Path:
+    """沿 parents 回溯到根，返回从根到 node 的路径"""
+    nodes, edges = [node], []
+    while True:
+        previous, edge = parents[node]
+        if previous is None:
+            break
+        nodes.append(previous)
+        edges.append(edge)
+        node = previous
+    nodes.reverse()
+    edges.reverse()
+    return nodes, edges
+
+
+async def shortest_path(
+    provider: NeighbourProvider,
+    source: str,
+    target: str,
+    max_hops: int,
+    constraints: Constraints,
+    banned_nodes: Set[str] = frozenset(),
+    banned_edges: Set[str] = frozenset(),
+) -> Optional[Path]:
+    """双向 BFS：每轮展开较小的一侧的一整层，两侧相遇时取本层最短的连接"""
+    if source == target:
+        return [source], []
+    # node → (父节点, 经过的边)，根的父节点为 None
+    forward: Dict[str, Tuple[Optional[str], Optional[str]]] = {source: (None, None)}
+    backward: Dict[str, Tuple[Optional[str], Optional[str]]] = {target: (None, None)}
+    depth = {source: 0, target: 0}
+    frontier_f, frontier_b = [source], [target]
+    depth_f = depth_b = 0
+
+    while frontier_f and frontier_b and depth_f + depth_b < max_hops:
+        provider.remaining()
+        is_forward = len(frontier_f) <= len(frontier_b)
+        frontier = frontier_f if is_forward else frontier_b
+        parents, others = (forward, backward) if is_forward else (backward, forward)
+        adjacency = await provider.neighbours(frontier)
+
+        best: Optional[Tuple[int, str, str, str]] = None
+        next_frontier: List[str] = []
+        for position, node in enumerate(frontier):
+            if position % BUDGET_CHECK_INTERVAL == 0:
+                provider.remaining()
+            for edge_id, other, rel_type in adjacency.get(node, ()):
+                if edge_id in banned_edges or other in banned_nodes or other in parents:
+                    continue
+                if not constraints.allows_edge(rel_type):
+                    continue
+                if other in others:
+                    # 相遇：路径长度 = 本侧深度 + 1 + 另一侧到相遇点的深度
+                    length = depth[node] + 1 + depth[other]
+                    if best is None or length < best[0]:
+                        best = (length, node, edge_id, other)
+                    continue
+                if not constraints.allows_node(provider.nodes.get(other, (None, None))):
+                    continue
+                parents[other] = (node, edge_id)
+                depth[other] = depth[node] + 1
+                next_frontier.append(other)
+
+        if best is not None:
+            _, node, edge_id, other = best
+            near_nodes, near_edges = _trace(parents, node)
+            far_nodes, far_edges = _trace(others, other)
+            nodes = near_nodes + far_nodes[::-1]
+            edges = near_edges + [edge_id] + far_edges[::-1]
+            if not is_forward:
+                nodes.reverse()
+                edges.reverse()
+            return nodes, edges
+
+        if is_forward:
+            frontier_f, depth_f = next_frontier, depth_f + 1
+        else:
+            frontier_b, depth_b = next_frontier, depth_b + 1
+    return None
+
+
+async def k_shortest_paths(
+    provider: NeighbourProvider,
+    source: str,
+    target: str,
+    k: int,
+    max_hops: int,
+    constraints: Constraints,
+) -> Tuple[List[Path], bool]:
+    """Yen 算法求前 k 条最短简单路径；返回 (路径, 是否因预算耗尽而不完整)"""
+    found: List[Path] = []
+    try:
+        first = await shortest_path(provider, source, target, max_hops, constraints)
+        if first is None:
+            return [], False
+        found.append(first)
+        candidates: List[Path] = []
+        seen = {tuple(first[1])}
+
+        while len(found) < k:
+            last_nodes, last_edges = found[-1]
+            for i in range(len(last_nodes) - 1):
+                spur = last_nodes[i]
+                root_nodes, root_edges = last_nodes[:i + 1], last_edges[:i]
+                banned_edges = {
+                    edges[i] for nodes, edges in found
+                    if len(edges) > i and nodes[:i + 1] == root_nodes and edges[:i] == root_edges
+                }
+                spur_path = await shortest_path(
+                    provider,
+                    spur,
+                    target,
+                    max_hops - i,
+                    constraints,
+                    banned_nodes=set(root_nodes[:-1]),
+                    banned_edges=banned_edges,
+                )
+                if spur_path is None:
+                    continue
+                candidate = (root_nodes[:-1] + spur_path[0], root_edges + spur_path[1])
+                key = tuple(candidate[1])
+                if key not in seen:
+                    seen.add(key)
+                    candidates.append(candidate)
+            if not candidates:
+                break
+            # 稳定排序：等长路径保持发现顺序
+            candidates.sort(key=lambda path: len(path[1]))
+            found.append(candidates.pop(0))
+    except BudgetExceeded:
+        return found, True
+    return found, False
+
+
+def _to_response(provider: NeighbourProvider, path: Path) -> Dict[str, Any]:
+    nodes, edges = path
+    edge_types: Dict[str, str] = {}
+    for node in nodes:
+        for edge_id, _, rel_type in provider.adjacency.get(node, ()):
+            edge_types[edge_id] = rel_type
+    return {
+        "nodes": [provider.nodes.get(node, (node, None))[0] for node in nodes],
+        "relationships": [edge_types.get(edge) for edge in edges],
+        "hops": len(edges),
+        "node_ids": nodes,
+        "relationship_ids": edges,
+    }
+
+
+async def find_paths(
+    campaign_id: str,
+    from_name: str,
+    to_name: str,
+    max_hops: int,
+    k: int = 5,
+    relationship_types: Optional[List[str]] = None,
+    node_types: Optional[List[str]] = None,
+    budget_ms: Optional[int] = None,
+) -> Dict[str, Any]:
+    """返回 {paths, partial, elapsed_ms}；partial 表示预算耗尽，paths 为已找到的部分"""
+    started = time.monotonic()
+    budget_ms = budget_ms if budget_ms is not None else settings.path_budget_ms
+    deadline = started + budget_ms / 1000
+    provider_cls = CachedNeighbourProvider if graph_cache.enabled() else Neo4jNeighbourProvider
+    provider = provider_cls(campaign_id, deadline)
+
+    paths: List[Path] = []
+    partial = False
+    try:
+        source = await provider.resolve(from_name)
+        target = await provider.resolve(to_name)
+    except BudgetExceeded:
+        source = target = None
+        partial = True
+    if source is not None and target is not None:
+        paths, partial = await k_shortest_paths(
+            provider, source, target, k, max_hops, Constraints(relationship_types, node_types),
+        )
+    return {
+        "paths": [_to_response(provider, path) for path in paths],
+        "partial": partial,
+        "elapsed_ms": (time.monotonic() - started) * 1000,
+    }
@@ -0,0 +1,179 @@
+"""
+Hybrid recall service for tarven-note.
+双路召回：向量检索、关键词检索与图邻域扩展并发执行，
+按倒数排名融合（RRF）合并去重，在时间预算内返回。
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from server.core.config import settings
+from server.db.sqlite import run_sqlite
+from server.db.vector import search_similar
+from server.repositories.queries import get_neighbours
+from server.repositories.sqlite_entities import (
+    find_mentioned_entities,
+    get_entities_by_ids,
+    search_entities_keyword,
+)
+from server.repositories.sqlite_messages import (
+    get_messages_by_ids,
+    search_messages_keyword,
+)
+from server.repositories.utils import split_terms
+from server.services.embeddings import embed_text
+
+logger = logging.getLogger(__name__)
+
+# (ref_type, ref_id)
+RecallRef = Tuple[str, str]
+
+# 单个检索路径最多贡献的候选数（相对 limit 的倍数）
+CANDIDATE_FACTOR = 2
+
+class StageSkipped(Exception):
+    """检索路径不可用（如未配置嵌入接口），不计为错误"""
+
+
+async def _vector_stage(campaign_id: str, query: str, limit: int) -> List[RecallRef]:
+    embedding = await embed_text(query)
+    if embedding is None:
+        raise StageSkipped("embedding endpoint not configured")
+    hits = await run_sqlite(search_similar, embedding, None, limit, campaign_id=campaign_id)
+    return [(ref_type, ref_id) for ref_type, ref_id, _ in hits]
+
+
+def _keyword_stage(campaign_id: str, query: str, limit: int) -> List[RecallRef]:
+    terms = split_terms(query)
+    messages = search_messages_keyword(campaign_id, terms, limit)
+    entities = search_entities_keyword(campaign_id, terms, limit)
+    # 消息与实体交替排名，避免一类结果挤占另一类
+    ranked: List[RecallRef] = []
+    for position in range(max(len(messages), len(entities))):
+        if position < len(entities):
+            ranked.append(("entity", entities[position]))
+        if position < len(messages):
+            ranked.append(("message", messages[position]))
+    return ranked[:limit]
+
+
+async def _graph_stage(campaign_id: str, query: str, limit: int) -> List[RecallRef]:
+    seeds = await run_sqlite(find_mentioned_entities, campaign_id, query, limit)
+    if not seeds:
+        return []
+    neighbours = await get_neighbours(campaign_id, seeds, limit)
+    ranked = seeds + [row["entity_id"] for row in neighbours if row["entity_id"]]
+    return [("entity", entity_id) for entity_id in ranked[:limit]]
+
+
+def fuse_rankings(rankings: Dict[str, List[RecallRef]], k: int) -> List[Tuple[RecallRef, float, Dict[str, int]]]:
+    """倒数排名融合：score = Σ 1 / (k + rank)"""
+    scores: Dict[RecallRef, float] = {}
+    ranks: Dict[RecallRef, Dict[str, int]] = {}
+    for stage, refs in rankings.items():
+        for rank, ref in enumerate(dict.fromkeys(refs), start=1):
+            scores[ref] = scores.get(ref, 0.0) + 1.0 / (k + rank)
+            ranks.setdefault(ref, {})[stage] = rank
+    ordered = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return [(ref, score, ranks[ref]) for ref, score in ordered]
+
+
+async def _timed(
+    runner: Callable[[], Awaitable[List[RecallRef]]],
+) -> Tuple[str, List[RecallRef], float, Optional[str]]:
+    started = time.perf_counter()
+    try:
+        refs = await runner()
+        status, error = "ok", None
+    except StageSkipped as exc:
+        refs, status, error = [], "skipped", str(exc)
+    except Exception as exc:
+        logger.warning(f"Recall stage failed: {exc}")
+        refs, status, error = [], "error", str(exc)
+    return status, refs, (time.perf_counter() - started) * 1000, error
+
+
+def _hydrate_chunk(campaign_id: str, fused: List[Tuple[RecallRef, float, Dict[str, int]]]) -> List[Dict[str, Any]]:
+    message_ids = [ref_id for (ref_type, ref_id), _, _ in fused if ref_type == "message"]
+    entity_ids = [ref_id for (ref_type, ref_id), _, _ in fused if ref_type == "entity"]
+    messages = get_messages_by_ids(message_ids)
+    entities = get_entities_by_ids(campaign_id, entity_ids)
+
+    items = []
+    for (ref_type, ref_id), score, ranks in fused:
+        item: Dict[str, Any] = {"ref_type": ref_type, "ref_id": ref_id, "score": score, "ranks": ranks}
+        if ref_type == "message":
+            message = messages.get(ref_id)
+            if message is None or message["campaign_id"] != campaign_id:
+                continue
+            item.update(role=message["role"], content=message["content"], created_at=message["created_at"])
+        else:
+            entity = entities.get(ref_id)
+            if entity is None:
+                continue
+            item.update(name=entity["name"], type=entity["type"], description=entity["description"])
+        items.append(item)
+    return items
+
+
+def _hydrate(
+    campaign_id: str,
+    fused: List[Tuple[RecallRef, float, Dict[str, int]]],
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """
+    按融合顺序补全前 limit 个仍然存在的结果。已删除的消息 / 实体（向量尚未清理）会被跳过，
+    每次多取 limit * 2 个候选，直到凑满 limit 或候选耗尽
+    """
+    items: List[Dict[str, Any]] = []
+    chunk = limit * 2
+    for start in range(0, len(fused), chunk):
+        items.extend(_hydrate_chunk(campaign_id, fused[start:start + chunk]))
+        if len(items) >= limit:
+            break
+    return items[:limit]
+
+
+async def recall(
+    campaign_id: str,
+    query: str,
+    limit: int = 10,
+    budget_ms: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    并发执行各检索路径；超出时间预算的路径被取消并标记 timeout，
+    已完成路径的结果照常融合返回。
+    """
+    started = time.perf_counter()
+    budget_ms = budget_ms if budget_ms is not None else settings.recall_budget_ms
+    candidates = limit * CANDIDATE_FACTOR
+
+    runners: Dict[str, Callable[[], Awaitable[List[RecallRef]]]] = {
+        "vector": lambda: _vector_stage(campaign_id, query, candidates),
+        "keyword": lambda: run_sqlite(_keyword_stage, campaign_id, query, candidates),
+        "graph": lambda: _graph_stage(campaign_id, query, candidates),
+    }
+    tasks = {name: asyncio.create_task(_timed(runner)) for name, runner in runners.items()}
+    await asyncio.wait(tasks.values(), timeout=budget_ms / 1000)
+
+    rankings: Dict[str, List[RecallRef]] = {}
+    stages: Dict[str, Dict[str, Any]] = {}
+    for name, task in tasks.items():
+        if not task.done():
+            # 线程池中的 SQLite 查询无法中断，只是不再等待其结果
+            task.cancel()
+            stages[name] = {"status": "timeout", "elapsed_ms": float(budget_ms), "hits": 0}
+            continue
+        status, refs, elapsed_ms, error = task.result()
+        rankings[name] = refs
+        stages[name] = {"status": status, "elapsed_ms": elapsed_ms, "hits": len(refs), "error": error}
+
+    fused = fuse_rankings(rankings, settings.recall_rrf_k)
+    items = await run_sqlite(_hydrate, campaign_id, fused, limit)
+    return {
+        "query": query,
+        "items": items,
+        "stages": stages,
+        "elapsed_ms": (time.perf_counter() - started) * 1000,
+    }
@@ -0,0 +1,47 @@
+"""
+Shared pytest fixtures for tarven-note.
+每个测试使用 tmp_path 下独立的 SQLite 数据库和段文件目录，不依赖外部服务。
+"""
+import asyncio
+
+import pytest
+
+from server.core.config import settings
+from server.db import sqlite, vector
+from server.db.sqlite_schema import apply_sqlite_schema
+
+
+@pytest.fixture(scope="session")
+def loop():
+    """Neo4j 驱动是模块级的，所有用到图存储的用例共用一个事件循环"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """指向临时数据库并应用 schema；结束时关闭所有连接并清空内存向量索引"""
+    sqlite.close_connection()
+    vector.reset_index()
+    monkeypatch.setattr(settings, "sqlite_db_path", str(tmp_path / "tarven_note.db"))
+    monkeypatch.setattr(sqlite, "_db_path", None)
+    apply_sqlite_schema()
+    yield tmp_path / "tarven_note.db"
+    vector.reset_index()
+    sqlite.shutdown_executor()
+    sqlite.close_connection()
+
+
+@pytest.fixture
+def client(sqlite_db, monkeypatch):
+    """嵌入式 SQLite 图存储上的应用；进程内缓存按 campaign_id 区分，测试各用新的战役"""
+    from fastapi.testclient import TestClient
+
+    from server.main import app
+    from server.repositories import graph_store
+
+    monkeypatch.setattr(settings, "graph_backend", "sqlite")
+    monkeypatch.setattr(graph_store, "_store", None)
+    with TestClient(app) as test_client:
+        yield test_client
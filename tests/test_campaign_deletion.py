@@ -0,0 +1,39 @@
+import asyncio
+from uuid import uuid4
+
+from server.core.config import settings
+from server.db import neo4j
+from server.repositories import campaigns, graph_store
+from server.repositories.sqlite_messages import store_message
+from server.services import campaign_deletion
+
+
+def test_deletion_outlives_its_request_scope(sqlite_db, monkeypatch):
+    monkeypatch.setattr(settings, "graph_backend", "sqlite")
+    monkeypatch.setattr(graph_store, "_store", None)
+    campaign_id = f"test-{uuid4().hex[:8]}"
+    scopes = []
+    delete_campaign = campaign_deletion.delete_campaign
+
+    async def recording_delete(campaign_id):
+        # 最后一步运行时，请求的 Neo4j 会话早已关闭
+        scopes.append(neo4j._scope.get())
+        return await delete_campaign(campaign_id)
+
+    monkeypatch.setattr(campaign_deletion, "delete_campaign", recording_delete)
+
+    async def scenario():
+        await campaigns.create_campaign("Test", "coc", None, {}, campaign_id)
+        store_message(campaign_id, "user", "hello")
+        async with neo4j.request_scope():
+            job = await campaign_deletion.start_campaign_deletion(campaign_id)
+            task = campaign_deletion._tasks[campaign_id]
+            assert neo4j._scope.get() is not None
+        await task
+        return job
+
+    job = asyncio.run(scenario())
+    assert scopes == [None]
+    assert (job["status"], job["error"]) == ("completed", None)
+    assert job["deleted"]["messages"] == 1
+    assert asyncio.run(campaigns.get_campaign(campaign_id)) is None
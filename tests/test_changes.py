@@ -0,0 +1,34 @@
+import asyncio
+from uuid import uuid4
+
+from server.core.config import settings
+from server.repositories import campaigns, entities, graph_store, relationships
+from server.repositories.sqlite_changes import get_changes, get_version
+
+
+def test_entity_delete_records_its_relationship_deletes(sqlite_db, monkeypatch):
+    monkeypatch.setattr(settings, "graph_backend", "sqlite")
+    monkeypatch.setattr(graph_store, "_store", None)
+    campaign_id = f"test-{uuid4().hex[:8]}"
+
+    async def scenario():
+        await campaigns.create_campaign("Test", "coc", None, {}, campaign_id)
+        ids = {}
+        for name in ("Alice", "Bob", "Carol"):
+            ids[name] = (await entities.create_entity(campaign_id, "Character", name, {}, {}))["entity_id"]
+        outgoing = await relationships.create_relationship(campaign_id, ids["Alice"], ids["Bob"], "knows", {})
+        incoming = await relationships.create_relationship(campaign_id, ids["Carol"], ids["Alice"], "fears", {})
+        kept = await relationships.create_relationship(campaign_id, ids["Bob"], ids["Carol"], "knows", {})
+        since = get_version(campaign_id)
+        assert await entities.delete_entity(campaign_id, ids["Alice"]) is True
+        return ids, since, {outgoing["relationship_id"], incoming["relationship_id"]}, kept["relationship_id"]
+
+    ids, since, removed, kept = asyncio.run(scenario())
+    changes = get_changes(campaign_id, since, 100)
+    # 实体与它的关系在同一个版本中删除
+    assert changes["version"] == since + 1
+    assert {(c["kind"], c["id"], c["op"]) for c in changes["changes"]} == {
+        ("entity", ids["Alice"], "delete"),
+        *(("relationship", relationship_id, "delete") for relationship_id in removed),
+    }
+    assert kept not in {c["id"] for c in changes["changes"]}
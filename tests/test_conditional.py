@@ -0,0 +1,43 @@
+import asyncio
+from uuid import uuid4
+
+from server.repositories.graph_store import get_graph_store
+from server.repositories.sqlite_changes import entity_change, record_changes
+
+
+def _create_campaign(client):
+    campaign_id = str(uuid4())
+    response = client.post("/api/campaigns", json={"name": "c", "system": "coc", "campaign_id": campaign_id})
+    assert response.status_code == 200
+    return campaign_id
+
+
+def test_conditional_get_returns_304_until_campaign_changes(client):
+    campaign_id = _create_campaign(client)
+    client.post(f"/api/campaigns/{campaign_id}/entities", json={"type": "npc", "name": "Alice"})
+
+    first = client.get(f"/api/campaigns/{campaign_id}/entities")
+    etag = first.headers["etag"]
+    assert client.get(f"/api/campaigns/{campaign_id}/entities", headers={"If-None-Match": etag}).status_code == 304
+
+    client.post(f"/api/campaigns/{campaign_id}/entities", json={"type": "npc", "name": "Bob"})
+    second = client.get(f"/api/campaigns/{campaign_id}/entities", headers={"If-None-Match": etag})
+    assert second.status_code == 200
+    assert second.headers["etag"] != etag
+    assert sorted(entity["name"] for entity in second.json()) == ["Alice", "Bob"]
+
+
+def test_cached_response_sees_writes_from_other_processes(client):
+    campaign_id = _create_campaign(client)
+    client.post(f"/api/campaigns/{campaign_id}/entities", json={"type": "npc", "name": "Alice"})
+    first = client.get(f"/api/campaigns/{campaign_id}/entities")
+    assert [entity["name"] for entity in first.json()] == ["Alice"]
+    assert client.get(f"/api/campaigns/{campaign_id}/entities").json() == first.json()
+
+    # 另一个进程的写入：直接写图存储和变更日志，本进程的写路径没有参与
+    entity = asyncio.run(get_graph_store().create_entity(campaign_id, "npc", "Bob"))
+    record_changes(campaign_id, [entity_change(entity)])
+
+    second = client.get(f"/api/campaigns/{campaign_id}/entities", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert sorted(entity["name"] for entity in second.json()) == ["Alice", "Bob"]
@@ -0,0 +1,61 @@
+import asyncio
+
+from server.core.config import settings
+from server.db.sqlite import get_cursor
+from server.repositories import sqlite_embedding_queue as queue
+from server.repositories.sqlite_entities import rename_entity, upsert_entity
+from server.repositories.sqlite_messages import store_message
+from server.services import embedding_worker
+
+
+def test_reenqueue_during_inflight_batch_keeps_item(sqlite_db, monkeypatch):
+    monkeypatch.setattr(settings, "embedding_dim", 4)
+    message_id = store_message("c1", "user", "first version")
+    embedded = []
+
+    async def fake_embed_texts(texts):
+        embedded.append(list(texts))
+        if len(embedded) == 1:
+            # 批次请求期间源数据被修改并重新入队
+            with get_cursor() as cursor:
+                cursor.execute("UPDATE messages SET content = ? WHERE message_id = ?", ("second version", message_id))
+                queue.enqueue_embedding(cursor, "message", message_id, "c1")
+        return [[0.1, 0.2, 0.3, 0.4] for _ in texts]
+
+    monkeypatch.setattr(embedding_worker, "embed_texts", fake_embed_texts)
+
+    assert asyncio.run(embedding_worker._process_batch()) == 1
+    # 旧一代完成后，新标记的项仍在队列中
+    assert queue.count_pending()["queued"] == 1
+
+    assert asyncio.run(embedding_worker._process_batch()) == 1
+    assert embedded == [["first version"], ["second version"]]
+    assert queue.count_pending()["queued"] == 0
+
+
+def test_fail_ignores_newer_generation(sqlite_db):
+    message_id = store_message("c1", "user", "hello")
+    (item,) = queue.fetch_pending(10)
+    with get_cursor() as cursor:
+        queue.enqueue_embedding(cursor, "message", message_id, "c1")
+
+    queue.fail([item], "boom", 5.0)
+    (pending,) = queue.fetch_pending(10)
+    assert pending["attempts"] == 0
+    assert pending["generation"] == item["generation"] + 1
+
+
+def test_rename_requeues_entity_for_embedding(sqlite_db):
+    upsert_entity("e1", "c1", "Character", "Alice", {"description": "a detective"})
+    queue.complete(queue.fetch_pending(10))
+    assert queue.fetch_pending(10) == []
+
+    rename_entity("c1", "e1", "Alicia")
+    [item] = queue.fetch_pending(10)
+    assert (item["ref_id"], item["text"]) == ("e1", "Alicia\na detective")
+
+    # 新名称被占用时不改名，也不重新嵌入
+    upsert_entity("e2", "c1", "Character", "Bob", {})
+    queue.complete(queue.fetch_pending(10))
+    rename_entity("c1", "e1", "Bob")
+    assert queue.fetch_pending(10) == []
@@ -0,0 +1,217 @@
+"""
+GraphStore 契约测试：同一组仓储层用例分别跑在嵌入式 SQLite 和 Neo4j 后端上。
+Neo4j 只在设置了 NEO4J_URI 且服务器可连接时运行，否则跳过。
+"""
+import os
+from uuid import uuid4
+
+import pytest
+
+from server.core.config import settings
+from server.repositories import campaigns, entities, graph_store, queries, relationships
+from server.repositories.sqlite_entities import get_entities_by_ids
+from server.schemas.ingest import IngestRequest
+from server.services.ingest import ingest
+from server.services.paths import find_paths
+
+BACKENDS = [
+    "sqlite",
+    pytest.param(
+        "neo4j",
+        marks=pytest.mark.skipif(not os.environ.get("NEO4J_URI"), reason="NEO4J_URI is not set"),
+    ),
+]
+
+
+@pytest.fixture(params=BACKENDS)
+def run(request, sqlite_db, monkeypatch, loop):
+    """切换到指定后端并创建一个新战役；返回 run(coroutine_function) → 在该战役上执行"""
+    monkeypatch.setattr(settings, "graph_backend", request.param)
+    monkeypatch.setattr(graph_store, "_store", None)
+    store = graph_store.get_graph_store()
+    if request.param == "neo4j":
+        status = loop.run_until_complete(store.ping())
+        if not status["ok"]:
+            pytest.skip(f"Neo4j unreachable: {status.get('error')}")
+    loop.run_until_complete(store.apply_schema())
+    campaign_id = f"test-{uuid4().hex[:8]}"
+    loop.run_until_complete(campaigns.create_campaign("Test", "coc", None, {}, campaign_id))
+
+    def execute(func):
+        return loop.run_until_complete(func(campaign_id))
+
+    yield execute
+    loop.run_until_complete(campaigns.delete_campaign(campaign_id))
+
+
+async def _create(campaign_id, *specs):
+    ids = {}
+    for entity_type, name in specs:
+        entity = await entities.create_entity(campaign_id, entity_type, name, {}, {})
+        ids[name] = entity["entity_id"]
+    return ids
+
+
+def test_campaign_lifecycle(run):
+    async def scenario(campaign_id):
+        campaign = await campaigns.ensure_campaign_exists(campaign_id)
+        assert (campaign["campaign_id"], campaign["name"], campaign["status"]) == (campaign_id, "Test", "active")
+        updated = await campaigns.update_campaign(campaign_id, {"status": "paused", "metadata": {"k": 2}})
+        assert (updated["status"], updated["metadata"]) == ("paused", {"k": 2})
+        assert await campaigns.update_campaign(f"{campaign_id}-missing", {"status": "x"}) is None
+
+        other = f"{campaign_id}-ensured"
+        assert (await campaigns.ensure_campaign_exists(other))["name"] == other
+        assert await campaigns.delete_campaign(other) is True
+        assert await campaigns.get_campaign(other) is None
+
+    run(scenario)
+
+
+def test_entity_crud_and_pagination(run):
+    async def scenario(campaign_id):
+        ids = await _create(campaign_id, ("Character", "Alice"), ("Unknown", "Bob"), ("Location", "Arkham"))
+        # 同名实体只有一个；仅 Unknown 类型会被改写
+        bob = await entities.create_entity(campaign_id, "Character", "Bob", {}, {})
+        assert (bob["entity_id"], bob["type"]) == (ids["Bob"], "Character")
+        alice = await entities.create_entity(campaign_id, "Item", "Alice", {}, {})
+        assert (alice["entity_id"], alice["type"]) == (ids["Alice"], "Character")
+
+        assert (await entities.get_entity(campaign_id, ids["Arkham"]))["name"] == "Arkham"
+        assert (await entities.get_entity_by_name(campaign_id, "Arkham"))["entity_id"] == ids["Arkham"]
+        assert await entities.get_entity_by_name(campaign_id, "Arkham", "Character") is None
+        assert sorted(e["name"] for e in await entities.list_entities(campaign_id, entity_type="Character")) == [
+            "Alice", "Bob",
+        ]
+
+        pages, after = [], None
+        while True:
+            page = await entities.list_entities(campaign_id, after=after, limit=2)
+            if not page:
+                break
+            pages.append([e["name"] for e in page])
+            after = page[-1]["name"]
+        assert pages == [["Alice", "Arkham"], ["Bob"]]
+
+        renamed = await entities.update_entity(campaign_id, ids["Bob"], {"name": "Robert"})
+        assert renamed["name"] == "Robert"
+        assert await entities.get_entity_by_name(campaign_id, "Bob") is None
+        assert await entities.delete_entity(campaign_id, ids["Arkham"]) is True
+        assert await entities.delete_entity(campaign_id, ids["Arkham"]) is False
+        assert await entities.get_entity(campaign_id, ids["Arkham"]) is None
+
+    run(scenario)
+
+
+def test_relationship_crud_and_pagination(run):
+    async def scenario(campaign_id):
+        ids = await _create(campaign_id, *[("Character", f"E{i}") for i in range(4)])
+        first = await relationships.create_relationship(campaign_id, ids["E0"], ids["E1"], "knows", {"since": 1920})
+        again = await relationships.create_relationship(campaign_id, ids["E0"], ids["E1"], "KNOWS", {"since": 1921})
+        assert again["relationship_id"] == first["relationship_id"]
+        assert again["properties"] == {"since": 1921}
+        assert await relationships.create_relationship(campaign_id, ids["E0"], str(uuid4()), "knows", {}) is None
+        for i in range(4):
+            for j in range(4):
+                if i != j and (i, j) != (0, 1):
+                    await relationships.create_relationship(campaign_id, ids[f"E{i}"], ids[f"E{j}"], "knows", {})
+        await relationships.create_relationship(campaign_id, ids["E2"], ids["E3"], "fears", {})
+
+        everything = await relationships.list_relationships(campaign_id)
+        assert len(everything) == 13
+        assert [(r["from_entity_id"], r["relationship_id"]) for r in everything] == sorted(
+            (r["from_entity_id"], r["relationship_id"]) for r in everything
+        )
+        pages, after = [], None
+        while True:
+            page = await relationships.list_relationships(campaign_id, after=after, limit=5)
+            if not page:
+                break
+            pages.append(page)
+            after = (page[-1]["from_entity_id"], page[-1]["relationship_id"])
+        assert [len(page) for page in pages] == [5, 5, 3]
+        assert [r for page in pages for r in page] == everything
+
+        assert len(await relationships.list_relationships(campaign_id, from_entity_id=ids["E0"])) == 3
+        assert len(await relationships.list_relationships(campaign_id, to_entity_id=ids["E3"])) == 4
+        fears = await relationships.list_relationships(campaign_id, relationship_type="fears")
+        assert [(r["from_entity_id"], r["to_entity_id"]) for r in fears] == [(ids["E2"], ids["E3"])]
+
+        assert await relationships.delete_relationship(campaign_id, fears[0]["relationship_id"]) is True
+        assert await relationships.delete_relationship(campaign_id, fears[0]["relationship_id"]) is False
+        # 删除实体时它的关系一并删除
+        await entities.delete_entity(campaign_id, ids["E3"])
+        assert await relationships.list_relationships(campaign_id, to_entity_id=ids["E3"]) == []
+        assert len(await relationships.list_relationships(campaign_id)) == 6
+
+    run(scenario)
+
+
+def test_ingest_round_trip(run):
+    payload = IngestRequest(
+        entities=[
+            {"type": "Character", "name": "Carol", "properties": {"age": 31}},
+            {"type": "Item", "name": "Tome"},
+        ],
+        relationships=[
+            {"from_entity_name": "Carol", "to_entity_name": "Tome", "type": "owns"},
+            {"from_entity_name": "Carol", "to_entity_name": "Dave", "type": "ally", "bidirectional": True},
+        ],
+    )
+
+    async def scenario(campaign_id):
+        assert await ingest(campaign_id, payload) == {"entities_count": 2, "relationships_count": 3}
+        resolved = await entities.resolve_entity_names(campaign_id, ["Carol", "Tome", "Dave", "Nobody"])
+        assert sorted(resolved) == ["Carol", "Dave", "Tome"]
+        ids = {name: row["entity_id"] for name, row in resolved.items()}
+        names = {entity_id: name for name, entity_id in ids.items()}
+
+        def edges(rows):
+            return sorted((names[r["from_entity_id"]], names[r["to_entity_id"]], r["type"]) for r in rows)
+
+        expected = [("Carol", "Dave", "ally"), ("Carol", "Tome", "owns"), ("Dave", "Carol", "ally")]
+        assert edges(await relationships.list_relationships(campaign_id)) == expected
+        # 详细属性写入 SQLite 实体表，与图存储共用 entity_id
+        details = get_entities_by_ids(campaign_id, list(ids.values()))
+        assert sorted(row["name"] for row in details.values()) == ["Carol", "Dave", "Tome"]
+        assert str(details[ids["Carol"]]["age"]) == "31"
+
+        # 重复写入同一批数据不会产生重复的实体和关系
+        await ingest(campaign_id, payload)
+        assert edges(await relationships.list_relationships(campaign_id)) == expected
+        assert len(await entities.list_entities(campaign_id)) == 3
+
+    run(scenario)
+
+
+def test_subgraph_and_paths(run):
+    async def scenario(campaign_id):
+        # A → B → C → D，另有 A → D 的捷径和孤立的 E
+        await ingest(campaign_id, IngestRequest(
+            entities=[{"type": "Character", "name": name} for name in "ABCDE"],
+            relationships=[
+                {"from_entity_name": a, "to_entity_name": b, "type": "knows"}
+                for a, b in [("A", "B"), ("B", "C"), ("C", "D"), ("A", "D")]
+            ],
+        ))
+
+        one_hop = await queries.get_subgraph(campaign_id, name="A", depth=1)
+        assert sorted(node["label"] for node in one_hop["nodes"]) == ["A", "B", "D"]
+        two_hops = await queries.get_subgraph(campaign_id, name="A", depth=2)
+        assert sorted(node["label"] for node in two_hops["nodes"]) == ["A", "B", "C", "D"]
+        assert len(two_hops["edges"]) == 4
+        assert (await queries.get_subgraph(campaign_id, name="Nobody"))["nodes"] == []
+
+        paged = await queries.get_subgraph(campaign_id, name="A", depth=2, max_nodes=2)
+        assert len(paged["nodes"]) == 2 and paged["next_cursor"]
+        rest = await queries.get_subgraph(campaign_id, name="A", depth=2, max_nodes=2, cursor=paged["next_cursor"])
+        assert sorted(node["label"] for node in paged["nodes"] + rest["nodes"]) == ["A", "B", "C", "D"]
+
+        paths = await find_paths(campaign_id, "A", "C", 3, k=3)
+        # 同样跳数的路径之间没有约定的顺序
+        assert sorted(path["nodes"] for path in paths["paths"]) == [["A", "B", "C"], ["A", "D", "C"]]
+        assert [path["hops"] for path in paths["paths"]] == [2, 2]
+        assert (await find_paths(campaign_id, "A", "C", 1, k=3))["paths"] == []
+        assert (await find_paths(campaign_id, "A", "E", 4, k=3))["paths"] == []
+
+    run(scenario)
@@ -0,0 +1,51 @@
+from server.db.sqlite import get_cursor
+from server.db.sqlite_schema import apply_sqlite_schema
+from server.repositories.sqlite_messages import (
+    delete_campaign_messages,
+    search_messages,
+    search_messages_keyword,
+    store_message,
+)
+
+
+def _contents(rows):
+    return sorted(row["content"] for row in rows)
+
+
+def _bigram_plan(term):
+    with get_cursor(readonly=True) as cursor:
+        cursor.execute(
+            """EXPLAIN QUERY PLAN SELECT rowid FROM messages_bigram
+               WHERE messages_bigram MATCH ?""",
+            (term,)
+        )
+        return " ".join(row["detail"] for row in cursor.fetchall())
+
+
+def test_short_cjk_terms_use_bigram_index(sqlite_db):
+    store_message("c1", "user", "调查员在书房找到了一条线索。")
+    store_message("c1", "user", "任务完成，线 索断了")
+    store_message("c2", "user", "另一场战役的线索")
+
+    assert _contents(search_messages("c1", ["线索"])) == ["调查员在书房找到了一条线索。"]
+    assert _contents(search_messages("c1", ["索"])) == ["任务完成，线 索断了", "调查员在书房找到了一条线索。"]
+    assert search_messages("c1", ["任务", "线索"]) == []
+    assert len(search_messages_keyword("c1", ["任务", "线索"])) == 2
+    # 长词走 trigram，短词作为二元组过滤
+    assert _contents(search_messages("c1", ["调查员", "书房"])) == ["调查员在书房找到了一条线索。"]
+    assert search_messages("c1", ["调查员", "任务"]) == []
+    assert "<mark>线索</mark>" in search_messages("c1", ["线索"])[0]["snippet"]
+    assert "VIRTUAL TABLE INDEX" in _bigram_plan('"线索"')
+
+
+def test_bigram_index_follows_deletes_and_backfills(sqlite_db):
+    store_message("c1", "user", "线索一")
+    store_message("c2", "user", "线索二")
+    assert delete_campaign_messages("c1", 10) == 1
+    assert search_messages_keyword("c1", ["线索"]) == []
+
+    with get_cursor() as cursor:
+        cursor.execute("INSERT INTO messages_bigram (messages_bigram) VALUES ('delete-all')")
+    assert search_messages("c2", ["线索"]) == []
+    apply_sqlite_schema()
+    assert _contents(search_messages("c2", ["线索"])) == ["线索二"]
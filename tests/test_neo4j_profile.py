@@ -0,0 +1,56 @@
+"""
+Neo4j PROFILE 回归测试：以战役为入口的仓储查询，db hits 不应随其他战役的数据增长。
+只在设置了 NEO4J_URI 且服务器可连接时运行，否则跳过；更大规模的复测见 benchmarks/neo4j_profile.py。
+"""
+import os
+from uuid import uuid4
+
+import pytest
+
+from benchmarks.neo4j_profile import compare, measure, profile_calls, seed
+from server.core.config import settings
+from server.repositories import campaigns, entities, graph_store
+
+pytestmark = pytest.mark.skipif(not os.environ.get("NEO4J_URI"), reason="NEO4J_URI is not set")
+
+ENTITIES = 300
+DEGREE = 3
+NOISE_CAMPAIGNS = 2
+
+
+@pytest.fixture
+def store(sqlite_db, monkeypatch, loop):
+    monkeypatch.setattr(settings, "graph_backend", "neo4j")
+    monkeypatch.setattr(graph_store, "_store", None)
+    store = graph_store.get_graph_store()
+    status = loop.run_until_complete(store.ping())
+    if not status["ok"]:
+        pytest.skip(f"Neo4j unreachable: {status.get('error')}")
+    loop.run_until_complete(store.apply_schema())
+    return store
+
+
+def test_db_hits_do_not_depend_on_other_campaigns(store, loop):
+    target = f"profile-{uuid4().hex[:8]}"
+    noise = [f"{target}-noise{n}" for n in range(NOISE_CAMPAIGNS)]
+
+    async def scenario():
+        await seed(target, ENTITIES, DEGREE)
+        resolved = await entities.resolve_entity_names(target, ["E1", "E2"])
+        calls = profile_calls(target, {name: row["entity_id"] for name, row in resolved.items()}, ENTITIES)
+        before = await measure(calls)
+        # 干扰战役使用同样的实体名，按名称查找若未先限定战役会多扫这些节点
+        for campaign_id in noise:
+            await seed(campaign_id, ENTITIES, DEGREE)
+        after = await measure(calls)
+        return {
+            label: (before[label], after[label], status)
+            for label, status in compare(calls, before, after).items()
+            if status != "ok"
+        }
+
+    try:
+        assert loop.run_until_complete(scenario()) == {}
+    finally:
+        for campaign_id in [target] + noise:
+            loop.run_until_complete(campaigns.delete_campaign(campaign_id))
@@ -0,0 +1,20 @@
+from server.db.sqlite import get_cursor
+from server.repositories.sqlite_messages import store_message
+from server.services.recall import _hydrate
+
+
+def test_hydrate_skips_missing_rows_and_fills_limit(sqlite_db):
+    message_ids = [store_message("c1", "user", f"message {i}") for i in range(6)]
+    with get_cursor() as cursor:
+        cursor.execute("DELETE FROM messages WHERE message_id IN (?, ?)", (message_ids[0], message_ids[1]))
+    fused = [(("message", message_id), 1.0 / (rank + 1), {}) for rank, message_id in enumerate(message_ids)]
+
+    items = _hydrate("c1", fused, 3)
+    assert [item["ref_id"] for item in items] == message_ids[2:5]
+
+
+def test_hydrate_returns_fewer_only_when_candidates_run_out(sqlite_db):
+    message_ids = [store_message("c1", "user", f"message {i}") for i in range(2)]
+    fused = [(("message", "deleted"), 1.0, {})] + [(("message", mid), 0.5, {}) for mid in message_ids]
+
+    assert [item["ref_id"] for item in _hydrate("c1", fused, 5)] == message_ids
@@ -0,0 +1,32 @@
+import pytest
+
+from server.db.sqlite import get_cursor
+from server.repositories.sqlite_changes import get_version, record_changes
+
+
+def _count_rows():
+    with get_cursor(readonly=True) as cursor:
+        cursor.execute("SELECT COUNT(*) AS n FROM change_log")
+        return cursor.fetchone()["n"]
+
+
+def test_nested_cursor_rolls_back_with_outer_transaction(sqlite_db):
+    # 外层还没有写入时进入内层，内层退出也不能提交
+    with pytest.raises(RuntimeError):
+        with get_cursor():
+            record_changes("c1", [("entity", "e1", {"name": "a"})])
+            raise RuntimeError("outer failed")
+    assert get_version("c1") == 0
+    assert _count_rows() == 0
+
+
+def test_nested_cursor_failure_only_rolls_back_inner_writes(sqlite_db):
+    with get_cursor() as cursor:
+        cursor.execute("INSERT INTO campaign_versions (campaign_id, version) VALUES ('c1', 5)")
+        with pytest.raises(RuntimeError):
+            with get_cursor() as inner:
+                inner.execute("UPDATE campaign_versions SET version = 9 WHERE campaign_id = 'c1'")
+                raise RuntimeError("inner failed")
+        record_changes("c1", [("entity", "e1", {"name": "a"})])
+    assert get_version("c1") == 6
+    assert _count_rows() == 1
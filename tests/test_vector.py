@@ -0,0 +1,68 @@
+import threading
+
+import numpy as np
+
+from server.core.config import settings
+from server.db import vector
+
+
+def _vectors(count, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+
+def test_search_matches_brute_force_with_tombstones(sqlite_db):
+    vectors = _vectors(50)
+    for i, row in enumerate(vectors):
+        vector.store_embedding("message", f"m{i}", row.tolist(), campaign_id="c1")
+    for i in range(0, 50, 3):
+        vector.delete_embedding("message", f"m{i}")
+
+    query = vectors[7] + 0.1
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = normalized @ (query / np.linalg.norm(query))
+    expected = [f"m{i}" for i in np.argsort(-scores) if i % 3][:5]
+
+    found = vector.search_similar(query.tolist(), "message", 5, mode="exact", campaign_id="c1")
+    assert [ref_id for _, ref_id, _ in found] == expected
+
+
+def test_scoring_runs_outside_the_index_lock(sqlite_db, monkeypatch):
+    vectors = _vectors(20)
+    for i, row in enumerate(vectors):
+        vector.store_embedding("message", f"m{i}", row.tolist(), campaign_id="c1")
+
+    top_k = vector._PartitionSnapshot.top_k
+    writer_done = []
+
+    def blocking_top_k(self, query, limit):
+        # 打分期间另一个线程的写入不应被挡住
+        writer = threading.Thread(
+            target=lambda: writer_done.append(
+                vector.store_embedding("message", "late", vectors[0].tolist(), campaign_id="c1")
+            )
+        )
+        writer.start()
+        writer.join(timeout=5)
+        return top_k(self, query, limit)
+
+    monkeypatch.setattr(vector._PartitionSnapshot, "top_k", blocking_top_k)
+    found = vector.search_similar(vectors[0].tolist(), "message", 3, mode="exact", campaign_id="c1")
+    assert writer_done == [None]
+    # 快照取自写入之前
+    assert found[0][1] == "m0"
+    monkeypatch.setattr(vector._PartitionSnapshot, "top_k", top_k)
+    assert {ref_id for _, ref_id, _ in vector.search_similar(
+        vectors[0].tolist(), "message", 2, mode="exact", campaign_id="c1",
+    )} == {"m0", "late"}
+
+
+def test_quantized_search_uses_snapshot(sqlite_db, monkeypatch):
+    monkeypatch.setattr(settings, "vector_storage_precision", "int8")
+    vectors = _vectors(40, seed=1)
+    for i, row in enumerate(vectors):
+        vector.store_embedding("message", f"m{i}", row.tolist(), campaign_id="c1")
+    vector.reset_index()
+
+    found = vector.search_similar(vectors[5].tolist(), "message", 3, mode="exact", campaign_id="c1")
+    assert found[0][1] == "m5"
+    assert vector.get_vector_index_status()["partitions"][0]["precision"] == "int8"